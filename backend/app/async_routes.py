@@ -0,0 +1,128 @@
+"""Async handlers for the hot endpoints.
+
+Included ahead of the sync routes in main.py when async mode is enabled,
+so these handlers take over the same paths and run on the event loop
+instead of occupying a threadpool worker per request. They are hidden
+from the schema because the sync routes document the same contract.
+"""
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, crud_async, lean, models, pagination, params, schemas
+from .database import get_async_db
+
+router = APIRouter(include_in_schema=False)
+
+
+@router.get("/vendors/", response_model=List[schemas.Vendor])
+async def read_vendors(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    after_id = pagination.after_id_from_cursor("vendors", cursor)
+    rows = (await db.execute(lean.page_statement(models.Vendor, schemas.Vendor, skip, limit, after_id))).all()
+    result = lean.json_response(schemas.Vendor, rows)
+    pagination.set_next_cursor(result, "vendors", rows, limit)
+    return result
+
+
+@router.get("/filaments/", response_model=List[schemas.Filament])
+async def read_filaments(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    after_id = pagination.after_id_from_cursor("filaments", cursor)
+    rows = (await db.execute(lean.page_statement(models.Filament, schemas.Filament, skip, limit, after_id))).all()
+    result = lean.json_response(schemas.Filament, rows)
+    pagination.set_next_cursor(result, "filaments", rows, limit)
+    return result
+
+
+@router.get("/purchases/", response_model=List[schemas.Purchase])
+async def read_purchases(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    after_id = pagination.after_id_from_cursor("purchases", cursor)
+    expand = params.parse_include(include, crud.PURCHASE_INCLUDES)
+    rows = await crud_async.get_purchases(db, skip=skip, limit=limit, after_id=after_id, include=expand)
+    return pagination.set_next_cursor(response, "purchases", rows, limit)
+
+
+@router.get("/purchase-items/", response_model=List[schemas.PurchaseItem])
+async def read_purchase_items(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    after_id = pagination.after_id_from_cursor("purchase_items", cursor)
+    rows = (await db.execute(lean.page_statement(models.PurchaseItem, schemas.PurchaseItem, skip, limit, after_id))).all()
+    result = lean.json_response(schemas.PurchaseItem, rows)
+    pagination.set_next_cursor(result, "purchase_items", rows, limit)
+    return result
+
+
+@router.get("/spools/", response_model=List[schemas.Spool])
+async def read_spools(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    after_id = pagination.after_id_from_cursor("spools", cursor)
+    rows = (await db.execute(lean.page_statement(models.Spool, schemas.Spool, skip, limit, after_id))).all()
+    result = lean.json_response(schemas.Spool, rows)
+    pagination.set_next_cursor(result, "spools", rows, limit)
+    return result
+
+
+@router.get("/spools/{spool_id}", response_model=schemas.Spool)
+async def read_spool(spool_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_spool = await crud_async.get_spool(db, spool_id=spool_id)
+    if db_spool is None:
+        raise HTTPException(status_code=404, detail="Spool not found")
+    return db_spool
+
+
+@router.get("/spools/by-filament/{filament_name}", response_model=List[schemas.Spool])
+async def read_spools_by_filament(filament_name: str, db: AsyncSession = Depends(get_async_db)):
+    stmt = crud.spools_by_filament_statement(filament_name, *lean.columns(models.Spool, schemas.Spool))
+    return lean.json_response(schemas.Spool, (await db.execute(stmt)).all())
+
+
+@router.put("/spools/{spool_id}", response_model=schemas.Spool)
+async def update_spool(spool_id: int, spool: schemas.SpoolUpdate, db: AsyncSession = Depends(get_async_db)):
+    if spool.model_fields_set & {"filament_id", "filament_name"}:
+        resolved = (await crud_async.resolve_filament_refs(db, [spool]))[0]
+        if resolved is None:
+            raise HTTPException(status_code=400, detail=f"Filament '{spool.filament_name or spool.filament_id}' not found")
+        spool.filament_id, spool.filament_name = resolved
+    db_spool = await crud_async.update_spool(db, spool_id=spool_id, spool=spool)
+    if db_spool is None:
+        raise HTTPException(status_code=404, detail="Spool not found")
+    return db_spool
+
+
+@router.get("/inventory/summary", response_model=List[schemas.InventorySummary])
+async def get_inventory_summary(
+    material: Optional[str] = None,
+    manufacturer: Optional[str] = None,
+    color: Optional[str] = None,
+    skip: int = 0,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await crud_async.get_inventory_summary(
+        db, material=material, manufacturer=manufacturer, color=color, skip=skip, limit=limit
+    )
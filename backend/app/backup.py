@@ -0,0 +1,251 @@
+"""Online backups of the SQLite database, and restores from them.
+
+A backup copies the live database with SQLite's backup API while the server
+keeps running. It holds one read transaction open for the whole copy, so the
+copy is a single consistent snapshot. Pages are copied FILAMENT_BACKUP_STEP_PAGES
+(default 256) at a time, with a pause of FILAMENT_BACKUP_STEP_PAUSE_MS
+(default 5) between steps. With WAL, writers are never blocked and readers
+only share the disk. Without the held snapshot, every commit from another
+connection would restart the copy, and a busy server would never finish one.
+
+The copy is checked with ``PRAGMA quick_check`` and gzipped to
+``<database>-<UTC time>.db.gz`` in FILAMENT_BACKUP_DIR (default ./backups).
+Only the newest FILAMENT_BACKUP_KEEP (default 7) are kept. A workspace's
+backups are named after its database, so each is rotated on its own.
+
+A restore first backs up the current data, then copies the snapshot into the
+live database in one transaction. Open connections see the restored data on
+their next read. Sync tokens handed out before the restore are voided
+(``sync.void_tokens``), so clients sync again from 0 rather than keep rows
+the restore took away.
+"""
+import gzip
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy.engine import Engine
+
+from . import migrations, sync
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = os.environ.get("FILAMENT_BACKUP_DIR", "./backups")
+KEEP = int(os.environ.get("FILAMENT_BACKUP_KEEP", 7))
+STEP_PAGES = int(os.environ.get("FILAMENT_BACKUP_STEP_PAGES", 256))
+STEP_PAUSE = float(os.environ.get("FILAMENT_BACKUP_STEP_PAUSE_MS", 5)) / 1000
+
+COMPRESS_LEVEL = 6
+
+# One backup or restore at a time per process
+_lock = threading.Lock()
+
+
+class BackupError(ValueError):
+    """Raised when the database cannot be backed up or a snapshot cannot be restored"""
+
+
+class BackupNotFound(LookupError):
+    """Raised for a backup name not in the backup directory"""
+
+
+class BackupBusy(RuntimeError):
+    """Raised while another backup or restore is running"""
+
+
+def _database_path(db_engine: Engine) -> str:
+    url = db_engine.url
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        raise BackupError("Online backups need a SQLite database file; back up server databases with their own tools")
+    return os.path.abspath(url.database)
+
+
+def _stem(db_engine: Engine) -> str:
+    return os.path.splitext(os.path.basename(_database_path(db_engine)))[0]
+
+
+def _pattern(stem: str):
+    return re.compile(rf"{re.escape(stem)}-\d{{8}}-\d{{6}}-\d{{6}}\.db\.gz")
+
+
+def _names(directory: str, stem: str) -> List[str]:
+    """Backup file names of the database, newest first"""
+    if not os.path.isdir(directory):
+        return []
+    pattern = _pattern(stem)
+    return sorted((name for name in os.listdir(directory) if pattern.fullmatch(name)), reverse=True)
+
+
+def _mb_per_second(size: int, seconds: float) -> float:
+    return round(size / 1_000_000 / seconds, 2) if seconds > 0 else 0.0
+
+
+def list_backups(db_engine: Engine, directory: Optional[str] = None) -> List[dict]:
+    """The database's backups, newest first"""
+    directory = directory or BACKUP_DIR
+    backups = []
+    for name in _names(directory, _stem(db_engine)):
+        stat = os.stat(os.path.join(directory, name))
+        backups.append({
+            "name": name,
+            "bytes": stat.st_size,
+            "created_at": datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+        })
+    return backups
+
+
+def _check(conn: sqlite3.Connection) -> None:
+    result = conn.execute("PRAGMA quick_check").fetchone()[0]
+    if result != "ok":
+        raise BackupError(f"Integrity check failed: {result}")
+
+
+def _copy(db_engine: Engine, target_path: str, step_pages: int, pause: float) -> dict:
+    """Copy one consistent snapshot of the live database to target_path, a few pages at a time"""
+    steps = pages = 0
+
+    def progress(status, remaining, total):
+        nonlocal steps, pages
+        steps += 1
+        pages = total
+
+    raw = db_engine.raw_connection()
+    try:
+        source = raw.driver_connection
+        # Reading inside an open transaction pins the snapshot the steps copy from
+        source.execute("BEGIN")
+        version = source.execute("SELECT version FROM sync_counter WHERE id = 1").fetchone()[0]
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(target, pages=step_pages, sleep=pause, progress=progress)
+            _check(target)
+        finally:
+            target.close()
+    finally:
+        raw.rollback()
+        raw.close()
+    return {"sync_version": version, "pages": pages, "steps": steps}
+
+
+def _rotate(directory: str, stem: str, keep: int) -> List[str]:
+    removed = _names(directory, stem)[keep:]
+    for name in removed:
+        os.remove(os.path.join(directory, name))
+    return removed
+
+
+def _backup(db_engine: Engine, directory: str, keep: int, step_pages: int, pause: float) -> dict:
+    stem = _stem(db_engine)
+    os.makedirs(directory, exist_ok=True)
+    name = f"{stem}-{datetime.now(timezone.utc):%Y%m%d-%H%M%S-%f}.db.gz"
+    path = os.path.join(directory, name)
+    copy_path = path[:-len(".gz")] + ".partial"
+
+    started = time.perf_counter()
+    try:
+        report = _copy(db_engine, copy_path, step_pages, pause)
+        copied = time.perf_counter()
+        with open(copy_path, "rb") as plain, gzip.open(path + ".partial", "wb", COMPRESS_LEVEL) as packed:
+            shutil.copyfileobj(plain, packed, 1024 * 1024)
+        os.replace(path + ".partial", path)
+        size = os.path.getsize(copy_path)
+    finally:
+        for leftover in (copy_path, path + ".partial"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    seconds = time.perf_counter() - started
+
+    report.update(
+        name=name,
+        database_bytes=size,
+        compressed_bytes=os.path.getsize(path),
+        copy_seconds=round(copied - started, 3),
+        seconds=round(seconds, 3),
+        mb_per_second=_mb_per_second(size, seconds),
+        rotated=_rotate(directory, stem, keep),
+    )
+    logger.info("Backed up %s to %s: %d bytes (%d gzipped) in %.2fs, %.1f MB/s",
+                stem, name, size, report["compressed_bytes"], seconds, report["mb_per_second"])
+    return report
+
+
+def _acquire() -> None:
+    if not _lock.acquire(blocking=False):
+        raise BackupBusy("A backup or restore is already running")
+
+
+def create_backup(db_engine: Engine, directory: Optional[str] = None, keep: int = KEEP,
+                  step_pages: int = STEP_PAGES, pause: float = STEP_PAUSE) -> dict:
+    """Back up the live database to a gzipped snapshot and rotate out the oldest beyond keep"""
+    _database_path(db_engine)
+    _acquire()
+    try:
+        return _backup(db_engine, directory or BACKUP_DIR, keep, step_pages, pause)
+    finally:
+        _lock.release()
+
+
+def restore_backup(db_engine: Engine, name: str, directory: Optional[str] = None, keep: int = KEEP) -> dict:
+    """Replace the live database's contents with a snapshot, backing up the current data first"""
+    directory = directory or BACKUP_DIR
+    stem = _stem(db_engine)
+    if not _pattern(stem).fullmatch(name) or not os.path.exists(os.path.join(directory, name)):
+        raise BackupNotFound(f"Backup {name} not found")
+
+    _acquire()
+    try:
+        # Keep the data being replaced, and the newest token handed out so far.
+        # Nothing is rotated out until the restore is done
+        safety = _backup(db_engine, directory, len(_names(directory, stem)) + 1, STEP_PAGES, STEP_PAUSE)
+
+        started = time.perf_counter()
+        snapshot_path = os.path.join(directory, name[:-len(".gz")] + ".restore")
+        try:
+            with gzip.open(os.path.join(directory, name), "rb") as packed, open(snapshot_path, "wb") as plain:
+                shutil.copyfileobj(packed, plain, 1024 * 1024)
+            size = os.path.getsize(snapshot_path)
+            snapshot = sqlite3.connect(snapshot_path)
+            try:
+                _check(snapshot)
+                raw = db_engine.raw_connection()
+                try:
+                    # All pages in one step, so the live database changes in a single transaction
+                    snapshot.backup(raw.driver_connection)
+                finally:
+                    raw.close()
+            finally:
+                snapshot.close()
+        except (OSError, EOFError, sqlite3.DatabaseError) as exc:
+            raise BackupError(f"Backup {name} could not be restored: {exc}") from exc
+        finally:
+            for leftover in (snapshot_path, snapshot_path + "-wal", snapshot_path + "-shm"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        rotated = _rotate(directory, stem, keep)
+    finally:
+        _lock.release()
+
+    # Bring older snapshots up to the current schema, then void earlier tokens.
+    # The commit bumps the data version, which clears cached responses and
+    # moves event subscribers to a resync.
+    migrations.init_db(db_engine)
+    with db_engine.begin() as conn:
+        token = sync.void_tokens(conn, safety["sync_version"])
+    seconds = time.perf_counter() - started
+
+    logger.info("Restored %s from %s: %d bytes in %.2fs", stem, name, size, seconds)
+    return {
+        "name": name,
+        "safety_backup": safety["name"],
+        "sync_version": token,
+        "database_bytes": size,
+        "seconds": round(seconds, 3),
+        "mb_per_second": _mb_per_second(size, seconds),
+        "rotated": rotated,
+    }
@@ -0,0 +1,234 @@
+"""Conditional GETs and an in-process response cache for read endpoints.
+
+Every committed write bumps a process-wide data version (tracked through
+engine events, so ORM, bulk and raw statements are all covered). GET
+responses on the cached paths carry an ETag derived from that version and
+answer ``304 Not Modified`` when the client already has the current one.
+Last-Modified is the last write's time rounded up to a whole second, and is
+only sent once that second has passed: whole-second dates cannot tell
+writes within one second apart. Full responses are kept in a size-bounded
+LRU keyed by workspace, path and query string, and an entry is only served
+while its version is still current.
+
+The version lives in memory, so this assumes a single server process per
+database; with several workers each one only sees its own writes. ETags
+also carry a per-process epoch, so none from before a restart still match.
+"""
+import math
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+# Paths whose GET responses are cached and answered conditionally
+CACHED_PATH_PREFIXES = (
+    "/vendors/",
+    "/filaments/",
+    "/purchases/",
+    "/purchase-items/",
+    "/spools/",
+    "/inventory/",
+    "/sync",
+)
+
+
+class DataVersion:
+    """Monotonic counter bumped whenever a write transaction commits"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Counting restarts with the process; the epoch keeps ETags from before a restart from matching
+        self.epoch = secrets.token_hex(4)
+        self.value = 0
+        self.modified_at = time.time()
+        self._listeners: List[Callable[[int], None]] = []
+
+    def bump(self) -> int:
+        with self._lock:
+            self.value += 1
+            self.modified_at = time.time()
+            value = self.value
+        for listener in self._listeners:
+            listener(value)
+        return value
+
+    def subscribe(self, listener: Callable[[int], None]) -> None:
+        """Call listener with the new version after every bump, on the committing thread"""
+        self._listeners.append(listener)
+
+    def snapshot(self) -> Tuple[int, float]:
+        with self._lock:
+            return self.value, self.modified_at
+
+
+data_version = DataVersion()
+
+
+def track_writes(db_engine: Engine, version: DataVersion = data_version) -> None:
+    """Bump the data version when a connection that ran DML commits"""
+
+    @event.listens_for(db_engine, "after_cursor_execute")
+    def _mark_dirty(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip()[:7].upper().startswith(WRITE_PREFIXES):
+            conn.info["dirty"] = True
+
+    # The engine's "commit" event fires before the commit reaches the database;
+    # bumping there would let a read cache the old rows under the new version.
+    # The dialect's commit is wrapped instead, to bump once the commit is done
+    do_commit = db_engine.dialect.do_commit
+
+    def _commit_then_bump(dbapi_connection):
+        do_commit(dbapi_connection)
+        # Called with the pool's proxied connection, whose info is the Connection's
+        info = getattr(dbapi_connection, "info", None)
+        if info is not None and info.pop("dirty", False):
+            version.bump()
+
+    db_engine.dialect.do_commit = _commit_then_bump
+
+    @event.listens_for(db_engine, "rollback")
+    def _discard_on_rollback(conn):
+        conn.info.pop("dirty", None)
+
+
+class ResponseCache:
+    """LRU of rendered responses, bounded by entry count and total body size"""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, version: int):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != version:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, version: int, status: int, headers: list, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (version, status, headers, body)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry[3])
+
+
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("FILAMENT_RESPONSE_CACHE_ENTRIES", 256)),
+    max_bytes=int(os.environ.get("FILAMENT_RESPONSE_CACHE_BYTES", 32 * 1024 * 1024)),
+)
+
+
+def _etag(epoch: str, version: int) -> str:
+    return f'W/"{epoch}-v{version}"'
+
+
+def _not_modified(request_headers: dict, etag: str, modified_at: float) -> bool:
+    if_none_match = request_headers.get(b"if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.decode("latin-1").split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request_headers.get(b"if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since.decode("latin-1")).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # An echoed Last-Modified is the write time rounded up, so it matches
+        return modified_at <= since
+    return False
+
+
+class ConditionalGetMiddleware:
+    """ASGI middleware adding ETag/Last-Modified, 304s and response caching"""
+
+    def __init__(self, app, cache: ResponseCache = response_cache, version: DataVersion = data_version,
+                 path_prefixes: Iterable[str] = CACHED_PATH_PREFIXES):
+        self.app = app
+        self.cache = cache
+        self.version = version
+        self.path_prefixes = tuple(path_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not scope["path"].startswith(self.path_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        # A workspace request carries its workspace's data version (see tenancy)
+        data_version = scope.get("state", {}).get("data_version", self.version)
+        version, modified_at = data_version.snapshot()
+        etag = _etag(data_version.epoch, version)
+        validators = [(b"etag", etag.encode("latin-1")), (b"cache-control", b"no-cache")]
+        # Last-Modified is the write time rounded up to a whole second. It is only sent once that
+        # second has passed, so any later write is newer than every date a client holds
+        last_modified = math.ceil(modified_at)
+        if last_modified <= time.time():
+            validators.append((b"last-modified", formatdate(last_modified, usegmt=True).encode("latin-1")))
+
+        request_headers = dict(scope["headers"])
+        if _not_modified(request_headers, etag, modified_at):
+            await send({"type": "http.response.start", "status": 304, "headers": validators})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        key = self.cache_key(scope)
+        cached = self.cache.get(key, version)
+        if cached is not None:
+            _, status, headers, body = cached
+            await send({"type": "http.response.start", "status": status, "headers": headers + validators})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        start: Optional[dict] = None
+        chunks = []
+
+        async def capture(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            headers = list(start["headers"])
+            body = b"".join(chunks)
+            if start["status"] == 200:
+                # Cached without validators, which are added per response: Last-Modified appears later
+                headers = [h for h in headers if h[0].lower() not in (b"etag", b"last-modified", b"cache-control")]
+                self.cache.put(key, version, 200, headers, body)
+                headers = headers + validators
+            await send({"type": "http.response.start", "status": start["status"], "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, capture)
+
+    def cache_key(self, scope) -> tuple:
+        return scope.get("state", {}).get("workspace"), scope["path"], scope.get("query_string", b"")
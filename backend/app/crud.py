@@ -1,7 +1,72 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Optional
+from datetime import date, datetime
+from types import SimpleNamespace
+from pydantic import ValidationError
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import Iterable, List, Optional, Sequence, Tuple
 from . import models, schemas
+from .pagination import paginate
+
+# Keep IN lists well under SQLite's bound-parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+
+# Reference resolution: callers may name a vendor or filament by surrogate id,
+# by natural name, or both (which must then agree)
+def _lookup_pairs(db: Session, id_column, name_column, ids: Iterable, names: Iterable) -> Tuple[dict, dict]:
+    """Map known ids to names and names to ids, looked up in chunks"""
+    by_id, by_name = {}, {}
+    for column, values in ((id_column, ids), (name_column, names)):
+        values = list({value for value in values if value is not None})
+        for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+            chunk = values[start:start + LOOKUP_CHUNK_SIZE]
+            for row_id, row_name in db.query(id_column, name_column).filter(column.in_(chunk)):
+                by_id[row_id] = row_name
+                by_name[row_name] = row_id
+    return by_id, by_name
+
+
+def _resolve(ref_id: Optional[int], ref_name: Optional[str], by_id: dict, by_name: dict) -> Optional[Tuple[int, str]]:
+    if ref_id is not None:
+        name = by_id.get(ref_id)
+        if name is None or (ref_name and ref_name != name):
+            return None
+        return ref_id, name
+    row_id = by_name.get(ref_name)
+    return (row_id, ref_name) if row_id is not None else None
+
+
+def resolve_vendor_refs(db: Session, refs) -> List[Optional[Tuple[int, str]]]:
+    """Resolve objects with vendor_id and/or manufacturer to (vendor id, vendor name)"""
+    refs = list(refs)
+    by_id, by_name = _lookup_pairs(
+        db, models.Vendor.id, models.Vendor.name,
+        (ref.vendor_id for ref in refs), (ref.manufacturer for ref in refs),
+    )
+    return [_resolve(ref.vendor_id, ref.manufacturer, by_id, by_name) for ref in refs]
+
+
+def resolve_filament_refs(db: Session, refs) -> List[Optional[Tuple[int, str]]]:
+    """Resolve objects with filament_id and/or filament_name to (filament id, filament name)"""
+    refs = list(refs)
+    by_id, by_name = _lookup_pairs(
+        db, models.Filament.id, models.Filament.name,
+        (ref.filament_id for ref in refs), (ref.filament_name for ref in refs),
+    )
+    return [_resolve(ref.filament_id, ref.filament_name, by_id, by_name) for ref in refs]
+
+
+def _rename_children(db: Session, model, key_column, name_column, key: int, name: str) -> None:
+    """Follow a rename into the name columns kept on child rows, by indexed id.
+
+    The copies stay because reads that cannot join depend on them: the FTS5
+    index uses ``filaments`` as its external content and indexes
+    ``manufacturer``, the facet counts come from a covering index on
+    ``filaments``, and /sync only resends rows whose sync_version moved, which
+    this rewrite bumps so offline clients pick up the new name.
+    """
+    db.query(model).filter(key_column == key).update({name_column: name}, synchronize_session=False)
 
 
 # Vendor CRUD
@@ -13,8 +78,8 @@ def get_vendor_by_name(db: Session, name: str) -> Optional[models.Vendor]:
     return db.query(models.Vendor).filter(models.Vendor.name == name).first()
 
 
-def get_vendors(db: Session, skip: int = 0, limit: int = 100) -> List[models.Vendor]:
-    return db.query(models.Vendor).offset(skip).limit(limit).all()
+def get_vendors(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None) -> List[models.Vendor]:
+    return paginate(db.query(models.Vendor), models.Vendor.id, skip, limit, after_id).all()
 
 
 def create_vendor(db: Session, vendor: schemas.VendorCreate) -> models.Vendor:
@@ -28,9 +93,13 @@ def create_vendor(db: Session, vendor: schemas.VendorCreate) -> models.Vendor:
 def update_vendor(db: Session, vendor_id: int, vendor: schemas.VendorUpdate) -> Optional[models.Vendor]:
     db_vendor = get_vendor(db, vendor_id)
     if db_vendor:
+        old_name = db_vendor.name
         update_data = vendor.model_dump(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_vendor, key, value)
+        if db_vendor.name != old_name:
+            _rename_children(db, models.Filament, models.Filament.vendor_id, models.Filament.manufacturer,
+                             db_vendor.id, db_vendor.name)
         db.commit()
         db.refresh(db_vendor)
     return db_vendor
@@ -45,6 +114,43 @@ def delete_vendor(db: Session, vendor_id: int) -> bool:
     return False
 
 
+# Upserts keyed on the unique name
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def _upsert_by_name(db: Session, model, rows: List[dict]) -> List[dict]:
+    """Insert rows, or overwrite the ones whose name exists, with INSERT ... ON CONFLICT ... RETURNING.
+
+    A batch is one statement (batched further only past the driver's
+    parameter limit), so concurrent or retried upserts of the same name
+    cannot fail on the unique constraint. Every given column is replaced;
+    id and created_at are kept. Returns the stored rows in input order; a
+    name given twice keeps its last row.
+    """
+    if not rows:
+        return []
+    table = model.__table__
+    latest = {row["name"]: row for row in rows}
+    stmt = UPSERT_INSERTS[db.get_bind().dialect.name](table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.name],
+        set_={column: stmt.excluded[column] for column in rows[0] if column != "name"},
+    ).returning(*table.c)
+    stored = {row["name"]: dict(row) for row in db.execute(stmt, list(latest.values())).mappings()}
+    db.commit()
+    return [stored[row["name"]] for row in rows]
+
+
+def upsert_vendors(db: Session, vendors: List[schemas.VendorCreate]) -> List[dict]:
+    return _upsert_by_name(db, models.Vendor, [vendor.model_dump() for vendor in vendors])
+
+
+def upsert_filaments(db: Session, filaments: List[schemas.FilamentCreate]) -> List[dict]:
+    """Upsert filaments whose vendor_id and manufacturer are already resolved"""
+    return _upsert_by_name(db, models.Filament, [filament.model_dump() for filament in filaments])
+
+
 # Filament CRUD
 def get_filament(db: Session, filament_id: int) -> Optional[models.Filament]:
     return db.query(models.Filament).filter(models.Filament.id == filament_id).first()
@@ -54,8 +160,8 @@ def get_filament_by_name(db: Session, name: str) -> Optional[models.Filament]:
     return db.query(models.Filament).filter(models.Filament.name == name).first()
 
 
-def get_filaments(db: Session, skip: int = 0, limit: int = 100) -> List[models.Filament]:
-    return db.query(models.Filament).offset(skip).limit(limit).all()
+def get_filaments(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None) -> List[models.Filament]:
+    return paginate(db.query(models.Filament), models.Filament.id, skip, limit, after_id).all()
 
 
 def create_filament(db: Session, filament: schemas.FilamentCreate) -> models.Filament:
@@ -69,9 +175,14 @@ def create_filament(db: Session, filament: schemas.FilamentCreate) -> models.Fil
 def update_filament(db: Session, filament_id: int, filament: schemas.FilamentUpdate) -> Optional[models.Filament]:
     db_filament = get_filament(db, filament_id)
     if db_filament:
+        old_name = db_filament.name
         update_data = filament.model_dump(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_filament, key, value)
+        if db_filament.name != old_name:
+            for model in (models.PurchaseItem, models.Spool):
+                _rename_children(db, model, model.filament_id, model.filament_name,
+                                 db_filament.id, db_filament.name)
         db.commit()
         db.refresh(db_filament)
     return db_filament
@@ -87,12 +198,37 @@ def delete_filament(db: Session, filament_id: int) -> bool:
 
 
 # Purchase CRUD
-def get_purchase(db: Session, purchase_id: int) -> Optional[models.Purchase]:
-    return db.query(models.Purchase).filter(models.Purchase.id == purchase_id).first()
+# Optional expansions for purchase reads, each loaded with one extra query per page
+PURCHASE_INCLUDES = ("filament",)
+
+
+def purchase_load_options(include: Sequence[str] = ()) -> list:
+    """Eager-load options so serializing purchases never lazy-loads per row"""
+    items = selectinload(models.Purchase.items)
+    options = [items]
+    if "filament" in include:
+        options.append(items.selectinload(models.PurchaseItem.filament_rel))
+    return options
 
 
-def get_purchases(db: Session, skip: int = 0, limit: int = 100) -> List[models.Purchase]:
-    return db.query(models.Purchase).offset(skip).limit(limit).all()
+def get_purchase(db: Session, purchase_id: int, include: Sequence[str] = ()) -> Optional[models.Purchase]:
+    return (
+        db.query(models.Purchase)
+        .options(*purchase_load_options(include))
+        .filter(models.Purchase.id == purchase_id)
+        .first()
+    )
+
+
+def get_purchases(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    after_id: Optional[int] = None,
+    include: Sequence[str] = (),
+) -> List[models.Purchase]:
+    query = db.query(models.Purchase).options(*purchase_load_options(include))
+    return paginate(query, models.Purchase.id, skip, limit, after_id).all()
 
 
 def create_purchase(db: Session, purchase: schemas.PurchaseCreate) -> models.Purchase:
@@ -102,12 +238,15 @@ def create_purchase(db: Session, purchase: schemas.PurchaseCreate) -> models.Pur
     db.add(db_purchase)
     db.flush()  # Get the purchase ID before adding items
 
-    # Create purchase items
+    # Create purchase items in one statement; the refresh below loads them
+    deltas = {}
     for item in purchase.items:
-        item_data = item.model_dump()
-        db_item = models.PurchaseItem(**item_data, purchase_id=db_purchase.id)
-        db.add(db_item)
+        _add_rollup_delta(deltas, item.filament_id, _item_contribution(item))
+    _bulk_insert(db, models.PurchaseItem, [
+        {**item.model_dump(), "purchase_id": db_purchase.id} for item in purchase.items
+    ])
 
+    _apply_rollup_deltas(db, deltas)
     db.commit()
     db.refresh(db_purchase)
     return db_purchase
@@ -138,8 +277,8 @@ def get_purchase_item(db: Session, item_id: int) -> Optional[models.PurchaseItem
     return db.query(models.PurchaseItem).filter(models.PurchaseItem.id == item_id).first()
 
 
-def get_purchase_items(db: Session, skip: int = 0, limit: int = 100) -> List[models.PurchaseItem]:
-    return db.query(models.PurchaseItem).offset(skip).limit(limit).all()
+def get_purchase_items(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None) -> List[models.PurchaseItem]:
+    return paginate(db.query(models.PurchaseItem), models.PurchaseItem.id, skip, limit, after_id).all()
 
 
 def get_purchase_items_by_purchase(db: Session, purchase_id: int) -> List[models.PurchaseItem]:
@@ -149,9 +288,13 @@ def get_purchase_items_by_purchase(db: Session, purchase_id: int) -> List[models
 def update_purchase_item(db: Session, item_id: int, item: schemas.PurchaseItemUpdate) -> Optional[models.PurchaseItem]:
     db_item = get_purchase_item(db, item_id)
     if db_item:
+        deltas = {}
+        _add_rollup_delta(deltas, db_item.filament_id, _item_contribution(db_item, sign=-1))
         update_data = item.model_dump(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_item, key, value)
+        _add_rollup_delta(deltas, db_item.filament_id, _item_contribution(db_item))
+        _apply_rollup_deltas(db, deltas)
         db.commit()
         db.refresh(db_item)
     return db_item
@@ -160,6 +303,9 @@ def update_purchase_item(db: Session, item_id: int, item: schemas.PurchaseItemUp
 def delete_purchase_item(db: Session, item_id: int) -> bool:
     db_item = get_purchase_item(db, item_id)
     if db_item:
+        deltas = {}
+        _add_rollup_delta(deltas, db_item.filament_id, _item_contribution(db_item, sign=-1))
+        _apply_rollup_deltas(db, deltas)
         db.delete(db_item)
         db.commit()
         return True
@@ -171,17 +317,41 @@ def get_spool(db: Session, spool_id: int) -> Optional[models.Spool]:
     return db.query(models.Spool).filter(models.Spool.id == spool_id).first()
 
 
-def get_spools(db: Session, skip: int = 0, limit: int = 100) -> List[models.Spool]:
-    return db.query(models.Spool).offset(skip).limit(limit).all()
+def get_spools(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None) -> List[models.Spool]:
+    return paginate(db.query(models.Spool), models.Spool.id, skip, limit, after_id).all()
+
+
+def spools_by_filament_statement(filament_name: str, *columns):
+    """Spools of one filament (or just the given columns), found through the indexed filament_id"""
+    filament_id = select(models.Filament.id).where(models.Filament.name == filament_name).scalar_subquery()
+    return select(*(columns or (models.Spool,))).where(models.Spool.filament_id == filament_id).order_by(models.Spool.id)
 
 
 def get_spools_by_filament(db: Session, filament_name: str) -> List[models.Spool]:
-    return db.query(models.Spool).filter(models.Spool.filament_name == filament_name).all()
+    return list(db.scalars(spools_by_filament_statement(filament_name)))
+
+
+def _record_reading(db: Session, spool: models.Spool) -> None:
+    """Append the spool's current weight to its reading history"""
+    db.add(models.SpoolReading(spool=spool, remaining_kg=spool.remaining_kg))
+
+
+def get_spool_readings(db: Session, spool_id: int) -> List[models.SpoolReading]:
+    return (
+        db.query(models.SpoolReading)
+        .filter(models.SpoolReading.spool_id == spool_id)
+        .order_by(models.SpoolReading.recorded_at, models.SpoolReading.id)
+        .all()
+    )
 
 
 def create_spool(db: Session, spool: schemas.SpoolCreate) -> models.Spool:
     db_spool = models.Spool(**spool.model_dump())
     db.add(db_spool)
+    _record_reading(db, db_spool)
+    deltas = {}
+    _add_rollup_delta(deltas, db_spool.filament_id, _spool_contribution(db_spool))
+    _apply_rollup_deltas(db, deltas)
     db.commit()
     db.refresh(db_spool)
     return db_spool
@@ -190,9 +360,16 @@ def create_spool(db: Session, spool: schemas.SpoolCreate) -> models.Spool:
 def update_spool(db: Session, spool_id: int, spool: schemas.SpoolUpdate) -> Optional[models.Spool]:
     db_spool = get_spool(db, spool_id)
     if db_spool:
+        deltas = {}
+        _add_rollup_delta(deltas, db_spool.filament_id, _spool_contribution(db_spool, sign=-1))
+        previous_kg = db_spool.remaining_kg
         update_data = spool.model_dump(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_spool, key, value)
+        _add_rollup_delta(deltas, db_spool.filament_id, _spool_contribution(db_spool))
+        if db_spool.remaining_kg != previous_kg:
+            _record_reading(db, db_spool)
+        _apply_rollup_deltas(db, deltas)
         db.commit()
         db.refresh(db_spool)
     return db_spool
@@ -201,68 +378,673 @@ def update_spool(db: Session, spool_id: int, spool: schemas.SpoolUpdate) -> Opti
 def delete_spool(db: Session, spool_id: int) -> bool:
     db_spool = get_spool(db, spool_id)
     if db_spool:
+        deltas = {}
+        _add_rollup_delta(deltas, db_spool.filament_id, _spool_contribution(db_spool, sign=-1))
+        _apply_rollup_deltas(db, deltas)
+        db.query(models.SpoolReading).filter(models.SpoolReading.spool_id == db_spool.id).delete(
+            synchronize_session=False
+        )
         db.delete(db_spool)
         db.commit()
         return True
     return False
 
 
+# Bulk import
+def _existing_values(db: Session, column, values) -> set:
+    """Return the subset of values already present in column, looked up in chunks"""
+    values = list({value for value in values if value is not None})
+    found = set()
+    for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        chunk = values[start:start + LOOKUP_CHUNK_SIZE]
+        found.update(row[0] for row in db.query(column).filter(column.in_(chunk)))
+    return found
+
+
+def _bulk_insert(db: Session, model, rows: List[dict]) -> List[int]:
+    """Insert rows with a single executemany and return their ids in order"""
+    if not rows:
+        return []
+    # Render None as NULL like the single-row path does; otherwise rows are
+    # grouped by which keys are None and alternating gaps insert one at a time
+    options = {"render_nulls": True}
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite does not promise RETURNING order, so sort_by_parameter_order
+        # also makes SQLAlchemy insert row by row. Rowids are assigned in
+        # ascending VALUES order within the transaction, so sorting restores it.
+        stmt = insert(model).returning(model.id)
+        return sorted(db.execute(stmt, rows, execution_options=options).scalars())
+    stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+    return list(db.execute(stmt, rows, execution_options=options).scalars())
+
+
+def _validation_message(exc: ValidationError) -> str:
+    messages = []
+    for error in exc.errors():
+        message = error["msg"].removeprefix("Value error, ")
+        location = ".".join(str(part) for part in error["loc"])
+        messages.append(f"{location}: {message}" if location else message)
+    return "; ".join(messages)
+
+
+def _validate_rows(schema, rows: Sequence) -> tuple:
+    """Validate each row on its own: ({index: model} for the valid ones, {index: error} for the rest)"""
+    valid, errors = {}, {}
+    for index, row in enumerate(rows):
+        try:
+            valid[index] = schema.model_validate(row)
+        except ValidationError as exc:
+            errors[index] = _validation_message(exc)
+    return valid, errors
+
+
+def _bulk_report(errors: dict, total: int, atomic: bool) -> tuple:
+    """Decide which rows get inserted and seed the per-row report"""
+    insertable = [] if (atomic and errors) else [index for index in range(total) if index not in errors]
+    results = [
+        {"index": index, "status": "error", "error": errors[index]} if index in errors
+        else {"index": index, "status": "skipped"}
+        for index in range(total)
+    ]
+    return insertable, results
+
+
+def _bulk_result(results: List[dict], vendors_created: Optional[List[str]] = None) -> dict:
+    return {
+        "created": sum(1 for row in results if row["status"] == "created"),
+        "failed": sum(1 for row in results if row["status"] == "error"),
+        "vendors_created": vendors_created or [],
+        "results": results,
+    }
+
+
+def bulk_create_filaments(
+    db: Session,
+    rows: Sequence,
+    create_missing_vendors: bool = False,
+    atomic: bool = True,
+) -> dict:
+    """Validate and insert many filaments in one transaction"""
+    filaments, errors = _validate_rows(schemas.FilamentCreate, rows)
+    existing_names = _existing_values(db, models.Filament.name, (f.name for f in filaments.values()))
+    vendors = dict(zip(filaments, resolve_vendor_refs(db, list(filaments.values()))))
+
+    seen_names = set()
+    missing_vendors = []
+    for index, filament in filaments.items():
+        vendor = vendors[index]
+        if filament.name in existing_names:
+            errors[index] = "Filament already exists"
+        elif filament.name in seen_names:
+            errors[index] = "Duplicate filament name in batch"
+        elif vendor is None and (filament.vendor_id is not None or not create_missing_vendors):
+            reference = filament.manufacturer or filament.vendor_id
+            errors[index] = f"Manufacturer '{reference}' not found. Please create the vendor first."
+        elif vendor is None and filament.manufacturer not in missing_vendors:
+            missing_vendors.append(filament.manufacturer)
+        seen_names.add(filament.name)
+
+    insertable, results = _bulk_report(errors, len(rows), atomic)
+
+    vendors_created = []
+    if insertable:
+        needed = {filaments[index].manufacturer for index in insertable if vendors[index] is None}
+        vendors_created = [name for name in missing_vendors if name in needed]
+        created_ids = dict(zip(vendors_created, _bulk_insert(db, models.Vendor, [
+            {"name": name, "notes": "Auto-created from bulk import"} for name in vendors_created
+        ])))
+        rows = []
+        for index in insertable:
+            vendor_id, manufacturer = vendors[index] or (created_ids[filaments[index].manufacturer],
+                                                         filaments[index].manufacturer)
+            rows.append({**filaments[index].model_dump(), "vendor_id": vendor_id, "manufacturer": manufacturer})
+        ids = _bulk_insert(db, models.Filament, rows)
+        for index, new_id in zip(insertable, ids):
+            results[index].update(status="created", id=new_id)
+        db.commit()
+
+    return _bulk_result(results, vendors_created)
+
+
+def _filament_error(ref) -> str:
+    return f"Filament '{ref.filament_name or ref.filament_id}' not found"
+
+
+def bulk_create_purchases(db: Session, rows: Sequence, atomic: bool = True) -> dict:
+    """Validate and insert many purchases with their items in one transaction"""
+    purchases, errors = _validate_rows(schemas.PurchaseCreate, rows)
+    items = [item for purchase in purchases.values() for item in purchase.items]
+    resolved = iter(resolve_filament_refs(db, items))
+    filaments = {index: [next(resolved) for _ in purchase.items] for index, purchase in purchases.items()}
+
+    for index, purchase in purchases.items():
+        missing = [item for item, ref in zip(purchase.items, filaments[index]) if ref is None]
+        if missing:
+            errors[index] = _filament_error(missing[0])
+
+    insertable, results = _bulk_report(errors, len(rows), atomic)
+
+    if insertable:
+        ids = _bulk_insert(db, models.Purchase, [
+            purchases[index].model_dump(exclude={'items'}) for index in insertable
+        ])
+        item_rows = []
+        deltas = {}
+        for index, purchase_id in zip(insertable, ids):
+            results[index].update(status="created", id=purchase_id)
+            for item, (filament_id, filament_name) in zip(purchases[index].items, filaments[index]):
+                item_rows.append({**item.model_dump(), "purchase_id": purchase_id,
+                                  "filament_id": filament_id, "filament_name": filament_name})
+                _add_rollup_delta(deltas, filament_id, _item_contribution(item))
+        _bulk_insert(db, models.PurchaseItem, item_rows)
+        _apply_rollup_deltas(db, deltas)
+        db.commit()
+
+    return _bulk_result(results)
+
+
+def bulk_create_spools(db: Session, rows: Sequence, atomic: bool = True) -> dict:
+    """Validate and insert many spools in one transaction"""
+    spools, errors = _validate_rows(schemas.SpoolCreate, rows)
+    filaments = dict(zip(spools, resolve_filament_refs(db, list(spools.values()))))
+
+    for index, spool in spools.items():
+        if filaments[index] is None:
+            errors[index] = _filament_error(spool)
+
+    insertable, results = _bulk_report(errors, len(rows), atomic)
+
+    if insertable:
+        ids = _bulk_insert(db, models.Spool, [
+            {**spools[index].model_dump(), "filament_id": filaments[index][0], "filament_name": filaments[index][1]}
+            for index in insertable
+        ])
+        deltas = {}
+        now = datetime.utcnow()
+        for index, spool_id in zip(insertable, ids):
+            results[index].update(status="created", id=spool_id)
+            _add_rollup_delta(deltas, filaments[index][0], _spool_contribution(spools[index]))
+        db.execute(insert(models.SpoolReading), [
+            {"spool_id": spool_id, "remaining_kg": spools[index].remaining_kg, "recorded_at": now}
+            for index, spool_id in zip(insertable, ids)
+        ])
+        _apply_rollup_deltas(db, deltas)
+        db.commit()
+
+    return _bulk_result(results)
+
+
+# Bulk changes
+def _rows_by_id(db: Session, model, ids: Iterable[int], *columns) -> dict:
+    """Current values of the given columns for each id that exists, looked up in chunks"""
+    ids = list(ids)
+    rows = {}
+    for start in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+        chunk = ids[start:start + LOOKUP_CHUNK_SIZE]
+        rows.update((row.id, row) for row in db.execute(select(model.id, *columns).where(model.id.in_(chunk))))
+    return rows
+
+
+def _merge_patches(patches) -> dict:
+    """Changes per id; later patches for the same id win field by field"""
+    changes = {}
+    for patch in patches:
+        changes.setdefault(patch.id, {}).update(patch.model_dump(exclude_unset=True, exclude={"id"}))
+    return changes
+
+
+def bulk_update_spools(db: Session, patches: List[schemas.SpoolPatch], atomic: bool = True) -> dict:
+    """Apply per-spool changes with set-based UPDATEs in one transaction.
+
+    Each spool is read once for the rollup deltas, and spools whose
+    remaining_kg changes get a reading, as with update_spool. Unknown ids
+    are reported; with ``atomic`` they leave every spool unchanged.
+    """
+    changes = _merge_patches(patches)
+    current = _rows_by_id(db, models.Spool, changes,
+                          models.Spool.filament_id, models.Spool.remaining_kg, models.Spool.date_finished)
+    missing = sorted(set(changes) - set(current))
+    if not current or (atomic and missing):
+        return {"updated": 0, "missing": missing}
+
+    updates = []
+    readings = []
+    deltas = {}
+    recorded_at = datetime.utcnow()
+    for spool_id, old in current.items():
+        values = changes[spool_id]
+        new = SimpleNamespace(**{**old._asdict(), **values})
+        _add_rollup_delta(deltas, old.filament_id, _spool_contribution(old, sign=-1))
+        _add_rollup_delta(deltas, new.filament_id, _spool_contribution(new))
+        if values:
+            updates.append({"id": spool_id, **values})
+        if new.remaining_kg != old.remaining_kg:
+            readings.append({"spool_id": spool_id, "recorded_at": recorded_at, "remaining_kg": new.remaining_kg})
+
+    if updates:
+        db.execute(update(models.Spool), updates)
+    if readings:
+        db.execute(insert(models.SpoolReading), readings)
+    _apply_rollup_deltas(db, deltas)
+    db.commit()
+    return {"updated": len(current), "missing": missing}
+
+
+def bulk_update_purchase_items(db: Session, patches: List[schemas.PurchaseItemPatch], atomic: bool = True) -> dict:
+    """Apply per-item changes with set-based UPDATEs in one transaction, keeping the rollup current"""
+    changes = _merge_patches(patches)
+    current = _rows_by_id(db, models.PurchaseItem, changes, models.PurchaseItem.filament_id,
+                          models.PurchaseItem.spools, models.PurchaseItem.kg_per_spool)
+    missing = sorted(set(changes) - set(current))
+    if not current or (atomic and missing):
+        return {"updated": 0, "missing": missing}
+
+    updates = []
+    deltas = {}
+    for item_id, old in current.items():
+        values = changes[item_id]
+        new = SimpleNamespace(**{**old._asdict(), **values})
+        _add_rollup_delta(deltas, old.filament_id, _item_contribution(old, sign=-1))
+        _add_rollup_delta(deltas, new.filament_id, _item_contribution(new))
+        if values:
+            updates.append({"id": item_id, **values})
+
+    if updates:
+        db.execute(update(models.PurchaseItem), updates)
+    _apply_rollup_deltas(db, deltas)
+    db.commit()
+    return {"updated": len(current), "missing": missing}
+
+
+def spool_conditions(
+    filament_id: Optional[int] = None,
+    shelf: Optional[str] = None,
+    finished: Optional[bool] = None,
+    finished_before: Optional[date] = None,
+    opened_before: Optional[date] = None,
+) -> list:
+    """WHERE clauses selecting spools for a bulk delete; empty when no filter is given"""
+    conditions = []
+    if filament_id is not None:
+        conditions.append(models.Spool.filament_id == filament_id)
+    if shelf is not None:
+        conditions.append(models.Spool.shelf == shelf)
+    if finished is not None:
+        conditions.append(models.Spool.date_finished.isnot(None) if finished else models.Spool.date_finished.is_(None))
+    if finished_before is not None:
+        conditions.append(models.Spool.date_finished < finished_before)
+    if opened_before is not None:
+        conditions.append(models.Spool.date_opened < opened_before)
+    return conditions
+
+
+def purchase_item_conditions(
+    purchase_id: Optional[int] = None,
+    filament_id: Optional[int] = None,
+    shelf: Optional[str] = None,
+    ordered_before: Optional[date] = None,
+    received_before: Optional[date] = None,
+) -> list:
+    """WHERE clauses selecting purchase items for a bulk delete; empty when no filter is given"""
+    conditions = []
+    if purchase_id is not None:
+        conditions.append(models.PurchaseItem.purchase_id == purchase_id)
+    if filament_id is not None:
+        conditions.append(models.PurchaseItem.filament_id == filament_id)
+    if shelf is not None:
+        conditions.append(models.PurchaseItem.shelf == shelf)
+    if ordered_before is not None:
+        conditions.append(models.PurchaseItem.date_ordered < ordered_before)
+    if received_before is not None:
+        conditions.append(models.PurchaseItem.date_received < received_before)
+    return conditions
+
+
+def _subtract_totals(deltas: dict, totals, fields: Sequence[str]) -> None:
+    for row in totals:
+        _add_rollup_delta(deltas, row.filament_id, {field: -(getattr(row, field) or 0) for field in fields})
+
+
+def delete_spools_where(db: Session, conditions: list) -> int:
+    """Delete the matching spools and their readings in one transaction; returns how many spools went"""
+    deltas = {}
+    _subtract_totals(deltas, db.query(_spool_totals(db, *conditions)).all(), SPOOL_ROLLUP_FIELDS)
+    matched = select(models.Spool.id).where(*conditions)
+    db.execute(
+        delete(models.SpoolReading).where(models.SpoolReading.spool_id.in_(matched)),
+        execution_options={"synchronize_session": False},
+    )
+    deleted = db.execute(
+        delete(models.Spool).where(*conditions), execution_options={"synchronize_session": False}
+    ).rowcount
+    _apply_rollup_deltas(db, deltas)
+    db.commit()
+    return deleted
+
+
+def delete_purchase_items_where(db: Session, conditions: list) -> int:
+    """Delete the matching purchase items in one transaction; returns how many went"""
+    deltas = {}
+    _subtract_totals(deltas, db.query(_purchase_totals(db, *conditions)).all(), PURCHASE_ROLLUP_FIELDS)
+    deleted = db.execute(
+        delete(models.PurchaseItem).where(*conditions), execution_options={"synchronize_session": False}
+    ).rowcount
+    _apply_rollup_deltas(db, deltas)
+    db.commit()
+    return deleted
+
+
+# Telemetry
+def ingest_spool_readings(db: Session, readings: Sequence[Tuple[int, datetime, float]]) -> int:
+    """Append (spool_id, recorded_at, remaining_kg) readings in one transaction.
+
+    Each spool moves to the weight of its newest reading unless it already
+    has a newer one on record, and the rollup follows. Readings for unknown
+    spools are dropped. Returns the number of readings stored.
+    """
+    reading = models.SpoolReading
+    last_recorded = (
+        select(func.max(reading.recorded_at)).where(reading.spool_id == models.Spool.id).scalar_subquery()
+    )
+    spool_ids = list({spool_id for spool_id, _, _ in readings})
+    spools = {}
+    for start in range(0, len(spool_ids), LOOKUP_CHUNK_SIZE):
+        chunk = spool_ids[start:start + LOOKUP_CHUNK_SIZE]
+        for row in db.execute(
+            select(models.Spool.id, models.Spool.filament_id, models.Spool.remaining_kg,
+                   models.Spool.date_finished, last_recorded)
+            .where(models.Spool.id.in_(chunk))
+        ):
+            spools[row[0]] = row
+
+    known = [entry for entry in readings if entry[0] in spools]
+    if not known:
+        return 0
+
+    newest = {}
+    for spool_id, recorded_at, remaining_kg in known:
+        if spool_id not in newest or recorded_at >= newest[spool_id][0]:
+            newest[spool_id] = (recorded_at, remaining_kg)
+
+    updates = []
+    deltas = {}
+    for spool_id, (recorded_at, remaining_kg) in newest.items():
+        _, filament_id, current_kg, date_finished, last_at = spools[spool_id]
+        if (last_at is not None and recorded_at < last_at) or remaining_kg == current_kg:
+            continue
+        updates.append({"id": spool_id, "remaining_kg": remaining_kg})
+        if date_finished is None:
+            _add_rollup_delta(deltas, filament_id, {"remaining_opened_kg": remaining_kg - current_kg})
+
+    db.execute(insert(reading), [
+        {"spool_id": spool_id, "recorded_at": recorded_at, "remaining_kg": remaining_kg}
+        for spool_id, recorded_at, remaining_kg in known
+    ])
+    if updates:
+        db.execute(update(models.Spool), updates)
+    _apply_rollup_deltas(db, deltas)
+    db.commit()
+    return len(known)
+
+
 # Inventory calculations
-def get_inventory_summary(db: Session) -> List[dict]:
-    """Calculate inventory summary for each filament"""
-    filaments = get_filaments(db, limit=1000)
-    summaries = []
-
-    for filament in filaments:
-        # Calculate total purchased
-        purchased = db.query(
-            func.sum(models.PurchaseItem.spools * models.PurchaseItem.kg_per_spool)
-        ).filter(models.PurchaseItem.filament_name == filament.name).scalar() or 0.0
-
-        # Count spools
-        total_spools = db.query(
-            func.sum(models.PurchaseItem.spools)
-        ).filter(models.PurchaseItem.filament_name == filament.name).scalar() or 0
-
-        opened_spools_count = db.query(func.count(models.Spool.id)).filter(
-            models.Spool.filament_name == filament.name
-        ).scalar() or 0
-
-        finished_spools_count = db.query(func.count(models.Spool.id)).filter(
-            models.Spool.filament_name == filament.name,
-            models.Spool.date_finished.isnot(None)
-        ).scalar() or 0
-
-        # Calculate remaining in opened spools
-        remaining_opened = db.query(
-            func.sum(models.Spool.remaining_kg)
-        ).filter(
-            models.Spool.filament_name == filament.name,
-            models.Spool.date_finished.is_(None)
-        ).scalar() or 0.0
-
-        unopened_count = total_spools - opened_spools_count
-
-        # Calculate average kg per spool for unopened spools
-        avg_kg_per_spool = db.query(
-            func.avg(models.PurchaseItem.kg_per_spool)
-        ).filter(models.PurchaseItem.filament_name == filament.name).scalar() or 0.0
-
-        # Total remaining = unopened spools at full weight + remaining in opened spools
-        unopened_kg = unopened_count * avg_kg_per_spool
-        total_remaining = remaining_opened + unopened_kg
-
-        summaries.append({
-            "filament_name": filament.name,
-            "manufacturer": filament.manufacturer,
-            "material": filament.material,
-            "color": filament.color,
-            "total_purchased_kg": float(purchased),
-            "total_opened_kg": float(purchased - total_remaining) if total_remaining > 0 else float(purchased),
-            "total_remaining_kg": float(total_remaining),
-            "unopened_spools": unopened_count,
-            "opened_spools": opened_spools_count - finished_spools_count,
-            "finished_spools": finished_spools_count,
-        })
-
-    return summaries
+def _summary_row(filament_id, filament_name, manufacturer, material, color, purchased, total_spools,
+                 avg_kg_per_spool, opened_spools_count, finished_spools_count, remaining_opened) -> dict:
+    """Turn the aggregated numbers for one filament into a summary row"""
+    purchased = purchased or 0.0
+    total_spools = total_spools or 0
+    avg_kg_per_spool = avg_kg_per_spool or 0.0
+    opened_spools_count = opened_spools_count or 0
+    finished_spools_count = finished_spools_count or 0
+    remaining_opened = remaining_opened or 0.0
+
+    unopened_count = total_spools - opened_spools_count
+
+    # Total remaining = unopened spools at full weight + remaining in opened spools
+    unopened_kg = unopened_count * avg_kg_per_spool
+    total_remaining = remaining_opened + unopened_kg
+
+    return {
+        "filament_id": filament_id,
+        "filament_name": filament_name,
+        "manufacturer": manufacturer,
+        "material": material,
+        "color": color,
+        "total_purchased_kg": float(purchased),
+        "total_opened_kg": float(purchased - total_remaining) if total_remaining > 0 else float(purchased),
+        "total_remaining_kg": float(total_remaining),
+        "unopened_spools": unopened_count,
+        "opened_spools": opened_spools_count - finished_spools_count,
+        "finished_spools": finished_spools_count,
+    }
+
+
+def _purchase_totals(db: Session, *conditions):
+    """Purchased kg, spool count and kg/spool per filament, aggregated from (matching) purchase items"""
+    return (
+        db.query(
+            models.PurchaseItem.filament_id.label("filament_id"),
+            func.sum(models.PurchaseItem.spools * models.PurchaseItem.kg_per_spool).label("purchased_kg"),
+            func.sum(models.PurchaseItem.spools).label("purchased_spools"),
+            func.count(models.PurchaseItem.id).label("purchase_item_count"),
+            func.sum(models.PurchaseItem.kg_per_spool).label("kg_per_spool_total"),
+        )
+        .where(models.PurchaseItem.filament_id.isnot(None), *conditions)
+        .group_by(models.PurchaseItem.filament_id)
+        .subquery()
+    )
+
+
+def _spool_totals(db: Session, *conditions):
+    """Opened, finished and remaining totals per filament, aggregated from (matching) spools"""
+    finished = models.Spool.date_finished.isnot(None)
+    return (
+        db.query(
+            models.Spool.filament_id.label("filament_id"),
+            func.count(models.Spool.id).label("spool_count"),
+            func.sum(case((finished, 1), else_=0)).label("finished_spools"),
+            func.sum(case((finished, 0.0), else_=models.Spool.remaining_kg)).label("remaining_opened_kg"),
+        )
+        .where(models.Spool.filament_id.isnot(None), *conditions)
+        .group_by(models.Spool.filament_id)
+        .subquery()
+    )
+
+
+def rollup_avg_kg_per_spool():
+    rollup = models.InventoryRollup
+    return case(
+        (rollup.purchase_item_count > 0, rollup.kg_per_spool_total / rollup.purchase_item_count),
+        else_=0.0,
+    )
+
+
+def rollup_remaining_kg():
+    """SQL form of the summary's total_remaining_kg: opened remainder plus unopened spools at average weight"""
+    rollup = models.InventoryRollup
+    unopened = func.coalesce(rollup.purchased_spools, 0) - func.coalesce(rollup.spool_count, 0)
+    return func.coalesce(rollup.remaining_opened_kg, 0.0) + unopened * func.coalesce(rollup_avg_kg_per_spool(), 0.0)
+
+
+def inventory_summary_statement(
+    material: Optional[str] = None,
+    manufacturer: Optional[str] = None,
+    color: Optional[str] = None,
+    skip: int = 0,
+    limit: Optional[int] = None,
+):
+    """SELECT for the summary rows, joining the catalog to the inventory rollup"""
+    rollup = models.InventoryRollup
+    avg_kg_per_spool = rollup_avg_kg_per_spool()
+    stmt = (
+        select(
+            models.Filament.id,
+            models.Filament.name,
+            models.Filament.manufacturer,
+            models.Filament.material,
+            models.Filament.color,
+            rollup.purchased_kg,
+            rollup.purchased_spools,
+            avg_kg_per_spool,
+            rollup.spool_count,
+            rollup.finished_spools,
+            rollup.remaining_opened_kg,
+        )
+        .outerjoin(rollup, rollup.filament_id == models.Filament.id)
+    )
+
+    if material is not None:
+        stmt = stmt.where(models.Filament.material == material)
+    if manufacturer is not None:
+        stmt = stmt.where(models.Filament.manufacturer == manufacturer)
+    if color is not None:
+        stmt = stmt.where(models.Filament.color == color)
+
+    stmt = stmt.order_by(models.Filament.name).offset(skip)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def get_inventory_summary(
+    db: Session,
+    material: Optional[str] = None,
+    manufacturer: Optional[str] = None,
+    color: Optional[str] = None,
+    skip: int = 0,
+    limit: Optional[int] = None,
+) -> List[dict]:
+    """Calculate inventory summary for each filament.
+
+    Reads the per-filament totals from the inventory rollup table, which is
+    kept current by the purchase item and spool write functions.
+    """
+    stmt = inventory_summary_statement(material, manufacturer, color, skip, limit)
+    return [_summary_row(*row) for row in db.execute(stmt).all()]
+
+
+# Inventory rollup maintenance
+PURCHASE_ROLLUP_FIELDS = ("purchased_kg", "purchased_spools", "purchase_item_count", "kg_per_spool_total")
+SPOOL_ROLLUP_FIELDS = ("spool_count", "finished_spools", "remaining_opened_kg")
+ROLLUP_FIELDS = PURCHASE_ROLLUP_FIELDS + SPOOL_ROLLUP_FIELDS
+
+# Float totals accumulate rounding error as deltas are applied
+ROLLUP_TOLERANCE = 1e-6
+
+
+def _item_contribution(item, sign: int = 1) -> dict:
+    """What a single purchase item adds to its filament's rollup"""
+    return {
+        "purchased_kg": sign * item.spools * item.kg_per_spool,
+        "purchased_spools": sign * item.spools,
+        "purchase_item_count": sign,
+        "kg_per_spool_total": sign * item.kg_per_spool,
+    }
+
+
+def _spool_contribution(spool, sign: int = 1) -> dict:
+    """What a single spool adds to its filament's rollup"""
+    finished = spool.date_finished is not None
+    return {
+        "spool_count": sign,
+        "finished_spools": sign if finished else 0,
+        "remaining_opened_kg": 0.0 if finished else sign * spool.remaining_kg,
+    }
+
+
+def _add_rollup_delta(deltas: dict, filament_id: Optional[int], contribution: dict) -> None:
+    if filament_id is None:
+        return  # Legacy rows whose name never matched a filament
+    totals = deltas.setdefault(filament_id, {})
+    for key, value in contribution.items():
+        totals[key] = totals.get(key, 0) + value
+
+
+def _apply_rollup_deltas(db: Session, deltas: dict) -> None:
+    """Add accumulated deltas to the rollup rows in the current transaction.
+
+    Written with one executemany UPDATE and one INSERT rather than through
+    the unit of work, which updates row by row when the changed fields differ.
+    """
+    rollup = models.InventoryRollup
+    columns = [getattr(rollup, field) for field in ROLLUP_FIELDS]
+    keys = list(deltas)
+    existing = {}
+    for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+        existing.update(
+            (row.filament_id, row._asdict())
+            for row in db.execute(select(rollup.filament_id, *columns).where(rollup.filament_id.in_(chunk)))
+        )
+    updates = []
+    inserts = []
+    for filament_id, totals in deltas.items():
+        current = existing.get(filament_id)
+        values = current or {"filament_id": filament_id, **dict.fromkeys(ROLLUP_FIELDS, 0)}
+        for key, value in totals.items():
+            values[key] += value
+        (updates if current else inserts).append(values)
+    if updates:
+        db.execute(update(rollup), updates)
+    if inserts:
+        db.execute(insert(rollup), inserts)
+
+
+def rebuild_inventory_rollup(db: Session, apply: bool = True) -> List[dict]:
+    """Recompute the rollup from purchase items and spools and report drift.
+
+    Returns one entry per filament and field whose stored value differs from
+    the recomputed one. With ``apply`` the table is replaced by the
+    recomputed totals; otherwise it is left untouched.
+    """
+    purchased = _purchase_totals(db)
+    spools = _spool_totals(db)
+
+    expected = {}
+    for row in db.query(purchased).all():
+        expected.setdefault(row.filament_id, dict.fromkeys(ROLLUP_FIELDS, 0)).update(
+            {field: getattr(row, field) or 0 for field in PURCHASE_ROLLUP_FIELDS}
+        )
+    for row in db.query(spools).all():
+        expected.setdefault(row.filament_id, dict.fromkeys(ROLLUP_FIELDS, 0)).update(
+            {field: getattr(row, field) or 0 for field in SPOOL_ROLLUP_FIELDS}
+        )
+
+    stored = {rollup.filament_id: rollup for rollup in db.query(models.InventoryRollup).all()}
+    zeros = dict.fromkeys(ROLLUP_FIELDS, 0)
+
+    drift = []
+    for filament_id in sorted(set(expected) | set(stored)):
+        want = expected.get(filament_id, zeros)
+        have = stored.get(filament_id)
+        for field in ROLLUP_FIELDS:
+            have_value = getattr(have, field) if have is not None else 0
+            if abs((have_value or 0) - want[field]) > ROLLUP_TOLERANCE:
+                drift.append({
+                    "filament_id": filament_id,
+                    "field": field,
+                    "stored": have_value,
+                    "expected": want[field],
+                })
+
+    if apply:
+        db.query(models.InventoryRollup).delete()
+        db.add_all(
+            models.InventoryRollup(filament_id=filament_id, **totals)
+            for filament_id, totals in expected.items()
+        )
+        db.commit()
+
+    return drift
+
+
+def ensure_inventory_rollup(db: Session) -> None:
+    """Build the rollup once for databases that predate it"""
+    if db.query(models.InventoryRollup.filament_id).first() is not None:
+        return
+    has_history = (
+        db.query(models.PurchaseItem.id).first() is not None
+        or db.query(models.Spool.id).first() is not None
+    )
+    if has_history:
+        rebuild_inventory_rollup(db)
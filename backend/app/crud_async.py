@@ -0,0 +1,46 @@
+"""Async variants of the hot-path CRUD functions.
+
+Used when the app runs in async mode (FILAMENT_ASYNC=1). Reads are issued
+directly on the AsyncSession. Writes that maintain the inventory rollup
+reuse the sync implementations through ``AsyncSession.run_sync``, which
+runs them on the async driver without blocking the event loop.
+"""
+from typing import List, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, models, schemas
+from .pagination import paginate
+
+
+async def get_purchases(db: AsyncSession, skip: int = 0, limit: int = 100,
+                        after_id: Optional[int] = None, include: Sequence[str] = ()) -> List[models.Purchase]:
+    # Items must be loaded up front: lazy loads are not available on an AsyncSession
+    stmt = paginate(select(models.Purchase), models.Purchase.id, skip, limit, after_id)
+    stmt = stmt.options(*crud.purchase_load_options(include))
+    return list((await db.scalars(stmt)).all())
+
+
+async def get_spool(db: AsyncSession, spool_id: int) -> Optional[models.Spool]:
+    return await db.get(models.Spool, spool_id)
+
+
+async def resolve_filament_refs(db: AsyncSession, refs) -> list:
+    return await db.run_sync(crud.resolve_filament_refs, refs)
+
+
+async def update_spool(db: AsyncSession, spool_id: int, spool: schemas.SpoolUpdate) -> Optional[models.Spool]:
+    return await db.run_sync(crud.update_spool, spool_id, spool)
+
+
+async def get_inventory_summary(
+    db: AsyncSession,
+    material: Optional[str] = None,
+    manufacturer: Optional[str] = None,
+    color: Optional[str] = None,
+    skip: int = 0,
+    limit: Optional[int] = None,
+) -> List[dict]:
+    stmt = crud.inventory_summary_statement(material, manufacturer, color, skip, limit)
+    return [crud._summary_row(*row) for row in (await db.execute(stmt)).all()]
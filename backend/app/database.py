@@ -1,21 +1,192 @@
-from sqlalchemy import create_engine
+import os
+from contextvars import ContextVar
+from dataclasses import dataclass, field, replace
+from typing import Callable, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./filament_inventory.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# Async driver used for each backend when running in async mode
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+}
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").lower() in ("1", "true", "yes")
+
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    """Engine configuration, read from FILAMENT_* environment variables"""
+    url: str = "sqlite:///./filament_inventory.db"
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: int = 30  # Seconds to wait for a pooled connection
+    pool_recycle: int = 1800  # Seconds before a server connection is replaced
+    echo: bool = False
+    async_mode: bool = False  # Serve the hot endpoints through an async engine
+
+    # SQLite only
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_cache_size_kb: int = 64000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_pragmas: dict = field(default_factory=dict)  # Extra PRAGMA name -> value
+
+    @classmethod
+    def from_env(cls) -> "DatabaseSettings":
+        defaults = cls()
+        return cls(
+            url=os.environ.get("FILAMENT_DATABASE_URL") or os.environ.get("DATABASE_URL") or defaults.url,
+            pool_size=_env_int("FILAMENT_DB_POOL_SIZE", defaults.pool_size),
+            max_overflow=_env_int("FILAMENT_DB_MAX_OVERFLOW", defaults.max_overflow),
+            pool_timeout=_env_int("FILAMENT_DB_POOL_TIMEOUT", defaults.pool_timeout),
+            pool_recycle=_env_int("FILAMENT_DB_POOL_RECYCLE", defaults.pool_recycle),
+            echo=_env_flag("FILAMENT_DB_ECHO"),
+            async_mode=_env_flag("FILAMENT_ASYNC"),
+            sqlite_journal_mode=os.environ.get("FILAMENT_SQLITE_JOURNAL_MODE", defaults.sqlite_journal_mode),
+            sqlite_synchronous=os.environ.get("FILAMENT_SQLITE_SYNCHRONOUS", defaults.sqlite_synchronous),
+            sqlite_busy_timeout_ms=_env_int("FILAMENT_SQLITE_BUSY_TIMEOUT_MS", defaults.sqlite_busy_timeout_ms),
+            sqlite_cache_size_kb=_env_int("FILAMENT_SQLITE_CACHE_SIZE_KB", defaults.sqlite_cache_size_kb),
+            sqlite_mmap_size=_env_int("FILAMENT_SQLITE_MMAP_SIZE", defaults.sqlite_mmap_size),
+        )
+
+    @property
+    def is_sqlite(self) -> bool:
+        return make_url(self.url).get_backend_name() == "sqlite"
+
+    @property
+    def async_url(self):
+        """The URL with the async driver for its backend"""
+        url = make_url(self.url)
+        if url.get_driver_name() in ASYNC_DRIVERS.values():
+            return url
+        return url.set(drivername=f"{url.get_backend_name()}+{ASYNC_DRIVERS[url.get_backend_name()]}")
+
+    def with_url(self, url: str) -> "DatabaseSettings":
+        return replace(self, url=url)
+
+
+def _sqlite_pragmas(settings: DatabaseSettings) -> dict:
+    pragmas = {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "busy_timeout": settings.sqlite_busy_timeout_ms,
+        "cache_size": -settings.sqlite_cache_size_kb,  # Negative values are KiB
+        "mmap_size": settings.sqlite_mmap_size,
+        "temp_store": "MEMORY",
+    }
+    pragmas.update(settings.sqlite_pragmas)
+    return pragmas
+
+
+def _sqlite_engine_args(settings: DatabaseSettings) -> dict:
+    kwargs = {
+        "connect_args": {
+            "check_same_thread": False,
+            "timeout": settings.sqlite_busy_timeout_ms / 1000,
+        },
+    }
+    if make_url(settings.url).database not in (None, "", ":memory:"):
+        kwargs.update(pool_size=settings.pool_size, max_overflow=settings.max_overflow,
+                      pool_timeout=settings.pool_timeout)
+    return kwargs
+
+
+def _server_pool_args(settings: DatabaseSettings) -> dict:
+    return {
+        "pool_size": settings.pool_size,
+        "max_overflow": settings.max_overflow,
+        "pool_timeout": settings.pool_timeout,
+        "pool_recycle": settings.pool_recycle,
+        "pool_pre_ping": True,
+    }
+
+
+def _install_pragmas(db_engine: Engine, settings: DatabaseSettings) -> None:
+    """Apply the SQLite pragmas to every connection the pool opens"""
+    pragmas = _sqlite_pragmas(settings)
+
+    @event.listens_for(db_engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def create_db_engine(settings: Optional[DatabaseSettings] = None) -> Engine:
+    """Build an engine for SQLite or a server database from settings.
+
+    SQLite connections get the configured pragmas applied as each pooled
+    connection is opened. Server databases get a sized, pre-pinged pool.
+    """
+    settings = settings or DatabaseSettings.from_env()
+    url = make_url(settings.url)
+
+    if settings.is_sqlite:
+        db_engine = create_engine(url, echo=settings.echo, **_sqlite_engine_args(settings))
+        _install_pragmas(db_engine, settings)
+        return db_engine
+
+    return create_engine(url, echo=settings.echo, **_server_pool_args(settings))
+
+
+def create_async_db_engine(settings: Optional[DatabaseSettings] = None) -> AsyncEngine:
+    """Async counterpart of create_db_engine, using aiosqlite or asyncpg"""
+    settings = settings or DatabaseSettings.from_env()
+    url = settings.async_url
+
+    if settings.is_sqlite:
+        db_engine = create_async_engine(url, echo=settings.echo, **_sqlite_engine_args(settings))
+        _install_pragmas(db_engine.sync_engine, settings)
+        return db_engine
+
+    return create_async_engine(url, echo=settings.echo, **_server_pool_args(settings))
+
+
+settings = DatabaseSettings.from_env()
+SQLALCHEMY_DATABASE_URL = settings.url
+
+engine = create_db_engine(settings)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# Session factory for the current request: SessionLocal, or a workspace's (see tenancy)
+current_sessionmaker: ContextVar[Callable[[], Session]] = ContextVar("current_sessionmaker", default=SessionLocal)
+
 
 def get_db():
     """Dependency to get database session"""
-    db = SessionLocal()
+    db = current_sessionmaker.get()()
     try:
         yield db
     finally:
         db.close()
+
+
+# Async mode: an async engine alongside the sync one for the hot endpoints
+async_engine = create_async_db_engine(settings) if settings.async_mode else None
+AsyncSessionLocal = (
+    async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+    if async_engine is not None else None
+)
+
+
+async def get_async_db():
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,267 @@
+"""Server-sent events: a push feed of committed changes.
+
+Every committed write wakes one pump task on the event loop. After a short
+pause to gather bursts of commits, it reads what changed since its last
+token with ``sync.changes_since`` (one thread hop and a handful of indexed
+queries, however many clients are listening), encodes it once as an SSE
+frame and puts the same bytes on every subscriber's queue. A subscriber is
+an asyncio queue drained by its streaming response, so idle connections
+cost no thread; a heartbeat comment keeps proxies from closing them.
+
+Each frame carries compact rows (the ``EVENT_FIELDS`` of each table), the
+ids deleted, and the recomputed inventory summary rows of the filaments
+they touch. Its SSE id is the sync token, so a browser reconnecting with
+``Last-Event-ID`` is caught up from there. A client that falls too far
+behind, on a live queue or on reconnect, gets a ``resync`` event and should
+fetch ``GET /sync`` from the token in it (0 when the database was replaced).
+
+The pump is woken by commits in this process; writes from other processes
+are picked up every FILAMENT_EVENTS_POLL_S (default 5) while anyone listens.
+"""
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Optional, Set, Tuple
+
+from pydantic_core import to_json
+from sqlalchemy.orm import sessionmaker
+
+from . import sync
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Fields sent per changed row; spool_readings are left out, the spool carries its new weight
+EVENT_FIELDS = {
+    "vendors": ("id", "name"),
+    "filaments": ("id", "name", "vendor_id", "manufacturer", "material", "color"),
+    "purchases": ("id", "date_ordered", "marketplace", "subtotal", "tax"),
+    "purchase_items": ("id", "purchase_id", "filament_id", "spools", "kg_per_spool", "date_received", "shelf"),
+    "spools": ("id", "filament_id", "date_opened", "date_finished", "shelf", "remaining_kg"),
+}
+
+THREAD_NAME = "event-hub"
+
+# Hubs read on these named threads, apart from request work; shared by the hubs of every workspace
+executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix=THREAD_NAME)
+
+# (sync token, encoded frame); a None frame tells the subscriber to disconnect
+Frame = Tuple[int, Optional[bytes]]
+
+# Tokens of the disconnect marker besides 0 (resync from 0, the database was replaced):
+# resync from the last token the subscriber got, or just close (the hub is stopping)
+LAGGED = -1
+CLOSED = -2
+
+
+def encode(event: str, payload: dict, event_id: Optional[int] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\n".encode("ascii") + b"data: " + to_json(payload) + b"\n\n"
+
+
+def notification(result: dict) -> bytes:
+    """A changes frame from a sync.changes_since result"""
+    changes = {
+        table: [{field: row[field] for field in EVENT_FIELDS[table]} for row in rows]
+        for table, rows in result["changes"].items() if rows
+    }
+    deleted = {table: ids for table, ids in result["deleted"].items() if ids}
+    payload = {
+        "token": result["token"],
+        "changes": changes,
+        "deleted": deleted,
+        "inventory_summary": result["inventory_summary"],
+    }
+    return encode("changes", payload, result["token"])
+
+
+class EventHub:
+    """Fans out one encoded frame per batch of commits to every subscriber"""
+
+    def __init__(
+        self,
+        session_factory: sessionmaker = SessionLocal,
+        queue_size: int = 64,
+        batch_size: int = 1000,
+        coalesce: float = 0.05,
+        heartbeat: float = 15.0,
+        poll: float = 5.0,
+        executor: Optional[ThreadPoolExecutor] = None,
+    ):
+        self.session_factory = session_factory
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.coalesce = coalesce
+        self.heartbeat = heartbeat
+        self.poll = poll
+
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._starting: Optional[asyncio.Future] = None
+        self._executor = executor
+        self.token = 0
+        self._stale = False  # Commits went by with no one listening
+
+        self.published = 0
+        self.disconnected = 0
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        """Start the pump on the running loop; concurrent callers wait for the one start"""
+        if self._starting is None:
+            self._starting = asyncio.ensure_future(self._start())
+        await asyncio.shield(self._starting)
+
+    async def _start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self.token = await self._in_thread(self._current_version)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for queue in tuple(self._subscribers):
+            self._close(queue, CLOSED)
+        self._loop = None
+        self._starting = None
+
+    def notify(self, version: int = 0) -> None:
+        """Wake the pump; safe to call from any thread"""
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            pass  # The loop has closed
+
+    async def _in_thread(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor or executor, function, *args)
+
+    def _current_version(self) -> int:
+        with self.session_factory() as db:
+            return sync.current_version(db)
+
+    def _collect(self, since: int) -> Tuple[int, Optional[list]]:
+        """Frames for everything committed after since, a batch_size page each; None if the token is void"""
+        frames = []
+        with self.session_factory() as db:
+            while True:
+                try:
+                    result = sync.changes_since(db, since, self.batch_size, tables=EVENT_FIELDS)
+                except sync.TokenAhead:
+                    return sync.current_version(db), None
+                if result["token"] != since:
+                    frames.append((result["token"], notification(result)))
+                since = result["token"]
+                if not result["more"]:
+                    return since, frames
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll if self._subscribers else None)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if not self._subscribers:
+                self._stale = True
+                continue
+            await asyncio.sleep(self.coalesce)
+            try:
+                self.token, frames = await self._in_thread(self._collect, self.token)
+            except Exception:
+                logger.exception("Could not read changes for the event feed")
+                continue
+            if frames is None:
+                # The database was replaced; reconnecting clients are told to sync again from 0
+                for queue in tuple(self._subscribers):
+                    self._close(queue, 0)
+                continue
+            for frame in frames:
+                self._publish(frame)
+
+    def _publish(self, frame: Frame) -> None:
+        self.published += 1
+        for queue in tuple(self._subscribers):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self._close(queue)
+
+    def _close(self, queue: asyncio.Queue, resync: int = LAGGED) -> None:
+        """Replace whatever is queued with the disconnect marker, saying where the client resyncs from"""
+        self._subscribers.discard(queue)
+        self.disconnected += 1
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait((resync, None))
+
+    async def _catch_up(self, since: int) -> Tuple[int, bytes]:
+        """One frame bringing a reconnecting client from since to now, or a resync request"""
+        def read():
+            with self.session_factory() as db:
+                return sync.changes_since(db, since, self.batch_size, tables=EVENT_FIELDS)
+
+        try:
+            result = await self._in_thread(read)
+        except sync.TokenAhead:
+            return self.token, encode("resync", {"token": 0}, self.token)
+        if result["more"]:
+            return self.token, encode("resync", {"token": since}, self.token)
+        return result["token"], notification(result)
+
+    async def subscribe(self, last_event_id: Optional[int] = None) -> AsyncIterator[bytes]:
+        """The byte stream of one subscriber, until it disconnects or falls behind"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        try:
+            if self._stale:
+                self._stale = False
+                self.token = await self._in_thread(self._current_version)
+            sent = self.token
+            if last_event_id is not None and last_event_id != sent:
+                sent, frame = await self._catch_up(last_event_id)
+                yield frame
+            else:
+                yield encode("ready", {"token": sent}, sent)
+            while True:
+                try:
+                    token, frame = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if frame is None:
+                    # Only this stream knows the last token it sent, so it writes the resync itself
+                    if token != CLOSED:
+                        yield encode("resync", {"token": sent if token == LAGGED else token}, self.token)
+                    return
+                if token > sent:
+                    sent = token
+                    yield frame
+        finally:
+            self._subscribers.discard(queue)
+
+
+hub = EventHub(
+    queue_size=int(os.environ.get("FILAMENT_EVENTS_QUEUE_SIZE", 64)),
+    coalesce=float(os.environ.get("FILAMENT_EVENTS_COALESCE_MS", 50)) / 1000,
+    heartbeat=float(os.environ.get("FILAMENT_EVENTS_HEARTBEAT_S", 15)),
+    poll=float(os.environ.get("FILAMENT_EVENTS_POLL_S", 5)),
+)
@@ -0,0 +1,113 @@
+"""Streaming CSV/NDJSON exports.
+
+Rows are read from a server-side cursor in fixed-size batches and encoded
+one batch at a time, so memory use does not depend on the table size. Each
+export runs on its own connection and sees a single read snapshot. NDJSON
+lines are encoded by pydantic-core, which handles dates natively.
+"""
+import csv
+import io
+from datetime import date, datetime
+from typing import Iterator, List, Optional
+
+from pydantic_core import to_json
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+
+from . import models
+from .database import engine
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_MODELS = {
+    "vendors": models.Vendor,
+    "filaments": models.Filament,
+    "purchases": models.Purchase,
+    "purchase_items": models.PurchaseItem,
+    "spools": models.Spool,
+}
+
+
+# Replication bookkeeping (see sync), not part of the exported data
+INTERNAL_COLUMNS = {"sync_version"}
+
+
+def _columns(model) -> list:
+    return [column for column in model.__table__.columns if column.name not in INTERNAL_COLUMNS]
+
+
+def _column_names(model) -> List[str]:
+    return [column.name for column in _columns(model)]
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _batches(conn, model, batch_size: int):
+    """Yield lists of row mappings for a table, ordered by primary key"""
+    stmt = select(*_columns(model)).order_by(model.id)
+    result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(stmt)
+    for partition in result.mappings().partitions():
+        yield partition
+
+
+def _purchase_batches(conn, batch_size: int):
+    """Yield batches of purchases with their items attached as an ``items`` list"""
+    item_columns = _columns(models.PurchaseItem)
+    for purchases in _batches(conn, models.Purchase, batch_size):
+        purchases = [dict(purchase, items=[]) for purchase in purchases]
+        by_id = {purchase["id"]: purchase for purchase in purchases}
+        items = conn.execute(
+            select(*item_columns)
+            .where(models.PurchaseItem.purchase_id.in_(list(by_id)))
+            .order_by(models.PurchaseItem.id)
+        ).mappings()
+        for item in items:
+            by_id[item["purchase_id"]]["items"].append(dict(item))
+        yield purchases
+
+
+def _csv_chunk(rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _purchase_csv_rows(purchases, item_names: List[str]):
+    """Flatten purchases to one row per item, repeating the purchase columns"""
+    for purchase in purchases:
+        head = [_csv_value(value) for key, value in purchase.items() if key != "items"]
+        if not purchase["items"]:
+            yield head + [""] * len(item_names)
+        for item in purchase["items"]:
+            yield head + [_csv_value(item[name]) for name in item_names]
+
+
+def stream_table(table: str, format: str = "csv", batch_size: int = EXPORT_BATCH_SIZE,
+                 db_engine: Optional[Engine] = None) -> Iterator[bytes]:
+    """Stream every row of an exportable table as CSV or NDJSON bytes, from the default database unless given"""
+    model = EXPORT_MODELS[table]
+    names = _column_names(model)
+    item_names = _column_names(models.PurchaseItem)
+
+    if format == "csv":
+        header = names
+        if table == "purchases":
+            header = names + [f"item_{name}" for name in item_names]
+        yield _csv_chunk([header])
+
+    with (db_engine or engine).connect() as conn:
+        batches = _purchase_batches(conn, batch_size) if table == "purchases" else _batches(conn, model, batch_size)
+        for batch in batches:
+            if format == "csv":
+                if table == "purchases":
+                    yield _csv_chunk(_purchase_csv_rows(batch, item_names))
+                else:
+                    yield _csv_chunk([_csv_value(row[name]) for name in names] for row in batch)
+            else:
+                yield b"".join(to_json(dict(row)) + b"\n" for row in batch)
@@ -0,0 +1,114 @@
+"""Facet counts for the filament and inventory filter sidebars.
+
+Each endpoint runs one GROUP BY over the combination of facet columns
+(covered by ``ix_filaments_facets``) and folds the grouped rows into
+per-facet counts in Python, so the number of facets does not multiply the
+number of table scans. Facets are disjunctive: the counts for one facet
+apply every other active filter but not its own, so a sidebar can show the
+alternatives to the value currently selected. ``total`` applies them all.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, exists, func, select
+from sqlalchemy.orm import Session
+
+from . import crud, models
+
+FILAMENT_FACETS = ("material", "color", "manufacturer", "feature")
+INVENTORY_FACETS = FILAMENT_FACETS + ("shelf",)
+
+_COLUMNS = [getattr(models.Filament, name) for name in FILAMENT_FACETS]
+
+
+def _fold(rows: Iterable, names: Iterable[str], filters: Dict[str, Optional[str]], measures: tuple):
+    """Sum grouped rows into totals and per-facet buckets, each facet skipping its own filter"""
+    active = {name: value for name, value in filters.items() if value is not None}
+    totals = dict.fromkeys(measures, 0)
+    facets = {name: {} for name in names}
+    for row in rows:
+        row = row._mapping
+        failing = [name for name, value in active.items() if row[name] != value]
+        if not failing:
+            for measure in measures:
+                totals[measure] += row[measure] or 0
+        for name in names:
+            if failing and failing != [name]:
+                continue
+            bucket = facets[name].setdefault(row[name], dict.fromkeys(measures, 0))
+            for measure in measures:
+                bucket[measure] += row[measure] or 0
+    return totals, facets
+
+
+def _facet_lists(facets: dict) -> Dict[str, List[dict]]:
+    """Buckets as lists, most common value first"""
+    return {
+        name: [
+            {"value": value, **bucket}
+            for value, bucket in sorted(buckets.items(), key=lambda item: (-item[1]["count"], item[0] or ""))
+        ]
+        for name, buckets in facets.items()
+    }
+
+
+def filament_facets(
+    db: Session,
+    material: Optional[str] = None,
+    color: Optional[str] = None,
+    manufacturer: Optional[str] = None,
+    feature: Optional[str] = None,
+) -> dict:
+    """Catalog counts per material, color, manufacturer and feature"""
+    stmt = select(*_COLUMNS, func.count().label("count")).group_by(*_COLUMNS)
+    filters = {"material": material, "color": color, "manufacturer": manufacturer, "feature": feature}
+    totals, facets = _fold(db.execute(stmt), FILAMENT_FACETS, filters, ("count",))
+    return {"total": totals["count"], "facets": _facet_lists(facets)}
+
+
+def inventory_facets(
+    db: Session,
+    material: Optional[str] = None,
+    color: Optional[str] = None,
+    manufacturer: Optional[str] = None,
+    feature: Optional[str] = None,
+    shelf: Optional[str] = None,
+) -> dict:
+    """Counts with the summary's remaining kg, plus open spools per shelf.
+
+    Filament facets count filaments and sum their total_remaining_kg from
+    the inventory rollup. The shelf facet counts open (unfinished) spools
+    and the kg left on them; a shelf filter limits the other facets to
+    filaments with an open spool on that shelf.
+    """
+    filters = {"material": material, "color": color, "manufacturer": manufacturer, "feature": feature}
+    measures = ("count", "remaining_kg")
+
+    rollup = models.InventoryRollup
+    stmt = (
+        select(*_COLUMNS, func.count().label("count"), func.sum(crud.rollup_remaining_kg()).label("remaining_kg"))
+        .outerjoin(rollup, rollup.filament_id == models.Filament.id)
+        .group_by(*_COLUMNS)
+    )
+    if shelf is not None:
+        stmt = stmt.where(exists().where(and_(
+            models.Spool.filament_id == models.Filament.id,
+            models.Spool.date_finished.is_(None),
+            models.Spool.shelf == shelf,
+        )))
+    totals, facets = _fold(db.execute(stmt), FILAMENT_FACETS, filters, measures)
+
+    shelves = (
+        select(
+            *_COLUMNS,
+            models.Spool.shelf.label("shelf"),
+            func.count().label("count"),
+            func.sum(models.Spool.remaining_kg).label("remaining_kg"),
+        )
+        .join(models.Filament, models.Filament.id == models.Spool.filament_id)
+        .where(models.Spool.date_finished.is_(None))
+        .group_by(*_COLUMNS, models.Spool.shelf)
+    )
+    _, shelf_facets = _fold(db.execute(shelves), ("shelf",), filters, measures)
+    facets.update(shelf_facets)
+
+    return {"total": totals["count"], "remaining_kg": float(totals["remaining_kg"]), "facets": _facet_lists(facets)}
@@ -0,0 +1,216 @@
+"""Burn rates and run-out projections from the spool reading history.
+
+The readings inside the window are fetched once as plain columns, ordered
+by spool and time, and the rest is NumPy array math: weight drops between
+consecutive readings of the same spool, summed per filament with
+``bincount``. Weight gains (corrections, re-weighs) are not counted as
+negative consumption. A filament's burn rate is the weight consumed over
+the days since its oldest reading in the window, and its run-out date
+divides the summary's total remaining kg by that rate. Filaments observed
+for less than ``MIN_OBSERVED_DAYS`` have no rate yet. Materials are the
+sum of their filaments.
+
+Only filaments with readings in the window are listed, a page at a time
+by filament id; materials always cover every filament.
+"""
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import DateTime, exists, func, literal, select
+from sqlalchemy.orm import Session
+
+from . import crud, models, pagination
+
+DEFAULT_WINDOW_DAYS = 90
+
+# A filament first weighed more recently than this reports no rate, rather
+# than projecting one from a few hours of use
+MIN_OBSERVED_DAYS = 1.0
+
+
+def _day_number(value, dialect_name: str):
+    """Fractional days on a fixed epoch, for subtracting timestamps in SQL"""
+    if dialect_name == "sqlite":
+        return func.julianday(value)
+    return func.extract("epoch", value) / 86400.0
+
+
+def _spool_filaments(db: Session) -> tuple:
+    """Spool ids (sorted) and their filament ids"""
+    result = db.connection().execute(
+        select(models.Spool.id, models.Spool.filament_id)
+        .where(models.Spool.filament_id.isnot(None))
+        .order_by(models.Spool.id)
+    )
+    rows = result.cursor.fetchall()
+    result.close()
+    if not rows:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    spool_ids, filament_ids = zip(*rows)
+    return np.asarray(spool_ids, dtype=np.int64), np.asarray(filament_ids, dtype=np.int64)
+
+
+def reading_columns(db: Session, now: datetime, window_days: int) -> tuple:
+    """Filament ids, spool ids, ages in days and weights of readings in the window.
+
+    Readings are fetched in table order and sorted by spool and time here;
+    an ORDER BY would walk the index and visit the table once per reading.
+    """
+    dialect_name = db.get_bind().dialect.name
+    reading = models.SpoolReading
+    age_days = _day_number(literal(now, DateTime), dialect_name) - _day_number(reading.recorded_at, dialect_name)
+    result = db.connection().execute(
+        select(reading.spool_id, age_days, reading.remaining_kg)
+        .where(reading.recorded_at >= now - timedelta(days=window_days))
+    )
+    # Plain numbers need no result processing; reading the DBAPI cursor
+    # directly skips building a Row object per reading
+    rows = result.cursor.fetchall()
+    result.close()
+    known_spools, spool_filaments = _spool_filaments(db)
+    if not rows or not len(known_spools):
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0), np.empty(0)
+
+    spool_ids, ages, weights = (np.asarray(column) for column in zip(*rows))
+    spool_ids = spool_ids.astype(np.int64)
+    position = np.searchsorted(known_spools, spool_ids).clip(max=len(known_spools) - 1)
+    keep = known_spools[position] == spool_ids
+
+    # Oldest first within each spool: descending age
+    order = np.lexsort((-ages[keep], spool_ids[keep]))
+    return (
+        spool_filaments[position[keep]][order],
+        spool_ids[keep][order],
+        ages[keep].astype(np.float64)[order],
+        weights[keep].astype(np.float64)[order],
+    )
+
+
+def burn_rates(filament_ids: np.ndarray, spool_ids: np.ndarray, ages: np.ndarray, weights: np.ndarray) -> tuple:
+    """Per-filament (ids, consumed kg, kg/day) from readings sorted by spool and time.
+
+    The rate is NaN for filaments observed for less than MIN_OBSERVED_DAYS.
+    """
+    keys, index = np.unique(filament_ids, return_inverse=True)
+    if not len(keys):
+        return keys, np.empty(0), np.empty(0)
+
+    same_spool = spool_ids[1:] == spool_ids[:-1]
+    drops = np.where(same_spool, weights[:-1] - weights[1:], 0.0).clip(min=0.0)
+    consumed = np.bincount(index[1:], weights=drops, minlength=len(keys))
+
+    oldest = np.zeros(len(keys))
+    np.maximum.at(oldest, index, ages)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = np.where(oldest >= MIN_OBSERVED_DAYS, consumed / oldest, np.nan)
+    return keys, consumed, rates
+
+
+def _align(keys: np.ndarray, values: np.ndarray, ids: np.ndarray, fill: float = 0.0) -> np.ndarray:
+    """values for each of ids by key, fill where an id has no readings"""
+    aligned = np.full(len(ids), fill)
+    if len(keys):
+        position = np.searchsorted(keys, ids).clip(max=len(keys) - 1)
+        found = keys[position] == ids
+        aligned[found] = values[position[found]]
+    return aligned
+
+
+def _projection(remaining: np.ndarray, rate: np.ndarray, today: date) -> tuple:
+    """Days left and run-out dates; None where nothing is being consumed"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days = np.where(rate > 0, np.maximum(remaining, 0.0) / rate, np.nan)
+    dates = [None if np.isnan(d) else today + timedelta(days=int(d)) for d in days]
+    return [None if np.isnan(d) else float(d) for d in days], dates
+
+
+def _optional(values: np.ndarray) -> list:
+    return [None if np.isnan(value) else float(value) for value in values]
+
+
+def _material_totals(db: Session, material: Optional[str]) -> tuple:
+    """Filament ids (sorted), materials and remaining kg of every filament"""
+    stmt = (
+        select(models.Filament.id, models.Filament.material, crud.rollup_remaining_kg())
+        .outerjoin(models.InventoryRollup, models.InventoryRollup.filament_id == models.Filament.id)
+        .order_by(models.Filament.id)
+    )
+    if material is not None:
+        stmt = stmt.where(models.Filament.material == material)
+    rows = db.execute(stmt).all()
+    if not rows:
+        return np.empty(0, np.int64), [], np.empty(0)
+    ids, materials, remaining = zip(*rows)
+    return np.asarray(ids, dtype=np.int64), list(materials), np.asarray(remaining, dtype=np.float64)
+
+
+def inventory_forecast(
+    db: Session,
+    window_days: int = DEFAULT_WINDOW_DAYS,
+    material: Optional[str] = None,
+    now: Optional[datetime] = None,
+    skip: int = 0,
+    limit: int = 100,
+    after_id: Optional[int] = None,
+) -> dict:
+    """Burn rate and projected run-out for a page of filaments and for every material"""
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=window_days)
+    keys, consumed, rates = burn_rates(*reading_columns(db, now, window_days))
+    today = now.date()
+
+    observed = exists().where(
+        models.Spool.filament_id == models.Filament.id,
+        models.SpoolReading.spool_id == models.Spool.id,
+        models.SpoolReading.recorded_at >= cutoff,
+    )
+    stmt = crud.inventory_summary_statement(material).order_by(None).where(observed)
+    page = [crud._summary_row(*row) for row in db.execute(
+        pagination.paginate(stmt, models.Filament.id, skip, limit, after_id)
+    ).all()]
+    page_ids = np.asarray([row["filament_id"] for row in page], dtype=np.int64)
+    remaining = np.asarray([row["total_remaining_kg"] for row in page], dtype=np.float64)
+    filament_consumed = _align(keys, consumed, page_ids)
+    filament_rate = _align(keys, rates, page_ids, np.nan)
+    days, dates = _projection(remaining, filament_rate, today)
+    rates_out = _optional(filament_rate)
+    filaments = [
+        {
+            "filament_id": row["filament_id"],
+            "filament_name": row["filament_name"],
+            "material": row["material"],
+            "remaining_kg": float(remaining[i]),
+            "consumed_kg": float(filament_consumed[i]),
+            "burn_rate_kg_per_day": rates_out[i],
+            "days_remaining": days[i],
+            "run_out_date": dates[i],
+        }
+        for i, row in enumerate(page)
+    ]
+
+    ids, materials, remaining = _material_totals(db, material)
+    all_consumed = _align(keys, consumed, ids)
+    all_rates = _align(keys, rates, ids, np.nan)
+    material_names, material_index = np.unique(materials, return_inverse=True)
+    material_remaining = np.bincount(material_index, weights=remaining, minlength=len(material_names))
+    material_consumed = np.bincount(material_index, weights=all_consumed, minlength=len(material_names))
+    material_rate = np.bincount(material_index, weights=np.nan_to_num(all_rates), minlength=len(material_names))
+    # A material has a rate once any of its filaments has one
+    rated = np.bincount(material_index, weights=~np.isnan(all_rates), minlength=len(material_names))
+    material_rate[rated == 0] = np.nan
+    days, dates = _projection(material_remaining, material_rate, today)
+    rates_out = _optional(material_rate)
+    materials = [
+        {
+            "material": str(name),
+            "remaining_kg": float(material_remaining[i]),
+            "consumed_kg": float(material_consumed[i]),
+            "burn_rate_kg_per_day": rates_out[i],
+            "days_remaining": days[i],
+            "run_out_date": dates[i],
+        }
+        for i, name in enumerate(material_names)
+    ]
+
+    return {"generated_at": now, "window_days": window_days, "filaments": filaments, "materials": materials}
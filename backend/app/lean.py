@@ -0,0 +1,46 @@
+"""Lean list responses: selected columns in, JSON bytes out.
+
+Returning ORM instances from a list endpoint costs, per row, building the
+instance, validating it into the response model with from_attributes, and
+encoding the result. Here a page is read as plain rows of just the
+response model's columns, validated in one pass by a TypeAdapter over a
+TypedDict with the model's fields (so no model instances are built), and
+dumped to JSON bytes by pydantic-core. The JSON is the same as the
+response model would produce, field order included.
+"""
+from functools import lru_cache
+from typing import List, Optional, Sequence, Type
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import null, select
+# pydantic only accepts the typing_extensions TypedDict before Python 3.12
+from typing_extensions import TypedDict
+
+from .pagination import paginate
+
+
+@lru_cache(maxsize=None)
+def row_adapter(schema: Type[BaseModel]) -> TypeAdapter:
+    """Batch adapter validating a list of rows against the schema's fields"""
+    fields = {name: field.annotation for name, field in schema.model_fields.items()}
+    return TypeAdapter(List[TypedDict(f"{schema.__name__}Row", fields)])
+
+
+def columns(model, schema: Type[BaseModel]) -> list:
+    """The model's columns for each schema field, in field order; NULL for fields that are not columns"""
+    table = model.__table__.columns
+    return [getattr(model, name) if name in table else null().label(name) for name in schema.model_fields]
+
+
+def page_statement(model, schema: Type[BaseModel], skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    return paginate(select(*columns(model, schema)), model.id, skip, limit, after_id)
+
+
+def render(schema: Type[BaseModel], rows: Sequence) -> bytes:
+    adapter = row_adapter(schema)
+    return adapter.dump_json(adapter.validate_python([row._asdict() for row in rows]))
+
+
+def json_response(schema: Type[BaseModel], rows: Sequence) -> Response:
+    return Response(content=render(schema, rows), media_type="application/json")
@@ -1,23 +1,58 @@
+import asyncio
 import os
-from fastapi import FastAPI, Depends, HTTPException, Request
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic_core import to_json
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Union
 
-from . import crud, models, schemas
-from .database import SessionLocal, engine, get_db
+from . import (
+    backup, cache, crud, events, export, facets, forecast, lean, metrics, migrations, models, pagination, params, profiling,
+    schemas, search, sync, telemetry, tenancy,
+)
+from .database import SessionLocal, async_engine, current_sessionmaker, engine, get_db, settings
+
+# Create database tables and upgrade databases from earlier releases
+migrations.init_db(engine)
+
+# Build the inventory rollup for databases created before it existed
+with SessionLocal() as db:
+    crud.ensure_inventory_rollup(db)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    telemetry.writer.start()
+    await events.hub.start()
+    if tenancy.settings.enabled:
+        tenancy.registry.start()
+    yield
+    await events.hub.stop()
+    await tenancy.registry.stop()
+    # Flush queued telemetry before the process exits
+    await asyncio.to_thread(telemetry.writer.stop)
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="Filament Inventory API",
     description="API for tracking 3D printing filament inventory, purchases, and spools",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Bump the data version on every committed write, and answer GETs on the
+# read endpoints with ETags, 304s and cached responses keyed on that version
+cache.track_writes(engine)
+if async_engine is not None:
+    cache.track_writes(async_engine.sync_engine)
+app.add_middleware(cache.ConditionalGetMiddleware)
+
+# Push each batch of committed changes to the /events subscribers
+cache.data_version.subscribe(events.hub.notify)
+
 # Configure CORS for local development
 app.add_middleware(
     CORSMiddleware,
@@ -25,14 +60,68 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified"],
 )
 
+# Opt-in SQL profiling: slow-query log, N+1 warnings and per-endpoint query budgets
+if profiling.ENABLED:
+    profiling.install(engine)
+    if async_engine is not None:
+        profiling.install(async_engine.sync_engine)
+    app.add_middleware(profiling.ProfilingMiddleware)
+
+# Per-route latency, size, status and database use, served on /metrics.
+# Added last so it is outermost and times the whole middleware stack
+metrics.track_queries(engine)
+if async_engine is not None:
+    metrics.track_queries(async_engine.sync_engine)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Opt-in workspaces, each with its own database, named by a header or a /w/<name>/
+# path prefix. Outermost, so everything inside already sees the workspace's path,
+# database and data version
+if tenancy.settings.enabled:
+    if settings.async_mode:
+        raise RuntimeError("FILAMENT_WORKSPACE_DIR cannot be combined with FILAMENT_ASYNC")
+    tenancy.registry.on_engine(metrics.track_queries)
+    if profiling.ENABLED:
+        tenancy.registry.on_engine(profiling.install)
+    app.add_middleware(tenancy.WorkspaceMiddleware)
+
+# In async mode the hot endpoints are served by async handlers, which are
+# registered first so they take precedence over the sync routes below
+if settings.async_mode:
+    from .async_routes import router as async_router
+    app.include_router(async_router)
+
 # Serve static files in production
 static_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "frontend", "dist")
 if os.path.exists(static_dir):
     app.mount("/assets", StaticFiles(directory=os.path.join(static_dir, "assets")), name="assets")
 
 
+# References may be given by id, by name or both; fill in whichever is missing
+def _resolve_vendor(db: Session, ref) -> None:
+    _resolve_vendors(db, [ref])
+
+
+def _resolve_vendors(db: Session, refs) -> None:
+    for ref, resolved in zip(refs, crud.resolve_vendor_refs(db, refs)):
+        if resolved is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Manufacturer '{ref.manufacturer or ref.vendor_id}' not found. Please create the vendor first.",
+            )
+        ref.vendor_id, ref.manufacturer = resolved
+
+
+def _resolve_filaments(db: Session, refs) -> None:
+    for ref, resolved in zip(refs, crud.resolve_filament_refs(db, refs)):
+        if resolved is None:
+            raise HTTPException(status_code=400, detail=f"Filament '{ref.filament_name or ref.filament_id}' not found")
+        ref.filament_id, ref.filament_name = resolved
+
+
 # Vendor endpoints
 @app.post("/vendors/", response_model=schemas.Vendor, tags=["Vendors"])
 def create_vendor(vendor: schemas.VendorCreate, db: Session = Depends(get_db)):
@@ -43,8 +132,29 @@ def create_vendor(vendor: schemas.VendorCreate, db: Session = Depends(get_db)):
 
 
 @app.get("/vendors/", response_model=List[schemas.Vendor], tags=["Vendors"])
-def read_vendors(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_vendors(db, skip=skip, limit=limit)
+def read_vendors(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    after_id = pagination.after_id_from_cursor("vendors", cursor)
+    rows = db.execute(lean.page_statement(models.Vendor, schemas.Vendor, skip, limit, after_id)).all()
+    result = lean.json_response(schemas.Vendor, rows)
+    pagination.set_next_cursor(result, "vendors", rows, limit)
+    return result
+
+
+@app.put("/vendors/by-name", response_model=List[schemas.Vendor], tags=["Vendors"])
+def upsert_vendors(batch: schemas.VendorBatchUpsert, db: Session = Depends(get_db)):
+    """Create or replace many vendors by name in one statement"""
+    return crud.upsert_vendors(db, batch.items)
+
+
+@app.put("/vendors/by-name/{name:path}", response_model=schemas.Vendor, tags=["Vendors"])
+def upsert_vendor(name: str, vendor: schemas.VendorUpsert, db: Session = Depends(get_db)):
+    """Create the vendor, or replace its fields if the name exists; safe to retry"""
+    return crud.upsert_vendors(db, [schemas.VendorCreate(name=name, **vendor.model_dump())])[0]
 
 
 @app.get("/vendors/{vendor_id}", response_model=schemas.Vendor, tags=["Vendors"])
@@ -79,16 +189,68 @@ def create_filament(filament: schemas.FilamentCreate, db: Session = Depends(get_
         raise HTTPException(status_code=400, detail="Filament already exists")
 
     # Verify manufacturer exists
-    db_vendor = crud.get_vendor_by_name(db, name=filament.manufacturer)
-    if not db_vendor:
-        raise HTTPException(status_code=400, detail=f"Manufacturer '{filament.manufacturer}' not found. Please create the vendor first.")
+    _resolve_vendor(db, filament)
 
     return crud.create_filament(db=db, filament=filament)
 
 
+@app.post("/filaments/bulk", response_model=schemas.BulkResult, tags=["Filaments"])
+def bulk_create_filaments(bulk: schemas.FilamentBulkCreate, db: Session = Depends(get_db)):
+    """Import many filaments in one transaction, optionally creating missing vendors"""
+    return crud.bulk_create_filaments(
+        db, bulk.items, create_missing_vendors=bulk.create_missing_vendors, atomic=bulk.atomic
+    )
+
+
+@app.put("/filaments/by-name", response_model=List[schemas.Filament], tags=["Filaments"])
+def upsert_filaments(batch: schemas.FilamentBatchUpsert, db: Session = Depends(get_db)):
+    """Create or replace many filaments by name in one statement"""
+    _resolve_vendors(db, batch.items)
+    return crud.upsert_filaments(db, batch.items)
+
+
+@app.put("/filaments/by-name/{name:path}", response_model=schemas.Filament, tags=["Filaments"])
+def upsert_filament(name: str, filament: schemas.FilamentUpsert, db: Session = Depends(get_db)):
+    """Create the filament, or replace its fields if the name exists; safe to retry"""
+    filament = schemas.FilamentCreate(**filament.model_dump(exclude={"name"}), name=name)
+    _resolve_vendor(db, filament)
+    return crud.upsert_filaments(db, [filament])[0]
+
+
 @app.get("/filaments/", response_model=List[schemas.Filament], tags=["Filaments"])
-def read_filaments(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_filaments(db, skip=skip, limit=limit)
+def read_filaments(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    after_id = pagination.after_id_from_cursor("filaments", cursor)
+    rows = db.execute(lean.page_statement(models.Filament, schemas.Filament, skip, limit, after_id)).all()
+    result = lean.json_response(schemas.Filament, rows)
+    pagination.set_next_cursor(result, "filaments", rows, limit)
+    return result
+
+
+@app.get("/filaments/search", response_model=List[schemas.Filament], tags=["Filaments"])
+def search_filaments(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
+    """Search the catalog; every word in q is matched as a prefix, best matches first"""
+    return search.search_filaments(db, q, limit=limit)
+
+
+@app.get("/filaments/facets", response_model=schemas.FilamentFacets, tags=["Filaments"])
+def get_filament_facets(
+    material: Optional[str] = None,
+    color: Optional[str] = None,
+    manufacturer: Optional[str] = None,
+    feature: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Filament counts per material, color, manufacturer and feature under the given filters"""
+    return facets.filament_facets(db, material=material, color=color, manufacturer=manufacturer, feature=feature)
 
 
 @app.get("/filaments/{filament_id}", response_model=schemas.Filament, tags=["Filaments"])
@@ -101,6 +263,8 @@ def read_filament(filament_id: int, db: Session = Depends(get_db)):
 
 @app.put("/filaments/{filament_id}", response_model=schemas.Filament, tags=["Filaments"])
 def update_filament(filament_id: int, filament: schemas.FilamentUpdate, db: Session = Depends(get_db)):
+    if filament.model_fields_set & {"vendor_id", "manufacturer"}:
+        _resolve_vendor(db, filament)
     db_filament = crud.update_filament(db, filament_id=filament_id, filament=filament)
     if db_filament is None:
         raise HTTPException(status_code=404, detail="Filament not found")
@@ -119,22 +283,37 @@ def delete_filament(filament_id: int, db: Session = Depends(get_db)):
 @app.post("/purchases/", response_model=schemas.Purchase, tags=["Purchases"])
 def create_purchase(purchase: schemas.PurchaseCreate, db: Session = Depends(get_db)):
     # Verify all filaments exist
-    for item in purchase.items:
-        db_filament = crud.get_filament_by_name(db, name=item.filament_name)
-        if not db_filament:
-            raise HTTPException(status_code=400, detail=f"Filament '{item.filament_name}' not found")
+    _resolve_filaments(db, purchase.items)
 
     return crud.create_purchase(db=db, purchase=purchase)
 
 
+@app.post("/purchases/bulk", response_model=schemas.BulkResult, tags=["Purchases"])
+def bulk_create_purchases(bulk: schemas.PurchaseBulkCreate, db: Session = Depends(get_db)):
+    """Import many purchases with their items in one transaction"""
+    return crud.bulk_create_purchases(db, bulk.items, atomic=bulk.atomic)
+
+
 @app.get("/purchases/", response_model=List[schemas.Purchase], tags=["Purchases"])
-def read_purchases(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_purchases(db, skip=skip, limit=limit)
+def read_purchases(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """List purchases with their items; include=filament also embeds each item's filament"""
+    after_id = pagination.after_id_from_cursor("purchases", cursor)
+    expand = params.parse_include(include, crud.PURCHASE_INCLUDES)
+    rows = crud.get_purchases(db, skip=skip, limit=limit, after_id=after_id, include=expand)
+    return pagination.set_next_cursor(response, "purchases", rows, limit)
 
 
 @app.get("/purchases/{purchase_id}", response_model=schemas.Purchase, tags=["Purchases"])
-def read_purchase(purchase_id: int, db: Session = Depends(get_db)):
-    db_purchase = crud.get_purchase(db, purchase_id=purchase_id)
+def read_purchase(purchase_id: int, include: Optional[str] = None, db: Session = Depends(get_db)):
+    expand = params.parse_include(include, crud.PURCHASE_INCLUDES)
+    db_purchase = crud.get_purchase(db, purchase_id=purchase_id, include=expand)
     if db_purchase is None:
         raise HTTPException(status_code=404, detail="Purchase not found")
     return db_purchase
@@ -158,8 +337,40 @@ def delete_purchase(purchase_id: int, db: Session = Depends(get_db)):
 
 # Purchase Item endpoints
 @app.get("/purchase-items/", response_model=List[schemas.PurchaseItem], tags=["Purchase Items"])
-def read_purchase_items(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_purchase_items(db, skip=skip, limit=limit)
+def read_purchase_items(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    after_id = pagination.after_id_from_cursor("purchase_items", cursor)
+    rows = db.execute(lean.page_statement(models.PurchaseItem, schemas.PurchaseItem, skip, limit, after_id)).all()
+    result = lean.json_response(schemas.PurchaseItem, rows)
+    pagination.set_next_cursor(result, "purchase_items", rows, limit)
+    return result
+
+
+@app.patch("/purchase-items/bulk", response_model=schemas.BulkUpdateResult, tags=["Purchase Items"])
+def bulk_update_purchase_items(bulk: schemas.PurchaseItemBulkUpdate, db: Session = Depends(get_db)):
+    """Change many purchase items by id in one transaction"""
+    _resolve_filaments(db, [item for item in bulk.items if item.model_fields_set & {"filament_id", "filament_name"}])
+    return crud.bulk_update_purchase_items(db, bulk.items, atomic=bulk.atomic)
+
+
+@app.delete("/purchase-items/bulk", response_model=schemas.BulkDeleteResult, tags=["Purchase Items"])
+def bulk_delete_purchase_items(
+    purchase_id: Optional[int] = None,
+    filament_id: Optional[int] = None,
+    shelf: Optional[str] = None,
+    ordered_before: Optional[date] = None,
+    received_before: Optional[date] = None,
+    db: Session = Depends(get_db),
+):
+    """Delete every purchase item matching the filters in one transaction"""
+    conditions = crud.purchase_item_conditions(purchase_id, filament_id, shelf, ordered_before, received_before)
+    if not conditions:
+        raise HTTPException(status_code=400, detail="At least one filter is required")
+    return {"deleted": crud.delete_purchase_items_where(db, conditions)}
 
 
 @app.get("/purchase-items/{item_id}", response_model=schemas.PurchaseItem, tags=["Purchase Items"])
@@ -172,6 +383,8 @@ def read_purchase_item(item_id: int, db: Session = Depends(get_db)):
 
 @app.put("/purchase-items/{item_id}", response_model=schemas.PurchaseItem, tags=["Purchase Items"])
 def update_purchase_item(item_id: int, item: schemas.PurchaseItemUpdate, db: Session = Depends(get_db)):
+    if item.model_fields_set & {"filament_id", "filament_name"}:
+        _resolve_filaments(db, [item])
     db_item = crud.update_purchase_item(db, item_id=item_id, item=item)
     if db_item is None:
         raise HTTPException(status_code=404, detail="Purchase item not found")
@@ -190,16 +403,52 @@ def delete_purchase_item(item_id: int, db: Session = Depends(get_db)):
 @app.post("/spools/", response_model=schemas.Spool, tags=["Spools"])
 def create_spool(spool: schemas.SpoolCreate, db: Session = Depends(get_db)):
     # Verify filament exists
-    db_filament = crud.get_filament_by_name(db, name=spool.filament_name)
-    if not db_filament:
-        raise HTTPException(status_code=400, detail=f"Filament '{spool.filament_name}' not found")
+    _resolve_filaments(db, [spool])
 
     return crud.create_spool(db=db, spool=spool)
 
 
+@app.post("/spools/bulk", response_model=schemas.BulkResult, tags=["Spools"])
+def bulk_create_spools(bulk: schemas.SpoolBulkCreate, db: Session = Depends(get_db)):
+    """Import many spools in one transaction"""
+    return crud.bulk_create_spools(db, bulk.items, atomic=bulk.atomic)
+
+
+@app.patch("/spools/bulk", response_model=schemas.BulkUpdateResult, tags=["Spools"])
+def bulk_update_spools(bulk: schemas.SpoolBulkUpdate, db: Session = Depends(get_db)):
+    """Change many spools by id in one transaction, e.g. a weigh-in session"""
+    _resolve_filaments(db, [spool for spool in bulk.items if spool.model_fields_set & {"filament_id", "filament_name"}])
+    return crud.bulk_update_spools(db, bulk.items, atomic=bulk.atomic)
+
+
+@app.delete("/spools/bulk", response_model=schemas.BulkDeleteResult, tags=["Spools"])
+def bulk_delete_spools(
+    filament_id: Optional[int] = None,
+    shelf: Optional[str] = None,
+    finished: Optional[bool] = None,
+    finished_before: Optional[date] = None,
+    opened_before: Optional[date] = None,
+    db: Session = Depends(get_db),
+):
+    """Delete every spool matching the filters, with its readings, in one transaction"""
+    conditions = crud.spool_conditions(filament_id, shelf, finished, finished_before, opened_before)
+    if not conditions:
+        raise HTTPException(status_code=400, detail="At least one filter is required")
+    return {"deleted": crud.delete_spools_where(db, conditions)}
+
+
 @app.get("/spools/", response_model=List[schemas.Spool], tags=["Spools"])
-def read_spools(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_spools(db, skip=skip, limit=limit)
+def read_spools(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    after_id = pagination.after_id_from_cursor("spools", cursor)
+    rows = db.execute(lean.page_statement(models.Spool, schemas.Spool, skip, limit, after_id)).all()
+    result = lean.json_response(schemas.Spool, rows)
+    pagination.set_next_cursor(result, "spools", rows, limit)
+    return result
 
 
 @app.get("/spools/{spool_id}", response_model=schemas.Spool, tags=["Spools"])
@@ -212,11 +461,22 @@ def read_spool(spool_id: int, db: Session = Depends(get_db)):
 
 @app.get("/spools/by-filament/{filament_name}", response_model=List[schemas.Spool], tags=["Spools"])
 def read_spools_by_filament(filament_name: str, db: Session = Depends(get_db)):
-    return crud.get_spools_by_filament(db, filament_name=filament_name)
+    stmt = crud.spools_by_filament_statement(filament_name, *lean.columns(models.Spool, schemas.Spool))
+    return lean.json_response(schemas.Spool, db.execute(stmt).all())
+
+
+@app.get("/spools/{spool_id}/readings", response_model=List[schemas.SpoolReading], tags=["Spools"])
+def read_spool_readings(spool_id: int, db: Session = Depends(get_db)):
+    """Weight history of a spool, oldest first"""
+    if crud.get_spool(db, spool_id=spool_id) is None:
+        raise HTTPException(status_code=404, detail="Spool not found")
+    return crud.get_spool_readings(db, spool_id=spool_id)
 
 
 @app.put("/spools/{spool_id}", response_model=schemas.Spool, tags=["Spools"])
 def update_spool(spool_id: int, spool: schemas.SpoolUpdate, db: Session = Depends(get_db)):
+    if spool.model_fields_set & {"filament_id", "filament_name"}:
+        _resolve_filaments(db, [spool])
     db_spool = crud.update_spool(db, spool_id=spool_id, spool=spool)
     if db_spool is None:
         raise HTTPException(status_code=404, detail="Spool not found")
@@ -231,11 +491,171 @@ def delete_spool(spool_id: int, db: Session = Depends(get_db)):
     return {"message": "Spool deleted successfully"}
 
 
+# Telemetry endpoints
+@app.post("/telemetry/readings", response_model=schemas.TelemetryAccepted, status_code=202, tags=["Telemetry"])
+def ingest_telemetry(body: Union[schemas.TelemetryBatch, schemas.TelemetryReading]):
+    """Queue one reading or a batch of scale readings for the background writer"""
+    received_at = datetime.utcnow()
+    reports = body.readings if isinstance(body, schemas.TelemetryBatch) else [body]
+    readings = [
+        telemetry.to_reading(report.spool_id, report.grams, report.timestamp, received_at) for report in reports
+    ]
+    if not telemetry.writer.submit(readings, current_sessionmaker.get()):
+        raise HTTPException(status_code=503, detail="Telemetry queue is full, retry later",
+                            headers={"Retry-After": "1"})
+    return {"accepted": len(readings), "queue_depth": telemetry.writer.stats()["queue_depth"]}
+
+
+@app.get("/telemetry/stats", response_model=schemas.TelemetryStats, tags=["Telemetry"])
+def get_telemetry_stats():
+    """Queue depth, throughput counters and recent flush latency of the telemetry writer"""
+    return telemetry.writer.stats()
+
+
 # Inventory summary endpoint
 @app.get("/inventory/summary", response_model=List[schemas.InventorySummary], tags=["Inventory"])
-def get_inventory_summary(db: Session = Depends(get_db)):
+def get_inventory_summary(
+    material: Optional[str] = None,
+    manufacturer: Optional[str] = None,
+    color: Optional[str] = None,
+    skip: int = 0,
+    limit: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
     """Get inventory summary showing total purchased, opened, and remaining kg for each filament"""
-    return crud.get_inventory_summary(db)
+    return crud.get_inventory_summary(
+        db, material=material, manufacturer=manufacturer, color=color, skip=skip, limit=limit
+    )
+
+
+@app.get("/inventory/forecast", response_model=schemas.InventoryForecast, tags=["Inventory"])
+def get_inventory_forecast(
+    response: Response,
+    window_days: int = Query(forecast.DEFAULT_WINDOW_DAYS, ge=1, le=3650),
+    material: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Burn rate per filament and material from spool weight readings, with projected run-out dates.
+
+    Lists the filaments with readings in the window, a page at a time by id.
+    """
+    after_id = pagination.after_id_from_cursor("forecast", cursor)
+    result = forecast.inventory_forecast(
+        db, window_days=window_days, material=material, skip=skip, limit=limit, after_id=after_id
+    )
+    pagination.set_next_cursor(response, "forecast", result["filaments"], limit, id_key="filament_id")
+    return result
+
+
+@app.get("/inventory/facets", response_model=schemas.InventoryFacets, tags=["Inventory"])
+def get_inventory_facets(
+    material: Optional[str] = None,
+    color: Optional[str] = None,
+    manufacturer: Optional[str] = None,
+    feature: Optional[str] = None,
+    shelf: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Facet counts with remaining kg from the inventory summary, plus open spools per shelf"""
+    return facets.inventory_facets(
+        db, material=material, color=color, manufacturer=manufacturer, feature=feature, shelf=shelf
+    )
+
+
+# Export endpoints
+EXPORT_MEDIA_TYPES = {
+    schemas.ExportFormat.csv: "text/csv",
+    schemas.ExportFormat.ndjson: "application/x-ndjson",
+}
+
+
+@app.get("/export/{table}", tags=["Export"])
+def export_table(
+    table: schemas.ExportTable,
+    format: schemas.ExportFormat = schemas.ExportFormat.csv,
+    db: Session = Depends(get_db),
+):
+    """Stream a whole table as CSV or NDJSON; purchases include their items"""
+    return StreamingResponse(
+        export.stream_table(table.value, format.value, db_engine=db.get_bind()),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{table.value}.{format.value}"'},
+    )
+
+
+# Sync endpoint
+@app.get("/sync", response_model=schemas.SyncChanges, tags=["Sync"])
+def get_sync(
+    since: int = Query(0, ge=0),
+    limit: int = Query(sync.DEFAULT_LIMIT, ge=1, le=sync.MAX_LIMIT),
+    db: Session = Depends(get_db),
+):
+    """Rows changed and ids deleted after the since token, across all tables; start from 0"""
+    try:
+        result = sync.changes_since(db, since=since, limit=limit)
+    except sync.TokenAhead as exc:
+        raise HTTPException(status_code=410, detail=str(exc))
+    return Response(content=to_json(result), media_type="application/json")
+
+
+# Events endpoint
+@app.get("/events", tags=["Sync"])
+async def stream_events(
+    since: Optional[int] = Query(None, ge=0),
+    last_event_id: Optional[int] = Header(None),
+):
+    """Server-sent events with the rows and summary totals each commit changed; resumes from Last-Event-ID or since"""
+    hub = tenancy.current_hub()
+    await hub.start()
+    return StreamingResponse(
+        hub.subscribe(last_event_id if last_event_id is not None else since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Backup endpoints
+@app.get("/admin/backups", response_model=List[schemas.BackupInfo], tags=["Admin"])
+def list_backups(db: Session = Depends(get_db)):
+    """Backups of the database, newest first"""
+    try:
+        return backup.list_backups(db.get_bind())
+    except backup.BackupError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@app.post("/admin/backups", response_model=schemas.BackupReport, tags=["Admin"])
+def create_backup(db: Session = Depends(get_db)):
+    """Take a consistent, gzipped snapshot of the live database without pausing requests"""
+    try:
+        return backup.create_backup(db.get_bind())
+    except backup.BackupBusy as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    except backup.BackupError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@app.post("/admin/backups/{name}/restore", response_model=schemas.RestoreReport, tags=["Admin"])
+def restore_backup(name: str, db: Session = Depends(get_db)):
+    """Replace the database's contents with a backup, after backing up the current data"""
+    try:
+        return backup.restore_backup(db.get_bind(), name)
+    except backup.BackupNotFound as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    except backup.BackupBusy as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    except backup.BackupError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+# Metrics endpoint
+@app.get("/metrics", tags=["Metrics"])
+def get_metrics():
+    """Request metrics in the Prometheus text exposition format"""
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
 
 
 # Catch-all route for SPA in production
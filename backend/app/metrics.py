@@ -0,0 +1,226 @@
+"""Per-route request metrics in the Prometheus text format.
+
+An ASGI middleware times every HTTP request and records, per method and
+route template (``/spools/{spool_id}``, not the concrete path, so the
+number of series stays bounded): a latency histogram, a response size
+histogram, request counts by status, and the database time and number of
+statements the request ran. Statements are attributed to the request
+through a context variable that engine events read, so work done outside
+a request, such as the telemetry writer's flushes, is not counted.
+
+Recording is a few dictionary updates under one lock; rendering happens
+only when ``/metrics`` is scraped.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Label for requests that matched no route, so unknown paths add no series
+UNMATCHED_ROUTE = "unmatched"
+
+
+class RequestStats:
+    """Statements and database time accumulated by the current request"""
+
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...], amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self.values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound if bound == "+Inf" else _number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """The request metrics, updated and rendered under one lock"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        route = ("method", "route")
+        self.requests = Counter("filament_http_requests_total", "HTTP requests by route and status.",
+                                route + ("status",))
+        self.latency = Histogram("filament_http_request_duration_seconds", "Time to the end of the response body.",
+                                 route, LATENCY_BUCKETS)
+        self.size = Histogram("filament_http_response_size_bytes", "Response body size.", route, SIZE_BUCKETS)
+        self.queries = Histogram("filament_http_request_db_queries", "SQL statements run per request.",
+                                 route, QUERY_BUCKETS)
+        self.db_time = Histogram("filament_http_request_db_seconds", "Time spent executing SQL per request.",
+                                 route, LATENCY_BUCKETS)
+        self.in_flight = 0
+
+    def started(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, method: str, route: str, status: int, seconds: float, size: int, stats: RequestStats) -> None:
+        labels = (method, route)
+        with self._lock:
+            self.in_flight -= 1
+            self.requests.inc(labels + (str(status),))
+            self.latency.observe(labels, seconds)
+            self.size.observe(labels, size)
+            self.queries.observe(labels, stats.queries)
+            self.db_time.observe(labels, stats.db_seconds)
+
+    def render(self) -> str:
+        with self._lock:
+            lines = [
+                "# HELP filament_http_requests_in_flight HTTP requests being served.",
+                "# TYPE filament_http_requests_in_flight gauge",
+                f"filament_http_requests_in_flight {self.in_flight}",
+            ]
+            for metric in (self.requests, self.latency, self.size, self.queries, self.db_time):
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def track_queries(db_engine: Engine) -> None:
+    """Add each statement's count and duration to the request that ran it"""
+
+    @event.listens_for(db_engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        if current_request.get() is not None:
+            conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(db_engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        stats = current_request.get()
+        started = conn.info.get("metrics_started")
+        if stats is not None and started:
+            stats.queries += 1
+            stats.db_seconds += time.perf_counter() - started.pop()
+
+
+def _flatten(routes) -> Iterator:
+    for route in routes:
+        # Newer FastAPI releases keep included routers nested instead of copying their routes
+        nested = getattr(route, "original_router", None)
+        if nested is not None:
+            yield from _flatten(nested.routes)
+        else:
+            yield route
+
+
+def route_template(scope) -> str:
+    """The matched route's path template, set on the scope by the router"""
+    route = scope.get("route")
+    if route is None:
+        # Answered before routing, e.g. from the response cache: match it here
+        router = getattr(scope.get("app"), "router", None)
+        for candidate in _flatten(getattr(router, "routes", ())):
+            if candidate.matches(scope)[0] == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, size, status and database use per route"""
+
+    def __init__(self, app, metrics: Registry = registry):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+
+        async def measure(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        self.metrics.started()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, measure)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            self.metrics.finished(scope["method"], route_template(scope), status, elapsed, size, stats)
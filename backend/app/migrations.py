@@ -0,0 +1,72 @@
+"""Schema setup and in-place upgrades for existing databases.
+
+``create_all`` only creates missing tables, so columns and indexes added to
+existing tables are applied here. Every step checks the live schema first
+and is safe to run on each startup.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from . import models, search, sync
+
+# (table, column, DDL type) for surrogate foreign keys added after the first release
+SURROGATE_KEYS = (
+    ("filaments", "vendor_id", "INTEGER REFERENCES vendors(id)"),
+    ("purchase_items", "filament_id", "INTEGER REFERENCES filaments(id)"),
+    ("spools", "filament_id", "INTEGER REFERENCES filaments(id)"),
+)
+
+# Fill columns and tables added after the first release from existing data
+BACKFILLS = (
+    "UPDATE filaments SET vendor_id = "
+    "(SELECT vendors.id FROM vendors WHERE vendors.name = filaments.manufacturer) "
+    "WHERE vendor_id IS NULL",
+    "UPDATE purchase_items SET filament_id = "
+    "(SELECT filaments.id FROM filaments WHERE filaments.name = purchase_items.filament_name) "
+    "WHERE filament_id IS NULL",
+    "UPDATE spools SET filament_id = "
+    "(SELECT filaments.id FROM filaments WHERE filaments.name = spools.filament_name) "
+    "WHERE filament_id IS NULL",
+    # Spools from before the reading history start it at their current weight
+    "INSERT INTO spool_readings (spool_id, remaining_kg, recorded_at) "
+    "SELECT id, remaining_kg, COALESCE(created_at, CURRENT_TIMESTAMP) FROM spools "
+    "WHERE NOT EXISTS (SELECT 1 FROM spool_readings WHERE spool_readings.spool_id = spools.id)",
+)
+
+
+def _columns(inspector, table: str) -> set:
+    return {column["name"] for column in inspector.get_columns(table)}
+
+
+def upgrade(engine: Engine) -> None:
+    """Add missing columns, backfill them and create any missing indexes, search tables and sync triggers"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, column, ddl in SURROGATE_KEYS:
+            if column not in _columns(inspector, table):
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+        for statement in BACKFILLS:
+            conn.execute(text(statement))
+        for model in sync.VERSIONED_MODELS:
+            if "sync_version" not in _columns(inspector, model.__tablename__):
+                conn.execute(text(f"ALTER TABLE {model.__tablename__} ADD COLUMN sync_version INTEGER"))
+        if "min_token" not in _columns(inspector, models.SyncCounter.__tablename__):
+            conn.execute(text("ALTER TABLE sync_counter ADD COLUMN min_token INTEGER NOT NULL DEFAULT 0"))
+
+        # The rollup used to be keyed by filament name; drop it so it is rebuilt by id
+        if "filament_name" in _columns(inspector, models.InventoryRollup.__tablename__):
+            models.InventoryRollup.__table__.drop(conn)
+            models.InventoryRollup.__table__.create(conn)
+
+        for table in models.Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+        search.install(conn)
+        sync.install(conn)
+
+
+def init_db(engine: Engine) -> None:
+    """Create the schema for a new database or upgrade an existing one"""
+    models.Base.metadata.create_all(bind=engine)
+    upgrade(engine)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Text, DateTime
+from sqlalchemy import BigInteger, Column, Integer, String, Float, Date, ForeignKey, Text, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -12,6 +12,7 @@ class Vendor(Base):
     name = Column(String, unique=True, nullable=False, index=True)
     notes = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+    sync_version = Column(BigInteger, index=True)  # Set by the sync triggers on every write
 
     # Relationships
     filaments = relationship("Filament", back_populates="manufacturer_rel")
@@ -23,7 +24,8 @@ class Filament(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, nullable=False, index=True)  # Descriptive name
-    manufacturer = Column(String, ForeignKey("vendors.name"), nullable=False)
+    vendor_id = Column(Integer, ForeignKey("vendors.id"), index=True)
+    manufacturer = Column(String, nullable=False)  # Vendor name, kept in step with vendor_id; see crud._rename_children
     line = Column(String)  # Product line, e.g., "Soleyin Ultra PLA"
     material = Column(String, nullable=False, index=True)  # PLA, PETG, ABS, etc.
     product = Column(String)  # e.g., "Matte Black"
@@ -33,12 +35,18 @@ class Filament(Base):
     notes = Column(Text)
     date_added = Column(Date, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    sync_version = Column(BigInteger, index=True)
 
     # Relationships
     manufacturer_rel = relationship("Vendor", back_populates="filaments")
     purchase_items = relationship("PurchaseItem", back_populates="filament_rel")
     spools = relationship("Spool", back_populates="filament_rel")
 
+    __table_args__ = (
+        # Covers the single grouped pass behind the facet counts
+        Index("ix_filaments_facets", "material", "color", "manufacturer", "feature"),
+    )
+
 
 class Purchase(Base):
     """Overall purchase orders"""
@@ -52,6 +60,7 @@ class Purchase(Base):
     tax = Column(Float, default=0.0)
     notes = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+    sync_version = Column(BigInteger, index=True)
 
     # Relationships
     items = relationship("PurchaseItem", back_populates="purchase")
@@ -62,8 +71,9 @@ class PurchaseItem(Base):
     __tablename__ = "purchase_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    purchase_id = Column(Integer, ForeignKey("purchases.id"), nullable=False)
-    filament_name = Column(String, ForeignKey("filaments.name"), nullable=False)
+    purchase_id = Column(Integer, ForeignKey("purchases.id"), nullable=False, index=True)
+    filament_id = Column(Integer, ForeignKey("filaments.id"), index=True)
+    filament_name = Column(String, nullable=False)  # Filament name, kept in step with filament_id; see crud._rename_children
     seller = Column(String)
     date_ordered = Column(Date, nullable=False)
     date_received = Column(Date)
@@ -73,24 +83,94 @@ class PurchaseItem(Base):
     shelf = Column(String)  # Storage location, e.g., "A1LB"
     notes = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+    sync_version = Column(BigInteger, index=True)
 
     # Relationships
     purchase = relationship("Purchase", back_populates="items")
     filament_rel = relationship("Filament", back_populates="purchase_items")
 
+    @property
+    def filament(self):
+        """The filament record if it was eager-loaded, without triggering a lazy load"""
+        return self.__dict__.get("filament_rel")
+
 
 class Spool(Base):
     """Individual spool tracking when opened"""
     __tablename__ = "spools"
 
     id = Column(Integer, primary_key=True, index=True)
-    filament_name = Column(String, ForeignKey("filaments.name"), nullable=False)
+    filament_id = Column(Integer, ForeignKey("filaments.id"), index=True)
+    filament_name = Column(String, nullable=False)  # Filament name, kept in step with filament_id; see crud._rename_children
     date_opened = Column(Date, nullable=False)
     date_finished = Column(Date)  # Optional
     shelf = Column(String)
     remaining_kg = Column(Float, nullable=False)
     notes = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+    sync_version = Column(BigInteger, index=True)
 
     # Relationships
     filament_rel = relationship("Filament", back_populates="spools")
+    # Removed with a set-based DELETE in crud.delete_spool rather than loaded and deleted one by one
+    readings = relationship("SpoolReading", back_populates="spool", passive_deletes="all",
+                            order_by="SpoolReading.recorded_at")
+
+    __table_args__ = (
+        # Per-filament summaries split spools on whether they are finished
+        Index("ix_spools_filament_id_date_finished", "filament_id", "date_finished"),
+    )
+
+
+class SpoolReading(Base):
+    """Append-only history of a spool's remaining weight"""
+    __tablename__ = "spool_readings"
+
+    id = Column(Integer, primary_key=True, index=True)
+    spool_id = Column(Integer, ForeignKey("spools.id"), nullable=False)
+    remaining_kg = Column(Float, nullable=False)
+    recorded_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    sync_version = Column(BigInteger, index=True)
+
+    # Relationships
+    spool = relationship("Spool", back_populates="readings")
+
+    __table_args__ = (
+        # Readings are read back per spool in time order
+        Index("ix_spool_readings_spool_id_recorded_at", "spool_id", "recorded_at"),
+    )
+
+
+class InventoryRollup(Base):
+    """Per-filament inventory totals maintained alongside purchase items and spools"""
+    __tablename__ = "inventory_rollups"
+
+    filament_id = Column(Integer, ForeignKey("filaments.id"), primary_key=True)
+    purchased_kg = Column(Float, nullable=False, default=0.0)
+    purchased_spools = Column(Integer, nullable=False, default=0)
+    purchase_item_count = Column(Integer, nullable=False, default=0)
+    kg_per_spool_total = Column(Float, nullable=False, default=0.0)  # Sum over items, for the average
+    spool_count = Column(Integer, nullable=False, default=0)  # Spools opened, including finished ones
+    finished_spools = Column(Integer, nullable=False, default=0)
+    remaining_opened_kg = Column(Float, nullable=False, default=0.0)  # Remaining in unfinished spools
+    sync_version = Column(BigInteger, index=True)
+
+
+class SyncCounter(Base):
+    """Single row holding the last change version handed out"""
+    __tablename__ = "sync_counter"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)  # SQLite only; see sync
+    # Tokens below this were handed out before a restore and are refused
+    min_token = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+
+class SyncTombstone(Base):
+    """A deleted row, recorded under the change version of its delete"""
+    __tablename__ = "sync_tombstones"
+
+    # On PostgreSQL all deletes of one transaction share its version
+    version = Column(BigInteger, primary_key=True, autoincrement=False)
+    table_name = Column(String, primary_key=True)
+    row_id = Column(Integer, primary_key=True, autoincrement=False)
@@ -0,0 +1,70 @@
+"""Opaque cursors for keyset pagination.
+
+List endpoints are ordered by primary key, so a page can resume from the
+last id it returned instead of counting past ``skip`` rows. The cursor
+also records which table it came from so it cannot be replayed against a
+different endpoint.
+"""
+import base64
+import binascii
+import json
+from typing import Optional
+
+from fastapi import HTTPException, Response
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded or belongs to another table"""
+
+
+def paginate(query, id_column, skip: int, limit: int, after_id: Optional[int]):
+    """Order by primary key and apply keyset (after_id) or offset pagination.
+
+    Works on both legacy Query objects and select() statements.
+    """
+    query = query.order_by(id_column)
+    if after_id is not None:
+        query = query.filter(id_column > after_id)
+    else:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+
+def encode_cursor(table: str, last_id: int) -> str:
+    payload = json.dumps({"t": table, "id": last_id}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(table: str, cursor: str) -> int:
+    """Return the id the next page starts after"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        last_id = payload["id"]
+        cursor_table = payload["t"]
+    except (binascii.Error, ValueError, UnicodeError, KeyError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if cursor_table != table or not isinstance(last_id, int):
+        raise InvalidCursor("Invalid cursor")
+    return last_id
+
+
+def after_id_from_cursor(table: str, cursor: Optional[str]) -> Optional[int]:
+    """Decode a request's cursor parameter, rejecting bad cursors with a 400"""
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(table, cursor)
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+def set_next_cursor(response: Response, table: str, rows: list, limit: int, id_key: Optional[str] = None) -> list:
+    """Put the cursor for the following page in X-Next-Cursor when this page is full
+
+    Rows are read by attribute, or as mappings when id_key is given.
+    """
+    if rows and len(rows) == limit:
+        last_id = rows[-1][id_key] if id_key else rows[-1].id
+        response.headers["X-Next-Cursor"] = encode_cursor(table, last_id)
+    return rows
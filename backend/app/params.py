@@ -0,0 +1,18 @@
+"""Query-parameter parsing shared by the sync and async route modules"""
+from typing import Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+
+
+def parse_include(include: Optional[str], allowed: Sequence[str]) -> Tuple[str, ...]:
+    """Split a comma-separated include= value, rejecting unknown expansions"""
+    if not include:
+        return ()
+    names = tuple(name.strip() for name in include.split(",") if name.strip())
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown include '{unknown[0]}'. Allowed: {', '.join(allowed)}",
+        )
+    return names
@@ -0,0 +1,264 @@
+"""Opt-in SQL profiling: statements per request, slow queries, N+1s and query budgets.
+
+Enabled with FILAMENT_SQL_PROFILE=1. A middleware collects every statement
+a request runs (attributed through a context variable that engine events
+read) and, when the request ends:
+
+- logs each statement shape repeated FILAMENT_N_PLUS_ONE_REPEATS (default 5)
+  or more times as a probable N+1. The shape is the SQL text with expanded
+  IN lists folded to one placeholder, so the same query for different
+  rows counts as a repeat. PRAGMA statements are left out: schema
+  introspection, such as a restore migrating its database, runs one per
+  table by design;
+- compares the count with the endpoint's entry in QUERY_BUDGETS. Over
+  budget is logged, or raised as QueryBudgetExceeded when
+  FILAMENT_QUERY_BUDGET_STRICT=1 so the request fails its test.
+
+Statements slower than FILAMENT_SLOW_QUERY_MS (default 100) are logged with
+their parameters and query plan, inside requests or not.
+
+Tests and benchmarks can use ``capture()`` to collect the statements of any
+block of code without the middleware or the environment variables; on its
+own it does not turn on the slow-query log.
+"""
+import logging
+import os
+import re
+import threading
+import time
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("FILAMENT_SQL_PROFILE", "").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.environ.get("FILAMENT_SLOW_QUERY_MS", 100))
+N_PLUS_ONE_REPEATS = int(os.environ.get("FILAMENT_N_PLUS_ONE_REPEATS", 5))
+STRICT_BUDGETS = os.environ.get("FILAMENT_QUERY_BUDGET_STRICT", "").lower() in ("1", "true", "yes")
+
+# Most statements one request may run, per "METHOD /route/template". None of
+# them may depend on the page size or the number of items in a request.
+QUERY_BUDGETS: Dict[str, int] = {
+    "GET /vendors/": 1,
+    "GET /vendors/{vendor_id}": 1,
+    "GET /filaments/": 1,
+    "GET /filaments/search": 1,
+    "GET /filaments/facets": 1,
+    "GET /filaments/{filament_id}": 1,
+    "GET /purchases/": 3,  # Purchases, their items, and with include=filament the filaments
+    "GET /purchases/{purchase_id}": 3,
+    "GET /purchase-items/": 1,
+    "GET /purchase-items/{item_id}": 1,
+    "GET /spools/": 1,
+    "GET /spools/{spool_id}": 1,
+    "GET /spools/by-filament/{filament_name}": 1,
+    "GET /spools/{spool_id}/readings": 2,
+    "GET /inventory/summary": 1,
+    "GET /inventory/forecast": 4,  # Readings, spools, the page of filaments, material totals
+    "GET /inventory/facets": 2,
+    "GET /export/{table}": 2,
+    "GET /sync": 10,  # Counter, pending changes, each changed table, tombstones, summary rows
+    "POST /vendors/": 3,
+    "POST /filaments/": 4,
+    "POST /filaments/bulk": 6,
+    "PUT /vendors/by-name": 1,
+    "PUT /vendors/by-name/{name:path}": 1,
+    "PUT /filaments/by-name": 3,  # Vendor lookups by id and by name, then the upsert
+    "PUT /filaments/by-name/{name:path}": 3,
+    "POST /purchases/": 8,
+    "POST /purchases/bulk": 8,
+    "POST /spools/": 6,
+    "POST /spools/bulk": 6,
+    "PUT /vendors/{vendor_id}": 5,
+    "PUT /filaments/{filament_id}": 6,
+    "PUT /purchases/{purchase_id}": 5,
+    "PUT /purchase-items/{item_id}": 6,
+    "PUT /spools/{spool_id}": 7,
+    "PATCH /purchase-items/bulk": 7,
+    "PATCH /spools/bulk": 8,
+    "DELETE /vendors/{vendor_id}": 3,
+    "DELETE /filaments/{filament_id}": 4,
+    "DELETE /purchases/{purchase_id}": 3,
+    "DELETE /purchase-items/{item_id}": 5,
+    "DELETE /purchase-items/bulk": 4,
+    "DELETE /spools/{spool_id}": 6,
+    "DELETE /spools/bulk": 5,
+}
+
+# Statement prefix that shows the plan without running the statement
+EXPLAIN_PREFIXES = {
+    "sqlite": "EXPLAIN QUERY PLAN ",
+    "postgresql": "EXPLAIN ",
+}
+
+# Longest parameter list shown in the slow-query log
+MAX_LOGGED_PARAMETERS = 500
+
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)"
+_PLACEHOLDER_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+_PRAGMA = re.compile(r"PRAGMA\b", re.IGNORECASE)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request ran more statements than its endpoint's budget"""
+
+
+class Statement(NamedTuple):
+    shape: str
+    sql: str
+    seconds: float
+
+
+def statement_shape(sql: str) -> str:
+    """SQL with whitespace collapsed and placeholder lists folded, so repeats compare equal"""
+    return _PLACEHOLDER_LIST.sub("(?)", _WHITESPACE.sub(" ", sql).strip())
+
+
+class Profile:
+    """Statements run by one request or captured block"""
+
+    def __init__(self, ignore_threads: Sequence[str] = ()):
+        self.statements: List[Statement] = []
+        self.ignore_threads = tuple(ignore_threads)  # Thread name prefixes
+
+    def record(self, sql: str, seconds: float) -> None:
+        if self.ignore_threads and threading.current_thread().name.startswith(self.ignore_threads):
+            return
+        self.statements.append(Statement(statement_shape(sql), sql, seconds))
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def seconds(self) -> float:
+        return sum(statement.seconds for statement in self.statements)
+
+    def repeated(self, min_repeats: int = N_PLUS_ONE_REPEATS) -> List[Tuple[str, int]]:
+        """Shapes run at least min_repeats times, most repeated first: probable N+1s"""
+        counts = Counter(statement.shape for statement in self.statements if not _PRAGMA.match(statement.shape))
+        return [(shape, n) for shape, n in counts.most_common() if n >= min_repeats]
+
+    def check_budget(self, budget: int, label: str = "block") -> None:
+        if self.count > budget:
+            raise QueryBudgetExceeded(f"{label} ran {self.count} statements, over its budget of {budget}")
+
+
+current_profile: ContextVar[Optional[Profile]] = ContextVar("current_profile", default=None)
+
+_captures: List[Profile] = []
+_captures_lock = threading.Lock()
+# Engines with profiling listeners, and their slow-query threshold; workspace engines come and go
+_slow_query_ms: "weakref.WeakKeyDictionary[Engine, Optional[float]]" = weakref.WeakKeyDictionary()
+
+
+def _explain(conn, statement: str, parameters) -> str:
+    prefix = EXPLAIN_PREFIXES.get(conn.dialect.name)
+    if prefix is None:
+        return "(no plan for this database)"
+    # A separate cursor, so the statement's own results are left untouched
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        rows = cursor.fetchall()
+    except Exception as exc:
+        return f"(plan unavailable: {exc})"
+    finally:
+        cursor.close()
+    return "\n".join("  " + str(row[-1]) for row in rows)
+
+
+def _log_slow(conn, statement: str, parameters, executemany: bool, seconds: float) -> None:
+    shown = repr(parameters)
+    if len(shown) > MAX_LOGGED_PARAMETERS:
+        shown = shown[:MAX_LOGGED_PARAMETERS] + "..."
+    plan = "(executemany)" if executemany else _explain(conn, statement, parameters)
+    logger.warning("Slow query (%.1f ms): %s\nParameters: %s\nPlan:\n%s", seconds * 1000, statement, shown, plan)
+
+
+def install(db_engine: Engine, slow_query_ms: Optional[float] = SLOW_QUERY_MS) -> None:
+    """Time every statement on the engine, for profiles and the slow-query log (off with None)"""
+    first = db_engine not in _slow_query_ms
+    _slow_query_ms[db_engine] = slow_query_ms
+    if not first:
+        return
+
+    @event.listens_for(db_engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+    @event.listens_for(db_engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("profile_started")
+        if not started:
+            return
+        seconds = time.perf_counter() - started.pop()
+        profile = current_profile.get()
+        if profile is not None:
+            profile.record(statement, seconds)
+        for captured in tuple(_captures):
+            captured.record(statement, seconds)
+        threshold = _slow_query_ms[db_engine]
+        if threshold is not None and seconds * 1000 >= threshold:
+            _log_slow(conn, statement, parameters, executemany, seconds)
+
+
+@contextmanager
+def capture(db_engine: Engine, ignore_threads: Sequence[str] = ()) -> Iterator[Profile]:
+    """Collect every statement the engine runs inside the block, from any thread not named with an ignored prefix"""
+    if db_engine not in _slow_query_ms:
+        install(db_engine, slow_query_ms=None)
+    profile = Profile(ignore_threads)
+    with _captures_lock:
+        _captures.append(profile)
+    try:
+        yield profile
+    finally:
+        with _captures_lock:
+            _captures.remove(profile)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware reporting N+1 patterns and query budgets per request"""
+
+    def __init__(self, app, budgets: Dict[str, int] = QUERY_BUDGETS, repeats: int = N_PLUS_ONE_REPEATS,
+                 strict: bool = STRICT_BUDGETS):
+        self.app = app
+        self.budgets = budgets
+        self.repeats = repeats
+        self.strict = strict
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile()
+        token = current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_profile.reset(token)
+        self.report(f"{scope['method']} {metrics.route_template(scope)}", profile)
+
+    def report(self, endpoint: str, profile: Profile) -> None:
+        for shape, count in profile.repeated(self.repeats):
+            logger.warning("Probable N+1 in %s: %d x %s", endpoint, count, shape)
+        budget = self.budgets.get(endpoint)
+        if budget is None:
+            return
+        try:
+            profile.check_budget(budget, endpoint)
+        except QueryBudgetExceeded as exc:
+            if self.strict:
+                raise
+            logger.warning("%s", exc)
@@ -1,6 +1,14 @@
-from pydantic import BaseModel, ConfigDict
+from enum import Enum
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 from datetime import date, datetime
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
+
+
+def _require_reference(model, id_field: str, name_field: str):
+    """Surrogate keys and natural names are both accepted; at least one is required"""
+    if getattr(model, id_field) is None and not getattr(model, name_field):
+        raise ValueError(f"Either {id_field} or {name_field} is required")
+    return model
 
 
 # Vendor Schemas
@@ -13,6 +21,10 @@ class VendorCreate(VendorBase):
     pass
 
 
+class VendorUpsert(BaseModel):
+    notes: Optional[str] = None
+
+
 class VendorUpdate(BaseModel):
     name: Optional[str] = None
     notes: Optional[str] = None
@@ -40,12 +52,22 @@ class FilamentBase(BaseModel):
 
 
 class FilamentCreate(FilamentBase):
-    pass
+    manufacturer: Optional[str] = None
+    vendor_id: Optional[int] = None
+
+    @model_validator(mode="after")
+    def _check_vendor(self):
+        return _require_reference(self, "vendor_id", "manufacturer")
+
+
+class FilamentUpsert(FilamentCreate):
+    name: Optional[str] = None  # Taken from the path
 
 
 class FilamentUpdate(BaseModel):
     name: Optional[str] = None
     manufacturer: Optional[str] = None
+    vendor_id: Optional[int] = None
     line: Optional[str] = None
     material: Optional[str] = None
     product: Optional[str] = None
@@ -58,6 +80,7 @@ class FilamentUpdate(BaseModel):
 
 class Filament(FilamentBase):
     id: int
+    vendor_id: Optional[int] = None
     created_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
@@ -77,11 +100,17 @@ class PurchaseItemBase(BaseModel):
 
 
 class PurchaseItemCreate(PurchaseItemBase):
-    pass
+    filament_name: Optional[str] = None
+    filament_id: Optional[int] = None
+
+    @model_validator(mode="after")
+    def _check_filament(self):
+        return _require_reference(self, "filament_id", "filament_name")
 
 
 class PurchaseItemUpdate(BaseModel):
     filament_name: Optional[str] = None
+    filament_id: Optional[int] = None
     seller: Optional[str] = None
     date_ordered: Optional[date] = None
     date_received: Optional[date] = None
@@ -95,7 +124,9 @@ class PurchaseItemUpdate(BaseModel):
 class PurchaseItem(PurchaseItemBase):
     id: int
     purchase_id: int
+    filament_id: Optional[int] = None
     created_at: datetime
+    filament: Optional[Filament] = None  # Only populated with include=filament
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -142,11 +173,17 @@ class SpoolBase(BaseModel):
 
 
 class SpoolCreate(SpoolBase):
-    pass
+    filament_name: Optional[str] = None
+    filament_id: Optional[int] = None
+
+    @model_validator(mode="after")
+    def _check_filament(self):
+        return _require_reference(self, "filament_id", "filament_name")
 
 
 class SpoolUpdate(BaseModel):
     filament_name: Optional[str] = None
+    filament_id: Optional[int] = None
     date_opened: Optional[date] = None
     date_finished: Optional[date] = None
     shelf: Optional[str] = None
@@ -156,13 +193,57 @@ class SpoolUpdate(BaseModel):
 
 class Spool(SpoolBase):
     id: int
+    filament_id: Optional[int] = None
     created_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class SpoolReading(BaseModel):
+    id: int
+    spool_id: int
+    remaining_kg: float
+    recorded_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+# Telemetry Schemas
+class TelemetryReading(BaseModel):
+    spool_id: int
+    grams: float = Field(ge=0)
+    timestamp: Optional[datetime] = None  # Defaults to the time the server received it
+
+
+class TelemetryBatch(BaseModel):
+    readings: List[TelemetryReading]
+
+
+class TelemetryAccepted(BaseModel):
+    accepted: int
+    queue_depth: int
+
+
+class TelemetryStats(BaseModel):
+    queue_depth: int
+    queue_capacity: int
+    retrying: int
+    accepted: int
+    rejected: int
+    written: int
+    dropped_unknown_spool: int
+    failed: int
+    retried: int
+    flushes: int
+    last_batch_size: int
+    flush_ms_p50: Optional[float] = None
+    flush_ms_p95: Optional[float] = None
+    flush_ms_max: Optional[float] = None
+
+
 # Inventory Summary Schema
 class InventorySummary(BaseModel):
+    filament_id: Optional[int] = None
     filament_name: str
     manufacturer: str
     material: str
@@ -175,3 +256,169 @@ class InventorySummary(BaseModel):
     finished_spools: int
 
     model_config = ConfigDict(from_attributes=True)
+
+
+# Forecast Schemas
+class MaterialForecast(BaseModel):
+    material: str
+    remaining_kg: float
+    consumed_kg: float
+    burn_rate_kg_per_day: Optional[float] = None
+    days_remaining: Optional[float] = None
+    run_out_date: Optional[date] = None
+
+
+class FilamentForecast(MaterialForecast):
+    filament_id: int
+    filament_name: str
+
+
+class InventoryForecast(BaseModel):
+    generated_at: datetime
+    window_days: int
+    filaments: List[FilamentForecast]
+    materials: List[MaterialForecast]
+
+
+# Facet Schemas
+class FacetCount(BaseModel):
+    value: Optional[str]
+    count: int
+
+
+class InventoryFacetCount(FacetCount):
+    remaining_kg: float
+
+
+class FilamentFacets(BaseModel):
+    total: int
+    facets: Dict[str, List[FacetCount]]
+
+
+class InventoryFacets(BaseModel):
+    total: int
+    remaining_kg: float
+    facets: Dict[str, List[InventoryFacetCount]]
+
+
+# Bulk import Schemas
+# Items are validated one at a time (as FilamentCreate, PurchaseCreate or
+# SpoolCreate) so one bad row is reported in the results, not a 422
+class FilamentBulkCreate(BaseModel):
+    items: List[Dict[str, Any]]
+    create_missing_vendors: bool = False  # Create vendors for unknown manufacturers
+    atomic: bool = True  # Insert nothing if any row fails validation
+
+
+class PurchaseBulkCreate(BaseModel):
+    items: List[Dict[str, Any]]
+    atomic: bool = True
+
+
+class SpoolBulkCreate(BaseModel):
+    items: List[Dict[str, Any]]
+    atomic: bool = True
+
+
+class BulkRowResult(BaseModel):
+    index: int
+    status: str  # "created", "error", or "skipped" when an atomic batch had errors
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BulkResult(BaseModel):
+    created: int
+    failed: int
+    vendors_created: List[str] = []
+    results: List[BulkRowResult]
+
+
+# Upsert Schemas
+class VendorBatchUpsert(BaseModel):
+    items: List[VendorCreate]
+
+
+class FilamentBatchUpsert(BaseModel):
+    items: List[FilamentCreate]
+
+
+# Bulk change Schemas
+class SpoolPatch(SpoolUpdate):
+    id: int
+
+
+class PurchaseItemPatch(PurchaseItemUpdate):
+    id: int
+
+
+class SpoolBulkUpdate(BaseModel):
+    items: List[SpoolPatch]
+    atomic: bool = True  # Update nothing if any id is unknown
+
+
+class PurchaseItemBulkUpdate(BaseModel):
+    items: List[PurchaseItemPatch]
+    atomic: bool = True
+
+
+class BulkUpdateResult(BaseModel):
+    updated: int
+    missing: List[int] = []  # Ids that matched no row
+
+
+class BulkDeleteResult(BaseModel):
+    deleted: int
+
+
+# Sync Schemas
+class SyncChanges(BaseModel):
+    token: int  # Pass back as since on the next call
+    more: bool  # Further changes are pending past the token
+    changes: Dict[str, List[Dict[str, Any]]]  # Changed rows by table, every column including sync_version
+    deleted: Dict[str, List[int]]  # Ids deleted by table; apply before changes
+    inventory_summary: List[InventorySummary]  # Summary rows of filaments whose totals may have changed
+
+
+# Backup Schemas
+class BackupInfo(BaseModel):
+    name: str
+    bytes: int
+    created_at: datetime
+
+
+class BackupReport(BaseModel):
+    name: str
+    sync_version: int  # The sync token the snapshot was taken at
+    pages: int
+    steps: int
+    database_bytes: int
+    compressed_bytes: int
+    copy_seconds: float  # Time spent copying pages, before compression
+    seconds: float
+    mb_per_second: float  # Uncompressed database megabytes over the whole backup
+    rotated: List[str]  # Older backups removed to stay within the limit
+
+
+class RestoreReport(BaseModel):
+    name: str
+    safety_backup: str  # Backup of the data the restore replaced
+    sync_version: int  # Tokens below this are refused; clients sync again from 0
+    database_bytes: int
+    seconds: float
+    mb_per_second: float
+    rotated: List[str]
+
+
+# Export Schemas
+class ExportTable(str, Enum):
+    vendors = "vendors"
+    filaments = "filaments"
+    purchases = "purchases"
+    purchase_items = "purchase_items"
+    spools = "spools"
+
+
+class ExportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
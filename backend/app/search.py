@@ -0,0 +1,125 @@
+"""Full-text and typeahead search over the filament catalog.
+
+On SQLite the catalog is indexed by an FTS5 table that uses ``filaments``
+as its external content. Triggers on ``filaments`` keep the index in step
+with every insert, update and delete, including bulk imports and renames
+cascaded from vendors. Every search term is matched as a prefix, so
+partial input works for typeahead, and results are ordered by bm25 with the
+name weighted highest.
+
+bm25 has to score every matching row before it can sort, which for a short
+prefix on a large catalog is most of the table. Only the first
+SEARCH_CANDIDATES matches are scored, which keeps latency flat at the cost
+of exact ranking for very broad queries; narrower queries are ranked in
+full. Other databases fall back to a case-insensitive LIKE scan ordered by
+name.
+"""
+import re
+from typing import List
+
+from sqlalchemy import column, inspect, or_, select, table, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from . import models
+
+FTS_TABLE = "filaments_fts"
+
+# Indexed columns and their bm25 weights, in FTS column order
+SEARCH_COLUMNS = (
+    ("name", 10.0),
+    ("manufacturer", 5.0),
+    ("line", 3.0),
+    ("material", 4.0),
+    ("product", 3.0),
+    ("color", 4.0),
+    ("feature", 2.0),
+    ("notes", 1.0),
+)
+
+_COLUMN_LIST = ", ".join(name for name, _ in SEARCH_COLUMNS)
+_NEW_VALUES = ", ".join(f"new.{name}" for name, _ in SEARCH_COLUMNS)
+_OLD_VALUES = ", ".join(f"old.{name}" for name, _ in SEARCH_COLUMNS)
+
+# Prefix indexes make 1-3 character typeahead terms index lookups
+FTS_DDL = (
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({_COLUMN_LIST}, content='filaments', content_rowid='id', "
+    "prefix='1 2 3', tokenize='unicode61 remove_diacritics 2')",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES "
+    f"('rank', 'bm25({', '.join(str(weight) for _, weight in SEARCH_COLUMNS)})')",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+)
+
+FTS_TRIGGERS = (
+    f"CREATE TRIGGER IF NOT EXISTS filaments_fts_insert AFTER INSERT ON filaments BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, {_COLUMN_LIST}) VALUES (new.id, {_NEW_VALUES}); END",
+    f"CREATE TRIGGER IF NOT EXISTS filaments_fts_delete AFTER DELETE ON filaments BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_COLUMN_LIST}) VALUES ('delete', old.id, {_OLD_VALUES}); END",
+    # Only for the indexed columns, so writes that touch none of them (sync versions) skip the index
+    f"CREATE TRIGGER IF NOT EXISTS filaments_fts_update_columns AFTER UPDATE OF {_COLUMN_LIST} ON filaments BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_COLUMN_LIST}) VALUES ('delete', old.id, {_OLD_VALUES}); "
+    f"INSERT INTO {FTS_TABLE}(rowid, {_COLUMN_LIST}) VALUES (new.id, {_NEW_VALUES}); END",
+)
+
+# Matches scored per query; beyond this, broad prefixes trade ranking for latency
+SEARCH_CANDIDATES = 1000
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def install(conn: Connection) -> None:
+    """Create and populate the FTS index and its triggers if they are missing"""
+    if conn.dialect.name != "sqlite":
+        return
+    if not inspect(conn).has_table(FTS_TABLE):
+        for statement in FTS_DDL:
+            conn.execute(text(statement))
+    # Replaced by filaments_fts_update_columns
+    conn.execute(text("DROP TRIGGER IF EXISTS filaments_fts_update"))
+    for statement in FTS_TRIGGERS:
+        conn.execute(text(statement))
+
+
+def search_terms(q: str) -> List[str]:
+    return _TERM.findall(q.lower())
+
+
+def match_expression(terms: List[str]) -> str:
+    """FTS5 query matching every term as a prefix; quoting keeps input literal"""
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _fts_search(db: Session, terms: List[str], limit: int) -> List[models.Filament]:
+    fts = table(FTS_TABLE, column("rowid"), column("rank"))
+    candidates = (
+        select(fts.c.rowid, fts.c.rank)
+        .where(text(f"{FTS_TABLE} MATCH :match").bindparams(match=match_expression(terms)))
+        .limit(SEARCH_CANDIDATES)
+        .subquery()
+    )
+    stmt = (
+        select(models.Filament)
+        .join(candidates, candidates.c.rowid == models.Filament.id)
+        .order_by(candidates.c.rank)
+        .limit(limit)
+    )
+    return list(db.scalars(stmt))
+
+
+def _like_search(db: Session, terms: List[str], limit: int) -> List[models.Filament]:
+    columns = [getattr(models.Filament, name) for name, _ in SEARCH_COLUMNS]
+    stmt = select(models.Filament)
+    for term in terms:
+        pattern = f"%{term}%"
+        stmt = stmt.where(or_(*(field.ilike(pattern) for field in columns)))
+    return list(db.scalars(stmt.order_by(models.Filament.name).limit(limit)))
+
+
+def search_filaments(db: Session, q: str, limit: int = 20) -> List[models.Filament]:
+    """Filaments matching every term in q, best matches first"""
+    terms = search_terms(q)
+    if not terms:
+        return []
+    if db.get_bind().dialect.name == "sqlite":
+        return _fts_search(db, terms, limit)
+    return _like_search(db, terms, limit)
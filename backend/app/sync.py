@@ -0,0 +1,273 @@
+"""Delta sync: every row carries a change version and deletes leave tombstones.
+
+Database triggers stamp each inserted or updated row with a change version
+in its ``sync_version`` column and record each delete in ``sync_tombstones``
+under a version, so ORM writes, set-based bulk changes, upserts and renames
+cascaded between tables are all covered. Tokens are versions, and a token
+is only handed out once nothing can later commit at or below it.
+
+On SQLite one counter row in ``sync_counter`` hands out the versions, one
+per row written. SQLite has a single writer, which already holds the
+database until it commits, so versions become visible in order.
+
+On PostgreSQL a row is stamped with the id of the transaction writing it,
+which needs no lock: writers do not wait on each other. All rows of one
+transaction share its version. Transactions commit out of id order, so
+tokens stop below the oldest transaction still running
+(``pg_snapshot_xmin``); every id below it has committed or rolled back. A
+long-running transaction holds tokens back until it ends, but nothing is
+skipped.
+
+``changes_since`` returns the rows stamped after a token and the ids deleted
+after it, across all tables, plus the inventory summary rows of filaments
+whose catalog entry or rollup changed. At most ``limit`` changes are
+returned; when more are pending, ``more`` is set and the token only covers
+what was returned. Clients apply ``deleted`` before ``changes``: an id
+reused after a delete always has a newer version than its tombstone.
+Restoring a backup voids every token handed out before it (``void_tokens``),
+so clients holding one are told to sync again from 0.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, func, inspect, literal, or_, select, text, union_all, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from . import crud, models
+
+# Tables whose rows are returned, by name
+SYNC_MODELS = {
+    "vendors": models.Vendor,
+    "filaments": models.Filament,
+    "purchases": models.Purchase,
+    "purchase_items": models.PurchaseItem,
+    "spools": models.Spool,
+    "spool_readings": models.SpoolReading,
+}
+
+# Versioned too, but served as inventory summary rows rather than raw totals
+ROLLUP = models.InventoryRollup
+VERSIONED_MODELS = tuple(SYNC_MODELS.values()) + (ROLLUP,)
+
+TOMBSTONES = models.SyncTombstone.__tablename__
+
+DEFAULT_LIMIT = 5000
+MAX_LIMIT = 50000
+
+_STAMP = "UPDATE sync_counter SET version = version + 1 WHERE id = 1"
+
+# PostgreSQL versions: the writing transaction's id, and the newest token that can be handed out
+_XID = "pg_current_xact_id()::text::bigint"
+_HORIZON = "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint - 1"
+
+# PostgreSQL sets the version before the row is written; the tombstone
+# function takes the key column's name as its argument
+POSTGRESQL_FUNCTIONS = (
+    "CREATE OR REPLACE FUNCTION sync_stamp() RETURNS trigger AS $$ BEGIN "
+    f"NEW.sync_version := {_XID}; RETURN NEW; END $$ LANGUAGE plpgsql",
+    "CREATE OR REPLACE FUNCTION sync_tombstone() RETURNS trigger AS $$ BEGIN "
+    "INSERT INTO sync_tombstones (version, table_name, row_id) "
+    f"VALUES ({_XID}, TG_TABLE_NAME, (to_jsonb(OLD) ->> TG_ARGV[0])::integer) ON CONFLICT DO NOTHING; "
+    "RETURN OLD; END $$ LANGUAGE plpgsql",
+)
+
+
+class TokenAhead(ValueError):
+    """The token is newer than the database or older than its last restore; sync again from 0"""
+
+
+def _key(model):
+    return model.__mapper__.primary_key[0]
+
+
+def _sqlite_triggers(table: str, key: str) -> tuple:
+    # SQLite cannot change a row in a BEFORE trigger, so the row is stamped just after it is written
+    stamp = (f"{_STAMP}; UPDATE {table} SET sync_version = (SELECT version FROM sync_counter WHERE id = 1) "
+             f"WHERE {key} = new.{key}; ")
+    return (
+        f"CREATE TRIGGER IF NOT EXISTS {table}_sync_insert AFTER INSERT ON {table} BEGIN {stamp}END",
+        # The guard skips the stamping update itself
+        f"CREATE TRIGGER IF NOT EXISTS {table}_sync_update AFTER UPDATE ON {table} "
+        f"WHEN new.sync_version IS old.sync_version BEGIN {stamp}END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_sync_delete AFTER DELETE ON {table} BEGIN {_STAMP}; "
+        f"INSERT INTO sync_tombstones (version, table_name, row_id) "
+        f"SELECT version, '{table}', old.{key} FROM sync_counter WHERE id = 1; END",
+    )
+
+
+def _postgresql_triggers(table: str, key: str) -> tuple:
+    return (
+        f"DROP TRIGGER IF EXISTS {table}_sync_stamp ON {table}",
+        f"CREATE TRIGGER {table}_sync_stamp BEFORE INSERT OR UPDATE ON {table} "
+        "FOR EACH ROW EXECUTE FUNCTION sync_stamp()",
+        f"DROP TRIGGER IF EXISTS {table}_sync_delete ON {table}",
+        f"CREATE TRIGGER {table}_sync_delete AFTER DELETE ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION sync_tombstone('{key}')",
+    )
+
+
+def _backfill(conn: Connection) -> None:
+    """Give rows written before versioning (sync_version NULL) unique versions past the counter"""
+    counter = models.SyncCounter.__table__
+    version = conn.execute(select(counter.c.version).where(counter.c.id == 1)).scalar_one()
+    for model in VERSIONED_MODELS:
+        table, key = model.__table__, _key(model)
+        top = conn.execute(select(func.max(key)).where(table.c.sync_version.is_(None))).scalar()
+        if top is None:
+            continue
+        conn.execute(update(table).where(table.c.sync_version.is_(None)).values(sync_version=key + version))
+        version += top
+    conn.execute(update(counter).where(counter.c.id == 1, counter.c.version < version).values(version=version))
+
+
+def _upgrade_postgresql(conn: Connection) -> None:
+    """Bring tables from counter versions to transaction id versions"""
+    inspector = inspect(conn)
+    for model in VERSIONED_MODELS + (models.SyncCounter, models.SyncTombstone):
+        table = model.__tablename__
+        for column in inspector.get_columns(table):
+            if column["name"] in ("sync_version", "version", "min_token") and str(column["type"]) == "INTEGER":
+                conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column['name']} TYPE bigint"))
+    primary_key = inspector.get_pk_constraint(TOMBSTONES)
+    if primary_key["constrained_columns"] == ["version"]:
+        conn.execute(text(f"ALTER TABLE {TOMBSTONES} DROP CONSTRAINT {primary_key['name']}, "
+                          "ADD PRIMARY KEY (version, table_name, row_id)"))
+
+    # The counter only moves on PostgreSQL if its rows were stamped by the old counter triggers.
+    # Those versions are not comparable with transaction ids, so everything is stamped again
+    # and tokens handed out until now are refused
+    counter = models.SyncCounter.__table__
+    restamp = conn.execute(select(counter.c.version).where(counter.c.id == 1)).scalar_one() > 0
+    for model in VERSIONED_MODELS:
+        table = model.__table__
+        stmt = update(table).values(sync_version=text(_XID))
+        conn.execute(stmt if restamp else stmt.where(table.c.sync_version.is_(None)))
+    if restamp:
+        conn.execute(models.SyncTombstone.__table__.delete())
+        conn.execute(update(counter).where(counter.c.id == 1).values(version=0, min_token=text(_XID)))
+
+
+def install(conn: Connection) -> None:
+    """Seed the counter, version existing rows and create the triggers if they are missing"""
+    conn.execute(text("INSERT INTO sync_counter (id, version) SELECT 1, 0 "
+                      "WHERE NOT EXISTS (SELECT 1 FROM sync_counter WHERE id = 1)"))
+
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        # Functions first, so the restamping updates already run the new triggers
+        for statement in POSTGRESQL_FUNCTIONS:
+            conn.execute(text(statement))
+        _upgrade_postgresql(conn)
+        triggers = _postgresql_triggers
+    else:
+        _backfill(conn)
+        if dialect != "sqlite":
+            return
+        triggers = _sqlite_triggers
+    for model in VERSIONED_MODELS:
+        for statement in triggers(model.__tablename__, _key(model).name):
+            conn.execute(text(statement))
+
+
+def token_range(db) -> Tuple[int, int]:
+    """The newest token that can be handed out, and the oldest one still accepted, on a session or connection"""
+    counter = models.SyncCounter
+    current, floor = db.execute(select(counter.version, counter.min_token).where(counter.id == 1)).one()
+    dialect = db.dialect if isinstance(db, Connection) else db.get_bind().dialect
+    if dialect.name == "postgresql":
+        current = db.execute(text(_HORIZON)).scalar_one()
+    return current, floor
+
+
+def current_version(db: Session) -> int:
+    return token_range(db)[0]
+
+
+def void_tokens(conn: Connection, issued: int) -> int:
+    """Refuse every token handed out so far, e.g. after a restore replaced the data behind them.
+
+    issued is the newest token given out before the restore. The counter moves
+    past it and the restored counter, so no version is handed out twice, and
+    that becomes the oldest token accepted. Restores are SQLite only.
+    """
+    counter = models.SyncCounter.__table__
+    version = conn.execute(select(counter.c.version).where(counter.c.id == 1)).scalar_one()
+    floor = max(version, issued) + 1
+    conn.execute(update(counter).where(counter.c.id == 1).values(version=floor, min_token=floor))
+    return floor
+
+
+def _pending(db: Session, synced: Dict[str, type], since: int, until: int, limit: int) -> List[tuple]:
+    """(source, version) of the first limit + 1 changes after since, in version order, in one statement"""
+    sources = {name: model.sync_version for name, model in synced.items()}
+    sources[ROLLUP.__tablename__] = ROLLUP.sync_version
+    if since:
+        # A client syncing from 0 holds nothing to delete
+        sources[TOMBSTONES] = models.SyncTombstone.version
+    parts = [
+        select(literal(name).label("source"), version.label("version"))
+        .where(version > since, version <= until)
+        .order_by(version)
+        .limit(limit + 1)
+        .subquery()
+        for name, version in sources.items()
+    ]
+    merged = union_all(*(select(part.c.source, part.c.version) for part in parts)).subquery()
+    return db.execute(select(merged.c.source, merged.c.version).order_by(merged.c.version).limit(limit + 1)).all()
+
+
+def changes_since(db: Session, since: int = 0, limit: int = DEFAULT_LIMIT,
+                  tables: Optional[Iterable[str]] = None) -> dict:
+    """Rows changed and ids deleted after the since token, with the token to pass next time.
+
+    ``tables`` narrows the rows returned to some of SYNC_MODELS; the inventory
+    summary rows are always included.
+    """
+    current, floor = token_range(db)
+    if since > current:
+        raise TokenAhead(f"Sync token {since} is ahead of this database (at {current}); sync again from 0")
+    if 0 < since < floor:
+        raise TokenAhead(f"Sync token {since} predates a restore of this database; sync again from 0")
+
+    synced = SYNC_MODELS if tables is None else {name: SYNC_MODELS[name] for name in tables}
+    pending = _pending(db, synced, since, current, limit)
+    more = len(pending) > limit
+    until = pending[limit - 1].version if more else current
+    sources = {row.source for row in pending if row.version <= until}
+    if more and pending[limit].version == until:
+        # Rows of one PostgreSQL transaction share a version and are never split across
+        # pages, so every source may hold some at until, not only those in the first limit
+        sources = set(synced) | {ROLLUP.__tablename__} | ({TOMBSTONES} if since else set())
+
+    def window(column):
+        return and_(column > since, column <= until)
+
+    changes: Dict[str, List[dict]] = {name: [] for name in synced}
+    for name, model in synced.items():
+        if name in sources:
+            stmt = select(*model.__table__.columns).where(window(model.sync_version)).order_by(model.sync_version)
+            changes[name] = [dict(row) for row in db.execute(stmt).mappings()]
+
+    deleted: Dict[str, List[int]] = {name: [] for name in synced}
+    rollups_deleted = []
+    if TOMBSTONES in sources:
+        tombstone = models.SyncTombstone
+        stmt = select(tombstone.table_name, tombstone.row_id).where(window(tombstone.version)).order_by(tombstone.version)
+        for table_name, row_id in db.execute(stmt):
+            if table_name == ROLLUP.__tablename__:
+                rollups_deleted.append(row_id)
+            elif table_name in deleted:
+                deleted[table_name].append(row_id)
+
+    # Summary rows are keyed by filament and go away with it
+    summary = []
+    if "filaments" in sources or ROLLUP.__tablename__ in sources or rollups_deleted:
+        changed_rollups = select(ROLLUP.filament_id).where(window(ROLLUP.sync_version))
+        stmt = crud.inventory_summary_statement().where(or_(
+            window(models.Filament.sync_version),
+            models.Filament.id.in_(changed_rollups),
+            models.Filament.id.in_(rollups_deleted),
+        ))
+        summary = [crud._summary_row(*row) for row in db.execute(stmt).all()]
+
+    return {"token": until, "more": more, "changes": changes, "deleted": deleted, "inventory_summary": summary}
@@ -0,0 +1,219 @@
+"""Buffered ingestion of scale telemetry with group commit.
+
+Requests only append readings to a bounded in-memory queue; a background
+thread drains it and writes each batch (up to ``batch_size`` readings) in a
+single transaction through ``crud.ingest_spool_readings``. When the queue
+cannot take a whole request the request is refused, so callers get
+backpressure instead of unbounded memory growth. Readings still queued at
+shutdown are flushed before the writer exits; readings lost to a crash are
+limited to what was queued and not yet committed. A batch that fails to
+commit is retried after a backoff that doubles from ``retry_delay`` up to
+``retry_max_delay``. After ``max_attempts`` it is given up and counted as
+failed. Batches waiting for a retry still count against the queue's bound.
+Each reading is queued with the session factory of the database it belongs
+to (its workspace's, see tenancy), and a batch is committed per database.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import crud
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# (spool_id, recorded_at as naive UTC, remaining_kg)
+Reading = Tuple[int, datetime, float]
+
+# Recent flush durations kept for the latency percentiles
+LATENCY_SAMPLES = 512
+
+
+def to_reading(spool_id: int, grams: float, timestamp: Optional[datetime], received_at: datetime) -> Reading:
+    """Normalize a scale report to the stored form: naive UTC time and kilograms"""
+    if timestamp is None:
+        timestamp = received_at
+    elif timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return spool_id, timestamp, grams / 1000
+
+
+@dataclass
+class _Retry:
+    due: float
+    attempt: int
+    session_factory: Callable[[], Session]
+    readings: List[Reading]
+
+
+class TelemetryWriter:
+    """Bounded queue of readings and the thread that group-commits them"""
+
+    def __init__(
+        self,
+        session_factory: sessionmaker = SessionLocal,
+        max_queue: int = 100_000,
+        batch_size: int = 5_000,
+        flush_interval: float = 0.05,
+        max_attempts: int = 5,
+        retry_delay: float = 0.1,
+        retry_max_delay: float = 5.0,
+    ):
+        self.session_factory = session_factory
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.retry_max_delay = retry_max_delay
+
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        # Failed batches waiting for their next attempt; only the writer thread touches the list
+        self._retries: List[_Retry] = []
+        self._retrying = 0
+
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retried = 0
+        self.flushes = 0
+        self.last_batch_size = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Flush what is queued, then stop the writer thread"""
+        with self._lock:
+            self._stopping = True
+            self._ready.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def submit(self, readings: Sequence[Reading], session_factory: Optional[Callable[[], Session]] = None) -> bool:
+        """Queue all readings, or none of them if the queue is too full"""
+        self.start()
+        factory = session_factory or self.session_factory
+        with self._lock:
+            if len(self._queue) + self._retrying + len(readings) > self.max_queue:
+                self.rejected += len(readings)
+                return False
+            self._queue.extend((factory, reading) for reading in readings)
+            self.accepted += len(readings)
+            if len(self._queue) >= self.batch_size:
+                self._ready.notify()
+        return True
+
+    def _take_batch(self) -> List[Tuple[Callable[[], Session], Reading]]:
+        with self._lock:
+            if not self._queue and not self._stopping:
+                self._ready.wait(self.flush_interval)
+            count = min(len(self._queue), self.batch_size)
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _due_retries(self) -> List[_Retry]:
+        now = time.monotonic()
+        due = [retry for retry in self._retries if retry.due <= now]
+        if due:
+            self._retries = [retry for retry in self._retries if retry.due > now]
+            with self._lock:
+                self._retrying -= sum(len(retry.readings) for retry in due)
+        return due
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if batch:
+                by_database: Dict[Callable[[], Session], List[Reading]] = {}
+                for factory, reading in batch:
+                    by_database.setdefault(factory, []).append(reading)
+                for factory, readings in by_database.items():
+                    self._flush(factory, readings)
+            for retry in self._due_retries():
+                self._flush(retry.session_factory, retry.readings, retry.attempt)
+            if not batch and self._stopping:
+                if not self._retries:
+                    return
+                # Give queued retries their remaining attempts before exiting
+                time.sleep(max(0.0, min(retry.due for retry in self._retries) - time.monotonic()))
+
+    def _flush(self, session_factory: Callable[[], Session], batch: List[Reading], attempt: int = 1) -> None:
+        started = time.perf_counter()
+        try:
+            with session_factory() as db:
+                stored = crud.ingest_spool_readings(db, batch)
+        except Exception:
+            if attempt >= self.max_attempts:
+                logger.exception("Giving up on %d telemetry readings after %d attempts", len(batch), attempt)
+                self.failed += len(batch)
+                return
+            delay = min(self.retry_delay * 2 ** (attempt - 1), self.retry_max_delay)
+            logger.warning("Failed to write %d telemetry readings (attempt %d of %d), retrying in %.1fs",
+                           len(batch), attempt, self.max_attempts, delay, exc_info=True)
+            self._retries.append(_Retry(time.monotonic() + delay, attempt + 1, session_factory, batch))
+            with self._lock:
+                self._retrying += len(batch)
+            self.retried += len(batch)
+            return
+        with self._lock:
+            self._latencies.append(time.perf_counter() - started)
+        self.written += stored
+        self.dropped += len(batch) - stored
+        self.flushes += 1
+        self.last_batch_size = len(batch)
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            queue_depth = len(self._queue)
+            retrying = self._retrying
+
+        def percentile(fraction: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000
+
+        return {
+            "queue_depth": queue_depth,
+            "queue_capacity": self.max_queue,
+            "retrying": retrying,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "written": self.written,
+            "dropped_unknown_spool": self.dropped,
+            "failed": self.failed,
+            "retried": self.retried,
+            "flushes": self.flushes,
+            "last_batch_size": self.last_batch_size,
+            "flush_ms_p50": percentile(0.5),
+            "flush_ms_p95": percentile(0.95),
+            "flush_ms_max": latencies[-1] * 1000 if latencies else None,
+        }
+
+
+writer = TelemetryWriter(
+    max_queue=int(os.environ.get("FILAMENT_TELEMETRY_QUEUE_SIZE", 100_000)),
+    batch_size=int(os.environ.get("FILAMENT_TELEMETRY_BATCH_SIZE", 5_000)),
+    flush_interval=int(os.environ.get("FILAMENT_TELEMETRY_FLUSH_MS", 50)) / 1000,
+    max_attempts=int(os.environ.get("FILAMENT_TELEMETRY_ATTEMPTS", 5)),
+)
@@ -0,0 +1,353 @@
+"""Workspaces: one SQLite database per workshop, routed per request.
+
+Tenancy is off unless FILAMENT_WORKSPACE_DIR is set. A request then names
+its workspace with the ``X-Workspace`` header or a ``/w/<name>/`` path
+prefix, which is stripped before routing so every endpoint works unchanged
+under it. Requests that name none use the default database, as before.
+A workspace's database is ``<name>.db`` in that directory; names are
+lowercase letters, digits, ``-`` and ``_``.
+
+Only workspaces whose database already exists are served; others get a
+404. Create one with ``python workspace.py <name>``, or set
+FILAMENT_WORKSPACE_CREATE=1 to create it on its first request. Do that only
+on a trusted network, since every new name then makes a database file.
+
+Engines are opened lazily. The first time a workspace is opened, its schema
+is created or upgraded with ``migrations.init_db`` and its inventory rollup
+is built. At most FILAMENT_WORKSPACE_ENGINES (default 64) engines stay open.
+Opening another closes the least recently used one. A sweep from the app
+lifespan closes any idle for more than FILAMENT_WORKSPACE_IDLE_S (default
+300). A node can so serve thousands of small workspaces with a bounded
+number of open files. Requests still using a closed engine finish on their
+own connections.
+
+What must outlive an engine stays with the workspace: its data version,
+which keeps its ETags and response-cache entries apart from other
+workspaces, its event feed, and whether its schema is already set up, so a
+reopen skips the migration work.
+"""
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.responses import JSONResponse
+
+from . import cache, crud, events, migrations
+from .database import DatabaseSettings, create_db_engine, current_sessionmaker, settings as db_settings
+
+logger = logging.getLogger(__name__)
+
+WORKSPACE_HEADER = b"x-workspace"
+PATH_PREFIX = "/w/"
+
+_NAME = re.compile(r"[a-z0-9][a-z0-9_-]{0,62}")
+
+
+@dataclass(frozen=True)
+class TenancySettings:
+    """Workspace configuration, read from FILAMENT_WORKSPACE_* environment variables"""
+    directory: Optional[str] = None  # Tenancy is off when unset
+    max_engines: int = 64  # Workspace engines kept open at once
+    idle_seconds: float = 300  # Engines unused for longer are closed
+    pool_size: int = 2  # Pooled connections per workspace engine
+    create: bool = False  # Create a database for a workspace named in a request
+
+    @classmethod
+    def from_env(cls) -> "TenancySettings":
+        defaults = cls()
+        return cls(
+            directory=os.environ.get("FILAMENT_WORKSPACE_DIR") or None,
+            max_engines=int(os.environ.get("FILAMENT_WORKSPACE_ENGINES", defaults.max_engines)),
+            idle_seconds=float(os.environ.get("FILAMENT_WORKSPACE_IDLE_S", defaults.idle_seconds)),
+            pool_size=int(os.environ.get("FILAMENT_WORKSPACE_POOL_SIZE", defaults.pool_size)),
+            create=os.environ.get("FILAMENT_WORKSPACE_CREATE", "0").lower() in ("1", "true", "yes"),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+
+class InvalidWorkspace(ValueError):
+    """Raised for a workspace name that is not allowed"""
+
+
+class UnknownWorkspace(LookupError):
+    """Raised for a workspace with no database when new ones are not created"""
+
+
+def check_name(name: str) -> str:
+    if not _NAME.fullmatch(name):
+        raise InvalidWorkspace("Workspace names are 1-63 lowercase letters, digits, '-' and '_'")
+    return name
+
+
+class Workspace:
+    """A workspace's state that outlives its engine"""
+
+    def __init__(self, name: str, registry: "WorkspaceRegistry"):
+        self.name = name
+        self.registry = registry
+        self.version = cache.DataVersion()
+        self.initialized = False  # Schema set up and rollup built since the process started
+        self._hub: Optional[events.EventHub] = None
+        self._lock = threading.Lock()
+
+    def session(self) -> Session:
+        """A new session on the workspace's database, opening it if needed"""
+        return self.registry.session_factory(self.name)()
+
+    @property
+    def hub(self) -> events.EventHub:
+        with self._lock:
+            if self._hub is None:
+                self._hub = events.EventHub(
+                    session_factory=self.session, queue_size=events.hub.queue_size, coalesce=events.hub.coalesce,
+                    heartbeat=events.hub.heartbeat, poll=events.hub.poll,
+                )
+                self.version.subscribe(self._hub.notify)
+            return self._hub
+
+
+@dataclass
+class _OpenEngine:
+    engine: Engine
+    sessionmaker: sessionmaker
+    last_used: float
+
+
+class WorkspaceRegistry:
+    """Workspaces by name, and an LRU of their open engines"""
+
+    def __init__(self, settings: TenancySettings, base: DatabaseSettings = db_settings):
+        self.settings = settings
+        self.base = base
+        self.engine_hooks: List[Callable[[Engine], None]] = []
+        self._workspaces: Dict[str, Workspace] = {}
+        self._open: "OrderedDict[str, _OpenEngine]" = OrderedDict()
+        self._opening: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._sweeper: Optional[asyncio.Task] = None
+        self.opened = 0
+        self.closed = 0
+
+    def on_engine(self, hook: Callable[[Engine], None]) -> None:
+        """Run hook on every workspace engine as it is opened, e.g. to add instrumentation"""
+        self.engine_hooks.append(hook)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.settings.directory, f"{name}.db")
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self.path(name))
+
+    def create(self, name: str) -> Workspace:
+        """Create the workspace's database if it has none, and set up its schema"""
+        self.session_factory(check_name(name), create=True)
+        return self.workspace(name)
+
+    def workspace(self, name: str) -> Workspace:
+        check_name(name)
+        with self._lock:
+            workspace = self._workspaces.get(name)
+            if workspace is None:
+                workspace = self._workspaces[name] = Workspace(name, self)
+            return workspace
+
+    def _touch(self, name: str) -> Optional[_OpenEngine]:
+        """The open engine for name, marked as just used; call with the lock held"""
+        entry = self._open.get(name)
+        if entry is not None:
+            entry.last_used = time.monotonic()
+            self._open.move_to_end(name)
+        return entry
+
+    def _open_engine(self, name: str, create: bool) -> _OpenEngine:
+        exists = self.exists(name)
+        if not exists and not (create or self.settings.create):
+            raise UnknownWorkspace(f"Workspace {name} not found")
+        workspace = self.workspace(name)
+        os.makedirs(self.settings.directory, exist_ok=True)
+        db_engine = create_db_engine(replace(
+            self.base, url=f"sqlite:///{self.path(name)}", pool_size=self.settings.pool_size,
+        ))
+        factory = sessionmaker(autocommit=False, autoflush=False, bind=db_engine)
+        # A file replaced or removed behind our back is set up again
+        if not (workspace.initialized and exists):
+            migrations.init_db(db_engine)
+            with factory() as db:
+                crud.ensure_inventory_rollup(db)
+            workspace.initialized = True
+        cache.track_writes(db_engine, workspace.version)
+        for hook in self.engine_hooks:
+            hook(db_engine)
+        return _OpenEngine(db_engine, factory, time.monotonic())
+
+    def _evict(self) -> List[Engine]:
+        """Drop the least recently used engines over the limit or idle too long; call with the lock held"""
+        now = time.monotonic()
+        evicted = []
+        while self._open:
+            name, entry = next(iter(self._open.items()))
+            if len(self._open) <= self.settings.max_engines and now - entry.last_used <= self.settings.idle_seconds:
+                break
+            del self._open[name]
+            evicted.append(entry.engine)
+        return evicted
+
+    def session_factory(self, name: str, create: bool = False) -> sessionmaker:
+        """The workspace's session factory, opening (and initializing) its database on first use"""
+        with self._lock:
+            entry = self._touch(name)
+            if entry is not None:
+                return entry.sessionmaker
+            opening = self._opening.setdefault(name, threading.Lock())
+        # One thread opens a workspace; others asking for it meanwhile wait for that
+        with opening:
+            with self._lock:
+                entry = self._touch(name)
+            if entry is None:
+                try:
+                    entry = self._open_engine(name, create)
+                except BaseException:
+                    with self._lock:
+                        self._opening.pop(name, None)
+                    raise
+                with self._lock:
+                    self._open[name] = entry
+                    self._opening.pop(name, None)
+                    evicted = self._evict()
+                self.opened += 1
+                self.close(evicted)
+        return entry.sessionmaker
+
+    def engine(self, name: str) -> Engine:
+        return self.session_factory(name).kw["bind"]
+
+    def close(self, engines: List[Engine]) -> None:
+        for db_engine in engines:
+            db_engine.dispose()
+            self.closed += 1
+
+    def close_idle(self) -> None:
+        with self._lock:
+            evicted = self._evict()
+        self.close(evicted)
+
+    async def _sweep(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # Disposing an engine closes its files, so keep it off the loop
+                await asyncio.to_thread(self.close_idle)
+            except Exception:
+                logger.exception("Closing idle workspace engines failed")
+
+    def start(self) -> None:
+        """Close idle engines periodically on the running loop, so a quiet node lets go of them"""
+        if self._sweeper is None:
+            interval = min(max(self.settings.idle_seconds / 2, 1), 60)
+            self._sweeper = asyncio.create_task(self._sweep(interval))
+
+    def close_all(self) -> None:
+        with self._lock:
+            evicted = [entry.engine for entry in self._open.values()]
+            self._open.clear()
+        self.close(evicted)
+
+    async def stop(self) -> None:
+        """Stop the idle sweep and the event feeds that were started, and close every engine"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        with self._lock:
+            workspaces = list(self._workspaces.values())
+        for workspace in workspaces:
+            if workspace._hub is not None:
+                await workspace._hub.stop()
+        self.close_all()
+
+    @property
+    def open_engines(self) -> int:
+        return len(self._open)
+
+
+settings = TenancySettings.from_env()
+registry = WorkspaceRegistry(settings)
+
+# The workspace of the current request; None for the default database
+current_workspace: ContextVar[Optional[Workspace]] = ContextVar("current_workspace", default=None)
+
+
+def current_hub() -> events.EventHub:
+    workspace = current_workspace.get()
+    return events.hub if workspace is None else workspace.hub
+
+
+def _workspace_name(scope) -> Optional[str]:
+    """The workspace a request names, stripping a /w/<name> path prefix from the scope"""
+    path = scope["path"]
+    if path.startswith(PATH_PREFIX):
+        name, _, rest = path[len(PATH_PREFIX):].partition("/")
+        scope["path"] = "/" + rest
+        scope["raw_path"] = scope["path"].encode("utf-8")
+        scope["root_path"] = scope.get("root_path", "") + PATH_PREFIX + name
+        return name
+    for key, value in scope["headers"]:
+        if key == WORKSPACE_HEADER:
+            return value.decode("latin-1")
+    return None
+
+
+class WorkspaceMiddleware:
+    """ASGI middleware routing each request to its workspace's database"""
+
+    def __init__(self, app, workspaces: WorkspaceRegistry = registry):
+        self.app = app
+        self.workspaces = workspaces
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        name = _workspace_name(scope)
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            check_name(name)
+        except InvalidWorkspace as exc:
+            await JSONResponse({"detail": str(exc)}, status_code=400)(scope, receive, send)
+            return
+        # Checked before the registry sees the name, so unknown names add no entries
+        if not (self.workspaces.settings.create or self.workspaces.exists(name)):
+            await JSONResponse({"detail": f"Workspace {name} not found"}, status_code=404)(scope, receive, send)
+            return
+        workspace = self.workspaces.workspace(name)
+
+        # Read by the response cache, so entries and ETags are kept per workspace
+        state = scope.setdefault("state", {})
+        state["workspace"] = name
+        state["data_version"] = workspace.version
+
+        workspace_token = current_workspace.set(workspace)
+        session_token = current_sessionmaker.set(workspace.session)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_sessionmaker.reset(session_token)
+            current_workspace.reset(workspace_token)
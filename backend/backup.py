@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Back up, list or restore the SQLite database.
+
+Takes a consistent online backup even while the server is running and
+writing, then gzips it into FILAMENT_BACKUP_DIR and rotates out old ones.
+Restoring replaces the database's contents with a backup, after backing up
+the current data. Restore through the server's /admin/backups endpoints
+while it runs, so its response cache and event feed see the change.
+"""
+
+import argparse
+import sys
+
+from app import backup, migrations
+from app.database import engine
+
+
+def _report(report: dict) -> None:
+    for key, value in report.items():
+        print(f"{key}: {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--list", action="store_true", help="list backups, newest first")
+    parser.add_argument("--restore", metavar="NAME", help="restore the named backup")
+    parser.add_argument("--workspace", help="back up or restore this workspace's database instead of the default")
+    parser.add_argument("--dir", default=backup.BACKUP_DIR, help="backup directory")
+    parser.add_argument("--keep", type=int, default=backup.KEEP, help="backups kept after rotation")
+    parser.add_argument("--step-pages", type=int, default=backup.STEP_PAGES, help="pages copied per step")
+    args = parser.parse_args()
+
+    db_engine = engine
+    if args.workspace:
+        from app import tenancy
+
+        if not tenancy.settings.enabled:
+            parser.error("--workspace needs FILAMENT_WORKSPACE_DIR")
+        try:
+            db_engine = tenancy.registry.engine(tenancy.check_name(args.workspace))
+        except (tenancy.InvalidWorkspace, tenancy.UnknownWorkspace) as exc:
+            parser.error(str(exc))
+    else:
+        migrations.init_db(engine)
+
+    try:
+        if args.list:
+            for entry in backup.list_backups(db_engine, args.dir):
+                print(f"{entry['name']}  {entry['bytes']:>12} bytes  {entry['created_at']:%Y-%m-%d %H:%M:%S} UTC")
+        elif args.restore:
+            _report(backup.restore_backup(db_engine, args.restore, args.dir, args.keep))
+        else:
+            _report(backup.create_backup(db_engine, args.dir, args.keep, args.step_pages))
+    except (backup.BackupError, backup.BackupNotFound) as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
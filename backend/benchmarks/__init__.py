@@ -0,0 +1,4 @@
+"""Performance benchmarks for the Filament Inventory API.
+
+Run from the backend directory, e.g. ``python -m benchmarks.sqlite_concurrency``.
+"""
@@ -0,0 +1,611 @@
+#!/usr/bin/env python3
+"""Latency, throughput and query counts for every API route at a given scale.
+
+Seeds a database with the requested number of spools (and filaments,
+purchases and readings in proportion, from generate_test_data), then drives every route registered
+in app.main with concurrent clients: reads first, then creates, updates and
+finally deletes of the rows the creates made, so the seeded data is left
+much as it was found. Each route is measured in-process (TestClient) and/or over
+HTTP against a uvicorn server on the same database, and reported as p50,
+p95 and p99 latency, throughput, and the SQL statements one request runs.
+
+The response cache is disabled so every request reaches the database;
+pass --response-cache to measure it as deployed. Results are written as
+JSON, and two result files can be compared to catch regressions:
+
+    python -m benchmarks.api_suite --scale 1k
+    python -m benchmarks.api_suite --scale 100k --database /tmp/bench.db --output after.json
+    python -m benchmarks.api_suite --compare before.json after.json
+
+A million spools is about six million rows and takes a few minutes to
+generate; with --database the seeded file is kept and reused by later runs
+at the same path.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Spools per scale; the other tables are sized from it
+SCALES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+MODES = ("inprocess", "http")
+
+# Untimed requests run one at a time before each route, to count its statements
+QUERY_SAMPLES = 3
+
+# Routes that read or write whole tables run this fraction of the requests
+HEAVY_SHARE = 0.1
+
+BULK_ITEMS = 20
+
+# Statuses a route may answer with without counting as an error
+OK_STATUSES = {200, 202}
+
+
+@dataclass
+class Scenario:
+    """One route and how to build a request for it"""
+    method: str
+    route: str  # Path template as registered, e.g. /spools/{spool_id}
+    build: Callable[["Context"], Optional[Tuple[str, Optional[dict]]]]  # None when nothing is left to act on
+    heavy: bool = False
+    ok: set = field(default_factory=lambda: OK_STATUSES)
+    creates: Optional[str] = None  # Pool that response ids are added to
+    # An endless stream, timed to its first event; TestClient buffers whole responses, so HTTP only
+    stream: bool = False
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} {self.route}"
+
+
+class Context:
+    """Ids sampled from the seeded data, and the rows the benchmark created"""
+
+    def __init__(self, samples: Dict[str, list], seed: int):
+        self.samples = samples
+        self.rng = random.Random(seed)
+        self.token = f"{seed}-{int(time.time())}"
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self.created: Dict[str, list] = {}
+
+    def pick(self, key: str):
+        with self._lock:
+            return self.rng.choice(self.samples[key])
+
+    def unique(self, prefix: str) -> str:
+        return f"{prefix} {self.token}-{next(self._counter)}"
+
+    def add(self, pool: str, ids) -> None:
+        with self._lock:
+            self.created.setdefault(pool, []).extend(ids)
+
+    def take(self, pool: str) -> Optional[int]:
+        with self._lock:
+            ids = self.created.get(pool)
+            return ids.pop() if ids else None
+
+
+def _item(ctx: Context) -> dict:
+    return {"filament_id": ctx.pick("filament_ids"), "date_ordered": "2024-06-01", "spools": 2,
+            "kg_per_spool": 1.0, "unit_price": 19.99, "shelf": ctx.pick("shelves")}
+
+
+def _purchase(ctx: Context, items: int = 1) -> dict:
+    return {"date_ordered": "2024-06-01", "marketplace": "Bench", "subtotal": 19.99 * items,
+            "items": [_item(ctx) for _ in range(items)]}
+
+
+def _filament(ctx: Context) -> dict:
+    return {"name": ctx.unique("Bench Filament"), "vendor_id": ctx.pick("vendor_ids"), "material": "PLA",
+            "color": "Black", "date_added": "2024-06-01"}
+
+
+def _spool(ctx: Context) -> dict:
+    return {"filament_id": ctx.pick("filament_ids"), "date_opened": "2024-06-01", "remaining_kg": 1.0,
+            "shelf": ctx.pick("shelves")}
+
+
+def _bulk_spools(ctx: Context) -> Tuple[str, dict]:
+    # Each batch gets its own shelf, which DELETE /spools/bulk later filters on
+    shelf = ctx.unique("Bench")
+    ctx.add("spool_shelves", [shelf])
+    return "/spools/bulk", {"items": [{**_spool(ctx), "shelf": shelf} for _ in range(BULK_ITEMS)]}
+
+
+def _delete_spool_shelf(ctx: Context):
+    shelf = ctx.take("spool_shelves")
+    return None if shelf is None else ("/spools/bulk?" + urlencode({"shelf": shelf}), None)
+
+
+def _delete_purchase_items(ctx: Context):
+    purchase_id = ctx.take("bulk_purchases")
+    if purchase_id is None:
+        return None
+    ctx.add("purchases", [purchase_id])  # Empty once this runs, so the single delete can remove it
+    return f"/purchase-items/bulk?purchase_id={purchase_id}", None
+
+
+def _delete(pool: str, path: str):
+    def build(ctx: Context):
+        target = ctx.take(pool)
+        return None if target is None else (path.format(target), None)
+    return build
+
+
+def scenarios() -> List[Scenario]:
+    """Every route in app.main, in the order they are run"""
+    return [
+        # Reads against the seeded data
+        Scenario("GET", "/vendors/", lambda c: ("/vendors/?limit=100", None)),
+        Scenario("GET", "/vendors/{vendor_id}", lambda c: (f"/vendors/{c.pick('vendor_ids')}", None)),
+        Scenario("GET", "/filaments/", lambda c: ("/filaments/?limit=100", None)),
+        Scenario("GET", "/filaments/search", lambda c: (f"/filaments/search?q={c.pick('search_terms')}", None)),
+        Scenario("GET", "/filaments/facets", lambda c: (f"/filaments/facets?material={c.pick('materials')}", None)),
+        Scenario("GET", "/filaments/{filament_id}", lambda c: (f"/filaments/{c.pick('filament_ids')}", None)),
+        Scenario("GET", "/purchases/", lambda c: ("/purchases/?limit=100&include=filament", None)),
+        Scenario("GET", "/purchases/{purchase_id}", lambda c: (f"/purchases/{c.pick('purchase_ids')}", None)),
+        Scenario("GET", "/purchase-items/", lambda c: ("/purchase-items/?limit=100", None)),
+        Scenario("GET", "/purchase-items/{item_id}", lambda c: (f"/purchase-items/{c.pick('item_ids')}", None)),
+        Scenario("GET", "/spools/", lambda c: ("/spools/?limit=100", None)),
+        Scenario("GET", "/spools/{spool_id}", lambda c: (f"/spools/{c.pick('spool_ids')}", None)),
+        Scenario("GET", "/spools/by-filament/{filament_name}",
+                 lambda c: (f"/spools/by-filament/{c.pick('filament_names')}", None)),
+        Scenario("GET", "/spools/{spool_id}/readings", lambda c: (f"/spools/{c.pick('spool_ids')}/readings", None)),
+        Scenario("GET", "/telemetry/stats", lambda c: ("/telemetry/stats", None)),
+        Scenario("GET", "/inventory/summary", lambda c: ("/inventory/summary", None), heavy=True),
+        Scenario("GET", "/inventory/forecast", lambda c: ("/inventory/forecast?window_days=90", None), heavy=True),
+        Scenario("GET", "/inventory/facets", lambda c: (f"/inventory/facets?shelf={c.pick('shelves')}", None)),
+        Scenario("GET", "/export/{table}", lambda c: ("/export/spools?format=ndjson", None), heavy=True),
+        Scenario("GET", "/sync", lambda c: (f"/sync?since={c.pick('sync_tokens')}&limit=1000", None)),
+        Scenario("GET", "/events", lambda c: ("/events", None), stream=True),
+        Scenario("GET", "/metrics", lambda c: ("/metrics", None)),
+        Scenario("GET", "/admin/backups", lambda c: ("/admin/backups", None)),
+        # Overlapping backups are refused with a 409; the names feed the restore at the end
+        Scenario("POST", "/admin/backups", lambda c: ("/admin/backups", None), heavy=True, ok={200, 409},
+                 creates="backups"),
+        Scenario("GET", "/{full_path:path}", lambda c: ("/", None)),
+        # Creates; their ids feed the deletes below. A purchase can only be
+        # deleted once its items are, so single purchases have one item each
+        # and bulk purchases have theirs removed by a filtered bulk delete
+        Scenario("POST", "/vendors/", lambda c: ("/vendors/", {"name": c.unique("Bench Vendor")}), creates="vendors"),
+        Scenario("POST", "/filaments/", lambda c: ("/filaments/", _filament(c)), creates="filaments"),
+        Scenario("POST", "/filaments/bulk",
+                 lambda c: ("/filaments/bulk", {"items": [_filament(c) for _ in range(BULK_ITEMS)]}),
+                 creates="filaments"),
+        Scenario("PUT", "/vendors/by-name/{name:path}",
+                 lambda c: (f"/vendors/by-name/{c.unique('Bench Vendor')}", {"notes": "upsert"}), creates="vendors"),
+        Scenario("PUT", "/vendors/by-name", lambda c: ("/vendors/by-name", {"items": [
+            {"name": c.unique("Bench Vendor")} for _ in range(BULK_ITEMS)
+        ]}), creates="vendors"),
+        Scenario("PUT", "/filaments/by-name/{name:path}", lambda c: (
+            f"/filaments/by-name/{c.unique('Bench Filament')}", {k: v for k, v in _filament(c).items() if k != "name"}
+        ), creates="filaments"),
+        Scenario("PUT", "/filaments/by-name",
+                 lambda c: ("/filaments/by-name", {"items": [_filament(c) for _ in range(BULK_ITEMS)]}),
+                 creates="filaments"),
+        Scenario("POST", "/purchases/", lambda c: ("/purchases/", _purchase(c)), creates="purchases"),
+        Scenario("POST", "/purchases/bulk",
+                 lambda c: ("/purchases/bulk", {"items": [_purchase(c, 2) for _ in range(BULK_ITEMS)]}),
+                 creates="bulk_purchases"),
+        Scenario("POST", "/spools/", lambda c: ("/spools/", _spool(c)), creates="spools"),
+        Scenario("POST", "/spools/bulk", _bulk_spools),
+        Scenario("POST", "/telemetry/readings", lambda c: ("/telemetry/readings", {"readings": [
+            {"spool_id": c.pick("spool_ids"), "grams": round(c.rng.uniform(0, 1000), 1)} for _ in range(BULK_ITEMS)
+        ]}), ok={202, 503}),
+        # Updates of seeded rows
+        Scenario("PUT", "/vendors/{vendor_id}",
+                 lambda c: (f"/vendors/{c.pick('vendor_ids')}", {"notes": c.unique("notes")})),
+        Scenario("PUT", "/filaments/{filament_id}",
+                 lambda c: (f"/filaments/{c.pick('filament_ids')}", {"notes": c.unique("notes")})),
+        Scenario("PUT", "/purchases/{purchase_id}",
+                 lambda c: (f"/purchases/{c.pick('purchase_ids')}", {"notes": c.unique("notes")})),
+        Scenario("PUT", "/purchase-items/{item_id}",
+                 lambda c: (f"/purchase-items/{c.pick('item_ids')}", {"shelf": c.pick("shelves")})),
+        Scenario("PUT", "/spools/{spool_id}",
+                 lambda c: (f"/spools/{c.pick('spool_ids')}", {"remaining_kg": round(c.rng.uniform(0, 1), 3)})),
+        Scenario("PATCH", "/purchase-items/bulk", lambda c: ("/purchase-items/bulk", {"items": [
+            {"id": c.pick("item_ids"), "shelf": c.pick("shelves")} for _ in range(BULK_ITEMS)
+        ]})),
+        Scenario("PATCH", "/spools/bulk", lambda c: ("/spools/bulk", {"items": [
+            {"id": c.pick("spool_ids"), "remaining_kg": round(c.rng.uniform(0, 1), 3)} for _ in range(BULK_ITEMS)
+        ]})),
+        # Deletes of what the creates made, children first
+        Scenario("DELETE", "/spools/{spool_id}", _delete("spools", "/spools/{}")),
+        Scenario("DELETE", "/spools/bulk", _delete_spool_shelf),
+        Scenario("DELETE", "/purchase-items/{item_id}", _delete("purchase_items", "/purchase-items/{}")),
+        Scenario("DELETE", "/purchase-items/bulk", _delete_purchase_items),
+        Scenario("DELETE", "/purchases/{purchase_id}", _delete("purchases", "/purchases/{}")),
+        Scenario("DELETE", "/filaments/{filament_id}", _delete("filaments", "/filaments/{}")),
+        Scenario("DELETE", "/vendors/{vendor_id}", _delete("vendors", "/vendors/{}")),
+        # Last, as it rolls the data back to a backup taken during the reads
+        Scenario("POST", "/admin/backups/{name}/restore", _delete("backups", "/admin/backups/{}/restore"),
+                 heavy=True, ok={200, 409}),
+    ]
+
+
+def uncovered_routes(app, planned: List[Scenario]) -> List[str]:
+    """Routes in app.main with no scenario, so new endpoints are not silently skipped"""
+    from fastapi.routing import APIRoute
+
+    planned_names = {scenario.name for scenario in planned}
+    missing = []
+    for route in app.routes:
+        if not isinstance(route, APIRoute) or not route.endpoint.__module__.startswith("app."):
+            continue
+        for method in sorted(route.methods - {"HEAD"}):
+            name = f"{method} {route.path}"
+            if name not in planned_names and name not in missing:
+                missing.append(name)
+    return missing
+
+
+def _created_ids(body) -> list:
+    """Ids a create, bulk create or batch upsert answered with, or the name of a backup"""
+    if isinstance(body, list):
+        return [row["id"] for row in body]
+    if "results" in body:
+        return [row["id"] for row in body["results"] if row.get("id") is not None]
+    return [body["id"] if "id" in body else body["name"]]
+
+
+# Seeding
+def seed(db_engine, spools: int, seed_value: int) -> Dict[str, int]:
+    """Generate a synthetic dataset of the given size straight into the database"""
+    from generate_test_data import Scale, generate
+
+    return generate(db_engine, Scale.from_spools(spools), seed=seed_value)
+
+
+def sample(session_factory, size: int = 1000) -> Dict[str, list]:
+    """Random existing ids and values for the scenarios to pick from"""
+    from sqlalchemy import func, select
+
+    from app import models, sync
+
+    def ids(column):
+        return list(db.scalars(select(column).order_by(func.random()).limit(size)))
+
+    with session_factory() as db:
+        filaments = db.execute(
+            select(models.Filament.id, models.Filament.name).order_by(func.random()).limit(size)
+        ).all()
+        shelves = [s for s in db.scalars(select(models.Spool.shelf).distinct()) if s]
+        version, floor = sync.token_range(db)
+        return {
+            "vendor_ids": ids(models.Vendor.id),
+            "filament_ids": [row.id for row in filaments],
+            "filament_names": [row.name for row in filaments],
+            "search_terms": [row.name.split()[-1][:3] for row in filaments] + ["pla", "seed fil"],
+            "materials": list(db.scalars(select(models.Filament.material).distinct())),
+            "purchase_ids": ids(models.Purchase.id),
+            "item_ids": ids(models.PurchaseItem.id),
+            "spool_ids": ids(models.Spool.id),
+            "shelves": shelves or ["A1"],
+            # Clients a few changes behind, with tokens from since the last restore
+            "sync_tokens": [max(floor, version - behind) for behind in (10, 100, 1000)],
+        }
+
+
+# Measurement
+def percentile(ordered: List[float], fraction: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_scenario(client, scenario: Scenario, ctx: Context, requests: int, concurrency: int, engine=None) -> dict:
+    from app import profiling
+
+    statuses: Dict[int, int] = {}
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def send(request) -> Tuple[int, float]:
+        url, body = request
+        started = time.perf_counter()
+        if scenario.stream:
+            with client.stream(scenario.method, url) as response:
+                next(response.iter_bytes())
+            return response.status_code, time.perf_counter() - started
+        response = client.request(scenario.method, url, json=body)
+        elapsed = time.perf_counter() - started
+        if scenario.creates and response.status_code == 200:
+            body = response.json()
+            ctx.add(scenario.creates, _created_ids(body))
+            if scenario.creates == "purchases":
+                ctx.add("purchase_items", [item["id"] for item in body["items"]])
+        return response.status_code, elapsed
+
+    # Untimed samples, one at a time, so statements can be attributed to a
+    # request; the telemetry writer's flushes and the event hub's reads belong to no request
+    queries = []
+    repeated = {}
+    for _ in range(QUERY_SAMPLES):
+        request = scenario.build(ctx)
+        if request is None:
+            break
+        if engine is None:
+            send(request)
+            continue
+        with profiling.capture(engine, ignore_threads=("telemetry-writer", "event-hub")) as profile:
+            send(request)
+        queries.append(profile.count)
+        repeated.update(profile.repeated())
+
+    count = max(1, int(requests * HEAVY_SHARE)) if scenario.heavy else requests
+    batch = [request for request in (scenario.build(ctx) for _ in range(count)) if request is not None]
+
+    def timed(request):
+        try:
+            status, elapsed = send(request)
+        except Exception:
+            # Dropped connections and the like; status 0 counts as an error
+            status, elapsed = 0, 0.0
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, batch))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(n for status, n in statuses.items() if status not in scenario.ok)
+    return {
+        "requests": len(batch),
+        "errors": errors,
+        "statuses": {str(status): n for status, n in sorted(statuses.items())},
+        "p50_ms": _ms(percentile(latencies, 0.50)),
+        "p95_ms": _ms(percentile(latencies, 0.95)),
+        "p99_ms": _ms(percentile(latencies, 0.99)),
+        "max_ms": _ms(latencies[-1] if latencies else None),
+        "throughput_rps": round(len(batch) / wall, 1) if batch and wall > 0 else None,
+        "queries_per_request": round(sum(queries) / len(queries), 1) if queries else None,
+        "max_queries": max(queries) if queries else None,
+        "query_budget": profiling.QUERY_BUDGETS.get(scenario.name),
+        "repeated_statements": repeated,
+    }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def over_budget(result: dict) -> bool:
+    return result["query_budget"] is not None and (result["max_queries"] or 0) > result["query_budget"]
+
+
+def run_all(client, ctx: Context, requests: int, concurrency: int, engine=None, streams: bool = True) -> dict:
+    results = {}
+    for scenario in scenarios():
+        if scenario.stream and not streams:
+            continue
+        results[scenario.name] = result = run_scenario(client, scenario, ctx, requests, concurrency, engine)
+        print(f"  {scenario.name:<42} p50 {_fmt(result['p50_ms'])}  p95 {_fmt(result['p95_ms'])}  "
+              f"p99 {_fmt(result['p99_ms'])}  {_fmt(result['throughput_rps'], ' req/s')}  "
+              f"queries {_fmt(result['queries_per_request'], '')}"
+              + (f"  ERRORS {result['errors']} {result['statuses']}" if result["errors"] else "")
+              + (f"  OVER BUDGET {result['max_queries']} > {result['query_budget']}" if over_budget(result) else ""))
+        for shape, count in result["repeated_statements"].items():
+            print(f"    probable N+1: {count} x {shape[:100]}")
+    return results
+
+
+def _fmt(value: Optional[float], unit: str = " ms") -> str:
+    return "-" if value is None else f"{value:.1f}{unit}"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve(port: int) -> subprocess.Popen:
+    """Start uvicorn on the benchmark database and wait until it answers"""
+    import httpx
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=os.environ.copy(),
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("uvicorn exited before it started serving")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/telemetry/stats", timeout=1)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn did not start within 60 seconds")
+
+
+# Comparing results
+def compare(before_path: str, after_path: str, threshold: float) -> int:
+    """Print per-route changes; exit status 1 if p95 or the query count regressed"""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    regressions = 0
+    for mode, routes in after["results"].items():
+        print(f"{mode}:")
+        for name, new in routes.items():
+            old = before["results"].get(mode, {}).get(name)
+            if old is None:
+                print(f"  {name:<42} new")
+                continue
+            flags = []
+            if old["p95_ms"] and new["p95_ms"] and new["p95_ms"] > old["p95_ms"] * (1 + threshold):
+                flags.append("p95")
+            if (old["queries_per_request"] is not None and new["queries_per_request"] is not None
+                    and new["queries_per_request"] > old["queries_per_request"]):
+                flags.append("queries")
+            regressions += bool(flags)
+            print(f"  {name:<42} p95 {_fmt(old['p95_ms'])} -> {_fmt(new['p95_ms'])} ({_change(old['p95_ms'], new['p95_ms'])})"
+                  f"  throughput {_change(old['throughput_rps'], new['throughput_rps'])}"
+                  f"  queries {_fmt(old['queries_per_request'], '')} -> {_fmt(new['queries_per_request'], '')}"
+                  + (f"  REGRESSED: {', '.join(flags)}" if flags else ""))
+    print(f"{regressions} route(s) regressed beyond {threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def _change(old: Optional[float], new: Optional[float]) -> str:
+    if not old or new is None:
+        return "-"
+    return f"{(new - old) / old:+.0%}"
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=SCALES, default="1k", help="Seeded spools")
+    parser.add_argument("--spools", type=int, help="Seed this many spools instead of a preset scale")
+    parser.add_argument("--mode", choices=MODES + ("both",), default="both")
+    parser.add_argument("--requests", type=int, default=200, help="Timed requests per route")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--database", help="SQLite file to seed, or reuse if it is already seeded")
+    parser.add_argument("--response-cache", action="store_true", help="Leave the response cache enabled")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for data and requests")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p95 growth counted as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare, args.threshold)
+
+    # Configure the app through its environment before importing it; the
+    # uvicorn subprocess inherits the same settings
+    scratch = None
+    if args.database is None:
+        scratch = tempfile.TemporaryDirectory()
+        args.database = os.path.join(scratch.name, "api_suite.db")
+    os.environ["FILAMENT_DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.database)}"
+    if not args.response_cache:
+        os.environ["FILAMENT_RESPONSE_CACHE_ENTRIES"] = "0"
+    # Backups go to a scratch directory, all kept so the restores find theirs
+    backups = tempfile.TemporaryDirectory()
+    os.environ["FILAMENT_BACKUP_DIR"] = backups.name
+    os.environ["FILAMENT_BACKUP_KEEP"] = "1000"
+    sys.path.insert(0, BACKEND_DIR)
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import func, select
+
+    from app import models
+    from app.database import SessionLocal, engine
+    from app.main import app
+
+    spools = args.spools or SCALES[args.scale]
+    with SessionLocal() as db:
+        seeded = db.scalar(select(func.count()).select_from(models.Spool))
+    if not seeded:
+        print(f"Seeding {spools} spools into {args.database}")
+        started = time.perf_counter()
+        seed(engine, spools, args.seed)
+        print(f"Seeded in {time.perf_counter() - started:.1f}s")
+    else:
+        print(f"Reusing {seeded} spools in {args.database}")
+
+    missing = uncovered_routes(app, scenarios())
+    if missing:
+        print("Routes without a scenario: " + ", ".join(missing), file=sys.stderr)
+
+    with SessionLocal() as db:
+        counts = {table: db.scalar(select(func.count()).select_from(model)) for table, model in (
+            ("vendors", models.Vendor), ("filaments", models.Filament), ("purchases", models.Purchase),
+            ("purchase_items", models.PurchaseItem), ("spools", models.Spool), ("spool_readings", models.SpoolReading),
+        )}
+    samples = sample(SessionLocal)
+
+    results = {}
+    modes = MODES if args.mode == "both" else (args.mode,)
+    if "inprocess" in modes:
+        print("In-process:")
+        with TestClient(app, raise_server_exceptions=False) as client:
+            results["inprocess"] = run_all(client, Context(samples, args.seed), args.requests, args.concurrency,
+                                           engine, streams=False)
+    if "http" in modes:
+        import httpx
+
+        print("HTTP:")
+        # A restore ends the in-process run and voids the sync tokens sampled before it
+        samples = sample(SessionLocal)
+        port = _free_port()
+        server = serve(port)
+        try:
+            limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+            with httpx.Client(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120) as client:
+                http = run_all(client, Context(samples, args.seed), args.requests, args.concurrency, None)
+        finally:
+            server.terminate()
+            server.wait()
+        # Statements are only visible in-process; the server runs the same code
+        for name, result in http.items():
+            measured = results.get("inprocess", {}).get(name, {})
+            for key in ("queries_per_request", "max_queries", "repeated_statements"):
+                result[key] = measured.get(key, result[key])
+        results["http"] = http
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "response_cache": args.response_cache,
+            "rows": counts,
+            "uncovered_routes": missing,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    if scratch is not None:
+        engine.dispose()
+        scratch.cleanup()
+    backups.cleanup()
+    errors = sum(result["errors"] for routes in results.values() for result in routes.values())
+    budget_failures = [name for name, result in results.get("inprocess", {}).items() if over_budget(result)]
+    if budget_failures:
+        print("Over their query budget: " + ", ".join(budget_failures), file=sys.stderr)
+    return 1 if errors or missing or budget_failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
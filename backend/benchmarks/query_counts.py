@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Check that list endpoints issue a bounded number of queries per page.
+
+Seeds a scratch database with purchases that each have several items, then
+requests GET /purchases/ at increasing page sizes (with and without
+include=filament) and counts the SQL statements each request runs. The
+count must not grow with the page size; the exit status is 1 if it does.
+
+    python -m benchmarks.query_counts
+"""
+
+import os
+import sys
+import tempfile
+
+# Point the app at a scratch database before it is imported
+_tmp = tempfile.TemporaryDirectory()
+os.environ["FILAMENT_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'query_counts.db')}"
+
+from datetime import date  # noqa: E402
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app import crud, schemas  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+
+# Eager loads batch their IN lists 500 keys at a time, so stay within one batch
+PAGE_SIZES = (5, 50, 150)
+ITEMS_PER_PURCHASE = 3
+
+
+def seed(purchases: int):
+    with SessionLocal() as db:
+        crud.bulk_create_filaments(db, [
+            schemas.FilamentCreate(name=f"Filament {i}", manufacturer="Bench", material="PLA",
+                                   date_added=date(2024, 1, 1))
+            for i in range(20)
+        ], create_missing_vendors=True)
+        crud.bulk_create_purchases(db, [
+            schemas.PurchaseCreate(date_ordered=date(2024, 1, 1), subtotal=10.0, items=[
+                schemas.PurchaseItemCreate(filament_name=f"Filament {(p + i) % 20}", date_ordered=date(2024, 1, 1),
+                                           spools=1, kg_per_spool=1.0, unit_price=10.0)
+                for i in range(ITEMS_PER_PURCHASE)
+            ])
+            for p in range(purchases)
+        ])
+
+
+def count_queries(client: TestClient, url: str) -> int:
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(url)
+        assert response.status_code == 200, response.text
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return len(statements)
+
+
+def main() -> int:
+    seed(max(PAGE_SIZES))
+    client = TestClient(app)
+    failed = False
+    for include in ("", "&include=filament"):
+        counts = {size: count_queries(client, f"/purchases/?limit={size}{include}")
+                  for size in PAGE_SIZES}
+        constant = len(set(counts.values())) == 1
+        failed |= not constant
+        label = include.lstrip("&") or "items only"
+        print(f"{label:>18}: " + ", ".join(f"{size} rows -> {n} queries" for size, n in counts.items())
+              + ("" if constant else "  FAIL: grows with page size"))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Per-row CPU cost of large list responses: the ORM path against app.lean.
+
+Seeds a scratch database with generate_test_data, then reads one page of
+--rows rows (default 20000) from each list table two ways, from query to
+JSON bytes:
+
+- orm: ORM instances, validated into the response model with
+  from_attributes and encoded the way FastAPI renders a response_model
+  (model dump in JSON mode, then json.dumps);
+- lean: the column-only rows, batch adapter and pydantic-core encoder of
+  app.lean, as the list endpoints now use.
+
+It also times NDJSON export lines with json.dumps against pydantic-core.
+Both paths must produce the same JSON; the exit status is 1 if they do not.
+
+    python -m benchmarks.serialization --rows 20000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from typing import List
+
+# Point the app at a scratch database before it is imported
+_tmp = tempfile.TemporaryDirectory()
+os.environ["FILAMENT_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'serialization.db')}"
+
+from pydantic import TypeAdapter  # noqa: E402
+from pydantic_core import to_json  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from app import lean, models, pagination, schemas  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+from generate_test_data import Scale, generate  # noqa: E402
+
+TABLES = (
+    ("spools", models.Spool, schemas.Spool),
+    ("purchase_items", models.PurchaseItem, schemas.PurchaseItem),
+    ("filaments", models.Filament, schemas.Filament),
+)
+
+
+def orm_path(db, model, schema, rows: int) -> bytes:
+    instances = pagination.paginate(db.query(model), model.id, 0, rows, None).all()
+    adapter = TypeAdapter(List[schema])
+    content = adapter.dump_python(adapter.validate_python(instances, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def lean_path(db, model, schema, rows: int) -> bytes:
+    return lean.render(schema, db.execute(lean.page_statement(model, schema, 0, rows)).all())
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def ndjson_stdlib(db, model, schema, rows: int) -> bytes:
+    result = db.execute(select(*model.__table__.columns).order_by(model.id).limit(rows)).mappings()
+    return "".join(json.dumps(dict(row), default=_json_default) + "\n" for row in result).encode("utf-8")
+
+
+def ndjson_pydantic(db, model, schema, rows: int) -> bytes:
+    result = db.execute(select(*model.__table__.columns).order_by(model.id).limit(rows)).mappings()
+    return b"".join(to_json(dict(row)) + b"\n" for row in result)
+
+
+def measure(path, model, schema, rows: int, repeat: int):
+    """Best CPU time over repeat runs, each on a fresh session, and the last output"""
+    best = None
+    for _ in range(repeat):
+        with SessionLocal() as db:
+            started = time.process_time()
+            body = path(db, model, schema, rows)
+            elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, body
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, default=20000, help="Rows per response (default 20000)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per path; the fastest is reported")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    generate(engine, Scale.from_spools(args.rows), seed=args.seed)
+    print(f"{'table':16}{'rows':>8}{'orm us/row':>13}{'lean us/row':>13}{'saved':>9}{'speedup':>9}")
+
+    failed = False
+    for name, model, schema in TABLES:
+        orm_seconds, orm_body = measure(orm_path, model, schema, args.rows, args.repeat)
+        lean_seconds, lean_body = measure(lean_path, model, schema, args.rows, args.repeat)
+        count = len(json.loads(lean_body))
+        if json.loads(orm_body) != json.loads(lean_body):
+            print(f"{name}: lean response differs from the ORM response")
+            failed = True
+        orm_us, lean_us = orm_seconds * 1e6 / count, lean_seconds * 1e6 / count
+        print(f"{name:16}{count:>8}{orm_us:>13.1f}{lean_us:>13.1f}{orm_us - lean_us:>9.1f}"
+              f"{orm_seconds / lean_seconds:>8.1f}x")
+
+    print(f"\n{'ndjson export':16}{'rows':>8}{'json us/row':>13}{'pydantic':>13}{'saved':>9}{'speedup':>9}")
+    for name, model, schema in TABLES:
+        std_seconds, std_body = measure(ndjson_stdlib, model, schema, args.rows, args.repeat)
+        fast_seconds, fast_body = measure(ndjson_pydantic, model, schema, args.rows, args.repeat)
+        std_lines, fast_lines = std_body.splitlines(), fast_body.splitlines()
+        if [json.loads(line) for line in std_lines] != [json.loads(line) for line in fast_lines]:
+            print(f"{name}: pydantic-core NDJSON differs from json.dumps")
+            failed = True
+        count = len(fast_lines)
+        std_us, fast_us = std_seconds * 1e6 / count, fast_seconds * 1e6 / count
+        print(f"{name:16}{count:>8}{std_us:>13.1f}{fast_us:>13.1f}{std_us - fast_us:>9.1f}"
+              f"{std_seconds / fast_seconds:>8.1f}x")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
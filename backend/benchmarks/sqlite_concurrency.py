@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Compare read/write throughput of default vs tuned SQLite settings.
+
+Starts writer threads that update spools and reader threads that fetch the
+inventory summary against a scratch database, first with SQLite's stock
+settings (rollback journal, synchronous=FULL) and then with the tuned
+settings from app.database. Reports operations per second and how many
+operations failed with "database is locked".
+
+    python -m benchmarks.sqlite_concurrency --writers 4 --readers 8 --seconds 10
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, migrations, schemas
+from app.database import DatabaseSettings, create_db_engine
+
+FILAMENTS = 50
+SPOOLS_PER_FILAMENT = 20
+
+
+def seed(SessionLocal):
+    with SessionLocal() as db:
+        crud.bulk_create_filaments(db, [
+            schemas.FilamentCreate(name=f"Filament {i}", manufacturer="Bench", material="PLA",
+                                   date_added=date(2024, 1, 1))
+            for i in range(FILAMENTS)
+        ], create_missing_vendors=True)
+        crud.bulk_create_spools(db, [
+            schemas.SpoolCreate(filament_name=f"Filament {i}", date_opened=date(2024, 1, 1), remaining_kg=1.0)
+            for i in range(FILAMENTS) for _ in range(SPOOLS_PER_FILAMENT)
+        ])
+
+
+def run(settings: DatabaseSettings, writers: int, readers: int, seconds: float) -> dict:
+    engine = create_db_engine(settings)
+    migrations.init_db(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    seed(SessionLocal)
+
+    counts = {"writes": 0, "reads": 0, "write_errors": 0, "read_errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    spool_count = FILAMENTS * SPOOLS_PER_FILAMENT
+
+    def writer(seed_value):
+        rng = random.Random(seed_value)
+        while time.perf_counter() < deadline:
+            with SessionLocal() as db:
+                try:
+                    crud.update_spool(db, rng.randint(1, spool_count),
+                                      schemas.SpoolUpdate(remaining_kg=round(rng.random(), 3)))
+                    key = "writes"
+                except OperationalError:
+                    db.rollback()
+                    key = "write_errors"
+            with lock:
+                counts[key] += 1
+
+    def reader():
+        while time.perf_counter() < deadline:
+            with SessionLocal() as db:
+                try:
+                    crud.get_inventory_summary(db)
+                    key = "reads"
+                except OperationalError:
+                    key = "read_errors"
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    return {
+        **counts,
+        "writes_per_sec": counts["writes"] / seconds,
+        "reads_per_sec": counts["reads"] / seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite concurrency benchmark")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    profiles = {
+        "default": DatabaseSettings(
+            sqlite_journal_mode="DELETE",
+            sqlite_synchronous="FULL",
+            sqlite_cache_size_kb=2000,
+            sqlite_mmap_size=0,
+        ),
+        "tuned": DatabaseSettings(),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, profile in profiles.items():
+            path = os.path.join(tmp, f"{name}.db")
+            result = run(profile.with_url(f"sqlite:///{path}"), args.writers, args.readers, args.seconds)
+            print(
+                f"{name:>8}: {result['writes_per_sec']:9.1f} writes/s {result['reads_per_sec']:9.1f} reads/s "
+                f"({result['write_errors']} write / {result['read_errors']} read lock errors)"
+            )
+
+
+if __name__ == "__main__":
+    main()
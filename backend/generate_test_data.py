@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""Generate a large synthetic inventory directly in the database.
+
+Unlike populate_test_data.py this needs no running server: rows are built
+as NumPy columns and written with bulk inserts through the model tables,
+then the inventory rollup is rebuilt once. The same --seed and --end give
+the same data. Distributions aim for a realistic shape rather than uniform
+noise: vendors and filaments follow a long-tailed popularity, materials and
+colors have a few common values and many rare ones, purchases hold several
+items, spools are opened from purchased stock and are finished or partly
+used depending on their age, and each spool has a weight history that
+declines from full to its current weight.
+
+    python generate_test_data.py --spools 200000 --seed 1
+
+About a million rows in total at 200k spools. The target tables must be
+empty; point FILAMENT_DATABASE_URL at a new database to generate into it.
+"""
+
+import argparse
+import sys
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app import crud, migrations, models
+from app.database import engine
+
+INSERT_CHUNK = 50_000
+HISTORY_DAYS = 3 * 365
+
+# (value, relative frequency)
+MATERIALS = (
+    ("PLA", 40), ("PETG", 18), ("PLA+", 8), ("ABS", 7), ("ASA", 5), ("TPU", 5), ("Silk PLA", 4),
+    ("PLA-CF", 2.5), ("PETG-CF", 2), ("Nylon", 1.5), ("PC", 1.2), ("HIPS", 0.8), ("PVA", 0.6),
+    ("PA-CF", 0.6), ("Wood PLA", 0.5), ("Marble PLA", 0.4), ("PP", 0.3), ("PEEK", 0.05),
+)
+# Typical price per kg by material, before vendor and order variation
+MATERIAL_PRICES = {
+    "PLA": 20, "PETG": 21, "PLA+": 22, "ABS": 20, "ASA": 26, "TPU": 32, "Silk PLA": 24, "PLA-CF": 34,
+    "PETG-CF": 38, "Nylon": 45, "PC": 40, "HIPS": 24, "PVA": 60, "PA-CF": 70, "Wood PLA": 28,
+    "Marble PLA": 27, "PP": 45, "PEEK": 400,
+}
+# Ordered by popularity; drawn with a Zipf-like weight
+COLORS = (
+    "Black", "White", "Grey", "Red", "Blue", "Orange", "Silver", "Green", "Yellow", "Transparent",
+    "Purple", "Navy", "Beige", "Brown", "Pink", "Gold", "Olive", "Teal", "Sky Blue", "Light Grey",
+    "Dark Grey", "Copper", "Bronze", "Mint", "Lavender", "Burgundy", "Cyan", "Magenta", "Lime",
+    "Ivory", "Coral", "Sand", "Forest Green", "Charcoal", "Peach", "Turquoise", "Rainbow", "Galaxy Black",
+    "Glow Green", "Marble",
+)
+FEATURES = (
+    (None, 50), ("Matte", 18), ("Silk", 8), ("Glossy", 6), ("High Speed", 6), ("Translucent", 3),
+    ("Sparkle", 2.5), ("Dual Color", 2), ("Glow", 1.5), ("Tri Color", 1), ("Metallic", 1), ("UV Color Change", 0.5),
+)
+MARKETPLACES = (("Amazon", 45), ("Direct", 25), ("AliExpress", 12), ("eBay", 8), ("Local store", 6), (None, 4))
+# Spools bought per item, and their size
+ITEM_SPOOLS = ((1, 55), (2, 20), (3, 6), (4, 10), (5, 3), (10, 6))
+SPOOL_KG = ((1.0, 76), (0.5, 8), (0.75, 4), (2.0, 6), (3.0, 4), (5.0, 2))
+SHELVES = tuple(f"{row}{column}{side}{level}" for row in "ABCDEF" for column in range(1, 5)
+                for side in "LR" for level in "TB")
+TAX_RATE = 0.08
+
+VENDOR_PREFIXES = (
+    "Poly", "Proto", "Filo", "Extru", "Nano", "Prime", "Ultra", "Hyper", "Fila", "Print", "Layer", "Nozzle",
+    "Spool", "Micro", "Astro", "Terra", "Aero", "Fusion", "Vertex", "Helio", "Quanta", "Neo", "Omni", "Blue",
+    "Red", "Green", "Silver", "Iron", "Apex", "Zen",
+)
+VENDOR_SUFFIXES = (
+    "maker", "lab", "tech", "works", "forge", "craft", "print", "fab", "line", "form", "source", "mind",
+    "wave", "core", "stream", "max", "wire", "bits", "strand", "3D", "flex", "tek", "ware", "ment", "ix",
+    "ly", "on", "io", "ium", "ex",
+)
+LINE_NAMES = ("Basic", "Pro", "Premium", "Essentials", "Tough", "Rapid", "Eco", "Studio", "Max", "Lite", "Plus", "Ultra")
+
+
+@dataclass
+class Scale:
+    """Row counts for each table; readings are a per-spool mean"""
+    spools: int
+    filaments: int
+    vendors: int
+    purchases: int
+    readings_per_spool: float = 4.0
+
+    @classmethod
+    def from_spools(cls, spools: int, readings_per_spool: float = 4.0) -> "Scale":
+        """Proportions of a collection where most purchased spools have been opened"""
+        filaments = max(10, spools // 8)
+        return cls(
+            spools=spools,
+            filaments=filaments,
+            vendors=max(5, int(2 * filaments ** 0.5)),
+            # About 2 items of 2 spools per purchase, with 85% of spools opened
+            purchases=max(5, int(spools / 0.85 / 4.4)),
+            readings_per_spool=readings_per_spool,
+        )
+
+
+def _weighted(rng: np.random.Generator, choices, size: int) -> list:
+    values = [value for value, _ in choices]
+    weights = np.array([weight for _, weight in choices], dtype=float)
+    return [values[i] for i in rng.choice(len(values), size=size, p=weights / weights.sum())]
+
+
+def _zipf_weights(count: int, exponent: float) -> np.ndarray:
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _unique(names: List[str]) -> List[str]:
+    """Number repeated names so the unique constraints hold"""
+    seen: Dict[str, int] = {}
+    unique = []
+    for name in names:
+        count = seen.get(name, 0) + 1
+        seen[name] = count
+        unique.append(name if count == 1 else f"{name} {count}")
+    return unique
+
+
+def _dates(start: date, days: np.ndarray) -> list:
+    return (np.datetime64(start, "D") + days.astype("timedelta64[D]")).astype(object).tolist()
+
+
+def _datetimes(start: date, days: np.ndarray) -> list:
+    return (np.datetime64(start, "us") + (days * 86_400e6).astype("timedelta64[us]")).astype(object).tolist()
+
+
+def _rows(columns: Dict[str, list]) -> Iterator[List[dict]]:
+    names = list(columns)
+    count = len(columns[names[0]])
+    for offset in range(0, count, INSERT_CHUNK):
+        chunk = [columns[name][offset:offset + INSERT_CHUNK] for name in names]
+        yield [dict(zip(names, values)) for values in zip(*chunk)]
+
+
+def _insert(conn, model, columns: Dict[str, list]) -> int:
+    table = model.__table__
+    count = 0
+    for rows in _rows(columns):
+        conn.execute(table.insert(), rows)
+        count += len(rows)
+    return count
+
+
+def _reset_sequences(conn) -> None:
+    """Explicit ids leave PostgreSQL sequences behind; move them past the data"""
+    if conn.dialect.name != "postgresql":
+        return
+    for model in (models.Vendor, models.Filament, models.Purchase, models.PurchaseItem, models.Spool,
+                  models.SpoolReading):
+        table = model.__tablename__
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}"
+        ))
+
+
+def build(scale: Scale, seed: int = 0, end: Optional[date] = None) -> Dict[str, Dict[str, list]]:
+    """Columns for every table, keyed by table name, with ids starting at 1"""
+    rng = np.random.default_rng(seed)
+    end = end or date.today()
+    start = end - timedelta(days=HISTORY_DAYS)
+
+    # Vendors, most popular first
+    names = [prefix + suffix for prefix in VENDOR_PREFIXES for suffix in VENDOR_SUFFIXES]
+    names = [names[i] for i in rng.permutation(len(names))]
+    vendor_names = _unique([names[i % len(names)] for i in range(scale.vendors)])
+    vendor_added = rng.integers(0, HISTORY_DAYS // 3, scale.vendors)
+    vendors = {
+        "id": list(range(1, scale.vendors + 1)),
+        "name": vendor_names,
+        "notes": [None] * scale.vendors,
+        "created_at": _datetimes(start, vendor_added.astype(float)),
+    }
+
+    # Filaments: vendor by popularity, long-tailed material, color and feature
+    vendor_index = rng.choice(scale.vendors, size=scale.filaments, p=_zipf_weights(scale.vendors, 1.1))
+    materials = _weighted(rng, MATERIALS, scale.filaments)
+    color_index = rng.choice(len(COLORS), size=scale.filaments, p=_zipf_weights(len(COLORS), 1.0))
+    colors = [COLORS[i] for i in color_index]
+    features = _weighted(rng, FEATURES, scale.filaments)
+    line_index = rng.integers(0, len(LINE_NAMES), scale.filaments)
+    manufacturers = [vendor_names[i] for i in vendor_index]
+    lines = [f"{LINE_NAMES[line]} {material}" for line, material in zip(line_index, materials)]
+    products = [f"{feature} {color}" if feature else color for feature, color in zip(features, colors)]
+    filament_names = _unique([f"{manufacturer} {line} {product}"
+                              for manufacturer, line, product in zip(manufacturers, lines, products)])
+    filament_added = np.sort(rng.integers(0, HISTORY_DAYS, scale.filaments))
+    has_url = rng.random(scale.filaments) < 0.7
+    filaments = {
+        "id": list(range(1, scale.filaments + 1)),
+        "name": filament_names,
+        "vendor_id": (vendor_index + 1).tolist(),
+        "manufacturer": manufacturers,
+        "line": lines,
+        "material": materials,
+        "product": products,
+        "color": colors,
+        "feature": features,
+        "url": [f"https://{manufacturer.lower().replace(' ', '')}.example/products/{i + 1}" if url else None
+                for i, (manufacturer, url) in enumerate(zip(manufacturers, has_url))],
+        "notes": [None] * scale.filaments,
+        "date_added": _dates(start, filament_added),
+        "created_at": _datetimes(start, filament_added.astype(float)),
+    }
+
+    # Purchases in date order, each with a geometric number of items
+    ordered = np.sort(rng.integers(0, HISTORY_DAYS, scale.purchases))
+    item_counts = np.minimum(rng.geometric(0.5, scale.purchases), 12)
+    item_total = int(item_counts.sum())
+    item_purchase = np.repeat(np.arange(scale.purchases), item_counts)
+    # Popular filaments are bought again and again
+    popularity = _zipf_weights(scale.filaments, 0.9)[rng.permutation(scale.filaments)]
+    item_filament = rng.choice(scale.filaments, size=item_total, p=popularity)
+    item_spools = np.array(_weighted(rng, ITEM_SPOOLS, item_total))
+    item_kg = np.array(_weighted(rng, SPOOL_KG, item_total))
+    base_price = np.array([MATERIAL_PRICES[materials[i]] for i in item_filament])
+    unit_price = np.round(base_price * item_kg * rng.lognormal(0, 0.2, item_total), 2)
+    item_ordered = ordered[item_purchase]
+    shipping = rng.integers(2, 15, item_total)
+    received = item_ordered + shipping
+    item_received = [None if day > HISTORY_DAYS else value
+                     for day, value in zip(received.tolist(), _dates(start, received))]
+    item_marketplace = np.array(_weighted(rng, MARKETPLACES, scale.purchases), dtype=object)
+    sellers = [manufacturers[f] if market == "Direct" else market
+               for f, market in zip(item_filament, item_marketplace[item_purchase])]
+    item_shelf = rng.choice(len(SHELVES), size=item_total)
+    subtotal = np.round(np.bincount(item_purchase, weights=item_spools * unit_price, minlength=scale.purchases), 2)
+    purchases = {
+        "id": list(range(1, scale.purchases + 1)),
+        "date_ordered": _dates(start, ordered),
+        "marketplace": item_marketplace.tolist(),
+        "order_url": [None] * scale.purchases,
+        "subtotal": subtotal.tolist(),
+        "tax": np.round(subtotal * TAX_RATE, 2).tolist(),
+        "notes": [None] * scale.purchases,
+        "created_at": _datetimes(start, ordered.astype(float)),
+    }
+    purchase_items = {
+        "id": list(range(1, item_total + 1)),
+        "purchase_id": (item_purchase + 1).tolist(),
+        "filament_id": (item_filament + 1).tolist(),
+        "filament_name": [filament_names[i] for i in item_filament],
+        "seller": sellers,
+        "date_ordered": _dates(start, item_ordered),
+        "date_received": item_received,
+        "spools": item_spools.tolist(),
+        "kg_per_spool": item_kg.tolist(),
+        "unit_price": unit_price.tolist(),
+        "shelf": [SHELVES[i] for i in item_shelf],
+        "notes": [None] * item_total,
+        "created_at": _datetimes(start, item_ordered.astype(float)),
+    }
+
+    # Spools are opened from purchased stock some time after it arrives, and
+    # are used up over a gamma-distributed lifetime
+    units = np.repeat(np.arange(item_total), item_spools)
+    units = units[received[units] <= HISTORY_DAYS]
+    if scale.spools > len(units):
+        raise ValueError(f"{scale.spools} spools requested but only {len(units)} received; add purchases")
+    spool_item = np.sort(rng.choice(units, size=scale.spools, replace=False))
+    opened = np.minimum(received[spool_item] + rng.exponential(45, scale.spools), HISTORY_DAYS - rng.random(scale.spools))
+    opened_order = np.argsort(opened, kind="stable")
+    spool_item, opened = spool_item[opened_order], opened[opened_order]
+    lifetime = rng.gamma(2.0, 30.0, scale.spools) + 1
+    finished = opened + lifetime <= HISTORY_DAYS
+    full_kg = item_kg[spool_item]
+    used = np.where(finished, 1.0, (HISTORY_DAYS - opened) / lifetime)
+    remaining = np.round(np.clip(full_kg * (1 - used) + rng.normal(0, 0.01, scale.spools), 0, full_kg), 3)
+    remaining[finished] = 0.0
+    last_seen = np.where(finished, opened + lifetime, HISTORY_DAYS)
+    spool_filament = item_filament[spool_item]
+    spools = {
+        "id": list(range(1, scale.spools + 1)),
+        "filament_id": (spool_filament + 1).tolist(),
+        "filament_name": [filament_names[i] for i in spool_filament],
+        "date_opened": _dates(start, opened.astype(int)),
+        "date_finished": [value if done else None
+                          for done, value in zip(finished.tolist(), _dates(start, last_seen.astype(int)))],
+        "shelf": [SHELVES[i] for i in item_shelf[spool_item]],
+        "remaining_kg": remaining.tolist(),
+        "notes": [None] * scale.spools,
+        "created_at": _datetimes(start, opened),
+    }
+
+    # Weight histories: full at opening, current weight at the last weigh-in,
+    # evenly used in between, with a few grams of scale noise
+    reading_counts = 1 + rng.poisson(max(scale.readings_per_spool - 1, 0), scale.spools)
+    reading_total = int(reading_counts.sum())
+    reading_spool = np.repeat(np.arange(scale.spools), reading_counts)
+    first = np.concatenate(([0], np.cumsum(reading_counts)[:-1]))
+    fraction = rng.random(reading_total)
+    fraction[first] = 0.0
+    fraction[first + reading_counts - 1] = 1.0
+    fraction = fraction[np.lexsort((fraction, reading_spool))]
+    start_kg = full_kg[reading_spool]
+    weight = start_kg - fraction * (start_kg - remaining[reading_spool])
+    weight = np.round(np.clip(weight + rng.normal(0, 0.003, reading_total), 0, None), 3)
+    weight[fraction == 1.0] = remaining[reading_spool[fraction == 1.0]]
+    recorded = opened[reading_spool] + fraction * (last_seen[reading_spool] - opened[reading_spool])
+    # Stored in the order they were taken, like an append-only log
+    reading_order = np.argsort(recorded, kind="stable")
+    spool_readings = {
+        "id": list(range(1, reading_total + 1)),
+        "spool_id": (reading_spool[reading_order] + 1).tolist(),
+        "remaining_kg": weight[reading_order].tolist(),
+        "recorded_at": _datetimes(start, recorded[reading_order]),
+    }
+
+    return {
+        "vendors": vendors,
+        "filaments": filaments,
+        "purchases": purchases,
+        "purchase_items": purchase_items,
+        "spools": spools,
+        "spool_readings": spool_readings,
+    }
+
+
+TABLE_MODELS = {
+    "vendors": models.Vendor,
+    "filaments": models.Filament,
+    "purchases": models.Purchase,
+    "purchase_items": models.PurchaseItem,
+    "spools": models.Spool,
+    "spool_readings": models.SpoolReading,
+}
+
+
+def generate(db_engine: Engine, scale: Scale, seed: int = 0, end: Optional[date] = None) -> Dict[str, int]:
+    """Write a synthetic dataset into empty tables and rebuild the rollup; returns rows per table"""
+    migrations.init_db(db_engine)
+    with db_engine.connect() as conn:
+        for table, model in TABLE_MODELS.items():
+            if conn.execute(select(func.count()).select_from(model)).scalar():
+                raise ValueError(f"Table {table} is not empty; generate into a new database")
+
+    tables = build(scale, seed=seed, end=end)
+    counts = {}
+    with db_engine.begin() as conn:
+        for table, model in TABLE_MODELS.items():
+            counts[table] = _insert(conn, model, tables[table])
+        _reset_sequences(conn)
+
+    with Session(db_engine) as db:
+        crud.rebuild_inventory_rollup(db)
+    return counts
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spools", type=int, default=10_000, help="Spools to generate; other tables scale with it")
+    parser.add_argument("--filaments", type=int, help="Override the number of filaments")
+    parser.add_argument("--vendors", type=int, help="Override the number of vendors")
+    parser.add_argument("--purchases", type=int, help="Override the number of purchases")
+    parser.add_argument("--readings-per-spool", type=float, default=4.0, help="Mean weight readings per spool")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day of the history (default: today)")
+    args = parser.parse_args()
+
+    scale = Scale.from_spools(args.spools, args.readings_per_spool)
+    for name in ("filaments", "vendors", "purchases"):
+        if getattr(args, name) is not None:
+            setattr(scale, name, getattr(args, name))
+
+    started = time.perf_counter()
+    try:
+        counts = generate(engine, scale, seed=args.seed, end=args.end)
+    except ValueError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    for table, count in counts.items():
+        print(f"{table}: {count}")
+    print(f"{sum(counts.values())} rows in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
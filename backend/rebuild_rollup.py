@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""Rebuild or verify the inventory rollup table.
+
+Recomputes the per-filament totals from purchase items and spools and
+reports any drift from the stored rollup. Run with --verify to only
+report; the exit status is 1 when drift is found.
+"""
+
+import argparse
+import sys
+
+from app import crud, migrations
+from app.database import SessionLocal, engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--verify", action="store_true", help="report drift without rewriting the rollup")
+    args = parser.parse_args()
+
+    migrations.init_db(engine)
+
+    with SessionLocal() as db:
+        drift = crud.rebuild_inventory_rollup(db, apply=not args.verify)
+
+    for entry in drift:
+        print(f"filament {entry['filament_id']}: {entry['field']} stored={entry['stored']} expected={entry['expected']}")
+
+    if args.verify:
+        print(f"{len(drift)} drifted value(s) found")
+        return 1 if drift else 0
+
+    print(f"Rollup rebuilt ({len(drift)} drifted value(s) corrected)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
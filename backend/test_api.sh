@@ -97,4 +97,15 @@ echo "8. Listing all vendors..."
 curl "$API_URL/vendors/" | python -m json.tool
 echo
 
+# Test 9: Conditional GETs answer 304 for an unchanged list
+echo "9. Revalidating vendors with If-None-Match and If-Modified-Since..."
+# Last-Modified is only sent once the second of the last write has passed
+sleep 1
+HEADERS=$(curl -s -D - -o /dev/null "$API_URL/vendors/")
+ETAG=$(echo "$HEADERS" | grep -i '^etag:' | cut -d' ' -f2- | tr -d '\r')
+LAST_MODIFIED=$(echo "$HEADERS" | grep -i '^last-modified:' | cut -d' ' -f2- | tr -d '\r')
+echo "If-None-Match: $(curl -s -o /dev/null -w '%{http_code}' -H "If-None-Match: $ETAG" "$API_URL/vendors/") (expected 304)"
+echo "If-Modified-Since: $(curl -s -o /dev/null -w '%{http_code}' -H "If-Modified-Since: $LAST_MODIFIED" "$API_URL/vendors/") (expected 304)"
+echo
+
 echo "All tests completed!"
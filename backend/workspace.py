@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Create workspace databases, or list the existing ones.
+
+The server answers 404 for a workspace with no database, unless
+FILAMENT_WORKSPACE_CREATE is set. Creating one gives it the current schema,
+so its first request does no migration work.
+"""
+
+import argparse
+import os
+import sys
+
+from app import tenancy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("names", nargs="*", metavar="NAME", help="workspaces to create")
+    parser.add_argument("--list", action="store_true", help="list workspaces with a database")
+    args = parser.parse_args()
+
+    if not tenancy.settings.enabled:
+        parser.error("workspaces need FILAMENT_WORKSPACE_DIR")
+
+    try:
+        for name in args.names:
+            existed = tenancy.registry.exists(tenancy.check_name(name))
+            tenancy.registry.create(name)
+            print(f"{name}: {'upgraded' if existed else 'created'}")
+    except tenancy.InvalidWorkspace as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    finally:
+        tenancy.registry.close_all()
+
+    if args.list or not args.names:
+        directory = tenancy.settings.directory
+        names = sorted(name[:-len(".db")] for name in os.listdir(directory) if name.endswith(".db")) \
+            if os.path.isdir(directory) else []
+        for name in names:
+            print(name)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
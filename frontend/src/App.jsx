@@ -554,69 +554,52 @@ function FilamentsTab() {
         let failed = 0
         let vendorsCreated = 0
         const errors = []
+        const filaments = []
 
-        // Load existing vendors
-        const existingVendorsResponse = await api.getVendors()
-        const existingVendorNames = new Set(existingVendorsResponse.data.map(v => v.name))
-
-        // Collect unique manufacturers from CSV
-        const uniqueManufacturers = new Set()
         for (const row of results.data) {
-          const manufacturer = row['Manufacturer']
-          if (manufacturer && manufacturer !== '-' && manufacturer.trim() !== '') {
-            uniqueManufacturers.add(manufacturer)
+          // Map CSV headers to database fields (case-insensitive)
+          const filamentData = {
+            name: row['Filament name'] || row['Name'] || '',
+            manufacturer: row['Manufacturer'] || '',
+            line: row['Line'] || '',
+            material: row['Material'] || 'PLA',
+            product: row['Product'] || '',
+            color: row['Color'] || '',
+            feature: row['Feature'] || '',
+            date_added: parseDate(row['Date added']) || new Date().toISOString().split('T')[0],
+            url: row['URL'] || '',
+            notes: row['Notes'] || ''
           }
-        }
 
-        // Create missing vendors
-        for (const manufacturer of uniqueManufacturers) {
-          if (!existingVendorNames.has(manufacturer)) {
-            try {
-              await api.createVendor({ name: manufacturer, notes: 'Auto-created from CSV import' })
-              existingVendorNames.add(manufacturer)
-              vendorsCreated++
-            } catch (error) {
-              console.error('Error creating vendor:', manufacturer, error)
-            }
-          }
-        }
-
-        for (const row of results.data) {
-          try {
-            // Map CSV headers to database fields (case-insensitive)
-            const filamentData = {
-              name: row['Filament name'] || row['Name'] || '',
-              manufacturer: row['Manufacturer'] || '',
-              line: row['Line'] || '',
-              material: row['Material'] || 'PLA',
-              product: row['Product'] || '',
-              color: row['Color'] || '',
-              feature: row['Feature'] || '',
-              date_added: parseDate(row['Date added']) || new Date().toISOString().split('T')[0],
-              url: row['URL'] || '',
-              notes: row['Notes'] || ''
-            }
+          // Replace "-" with empty string
+          Object.keys(filamentData).forEach(key => {
+            if (filamentData[key] === '-') filamentData[key] = ''
+          })
 
-            // Replace "-" with empty string
-            Object.keys(filamentData).forEach(key => {
-              if (filamentData[key] === '-') filamentData[key] = ''
-            })
+          // Skip rows without a name or with invalid names (like just numbers)
+          if (!filamentData.name || filamentData.name.trim() === '' || /^\d+$/.test(filamentData.name.trim())) {
+            continue
+          }
 
-            // Skip rows without a name or with invalid names (like just numbers)
-            if (!filamentData.name || filamentData.name.trim() === '' || /^\d+$/.test(filamentData.name.trim())) {
-              continue
-            }
+          filaments.push(filamentData)
+        }
 
-            if (filamentData.name) {
-              await api.createFilament(filamentData)
-              imported++
+        try {
+          // Import the good rows in one transaction, creating missing vendors on the way; bad rows are reported
+          const response = await api.bulkCreateFilaments({ items: filaments, create_missing_vendors: true, atomic: false })
+          imported = response.data.created
+          failed = response.data.failed
+          vendorsCreated = response.data.vendors_created.length
+          for (const result of response.data.results) {
+            if (result.status === 'error') {
+              errors.push(`Row "${filaments[result.index].name}": ${result.error}`)
             }
-          } catch (error) {
-            console.error('Error importing row:', row, error)
-            const errorMsg = error.response?.data?.detail || error.message
-            errors.push(`Row "${row['Filament name'] || row['Name']}": ${JSON.stringify(errorMsg)}`)
-            failed++
           }
+        } catch (error) {
+          console.error('Error importing filaments:', error)
+          const errorMsg = error.response?.data?.detail || error.message
+          errors.push(JSON.stringify(errorMsg))
+          failed = filaments.length
         }
 
         let message = `Import complete!\n`
@@ -1151,19 +1134,25 @@ function PurchasesTab() {
           }
         }
 
-        // Create purchases
-        for (const purchase of purchaseMap.values()) {
-          if (purchase.items.length > 0 && purchase.items.some(item => item.filament_name)) {
-            try {
-              await api.createPurchase(purchase)
-              imported++
-            } catch (error) {
-              console.error('Error importing purchase:', purchase, error)
-              const errorMsg = error.response?.data?.detail || error.message
-              errors.push(`Purchase "${purchase.marketplace} ${purchase.date_ordered}": ${JSON.stringify(errorMsg)}`)
-              failed++
+        // Create the valid purchases in one transaction; the rest are reported
+        const purchases = [...purchaseMap.values()].filter(
+          purchase => purchase.items.length > 0 && purchase.items.some(item => item.filament_name)
+        )
+        try {
+          const response = await api.bulkCreatePurchases({ items: purchases, atomic: false })
+          imported = response.data.created
+          failed = response.data.failed
+          for (const result of response.data.results) {
+            if (result.status === 'error') {
+              const purchase = purchases[result.index]
+              errors.push(`Purchase "${purchase.marketplace} ${purchase.date_ordered}": ${result.error}`)
             }
           }
+        } catch (error) {
+          console.error('Error importing purchases:', error)
+          const errorMsg = error.response?.data?.detail || error.message
+          errors.push(JSON.stringify(errorMsg))
+          failed = purchases.length
         }
 
         let message = `Import complete!\nImported: ${imported} purchases\nFailed: ${failed}`
@@ -1668,33 +1657,43 @@ function SpoolsTab() {
         let failed = 0
         const errors = []
 
+        const spools = []
+
         for (const row of results.data) {
-          try {
-            // Map CSV headers to database fields
-            const spoolData = {
-              filament_name: row['Filament'] || '',
-              date_opened: parseDate(row['Date opened']) || new Date().toISOString().split('T')[0],
-              date_finished: parseDate(row['Date finished']) || null,
-              shelf: row['Shelf'] || '',
-              remaining_kg: parseFloat(row['Remaining (kg)'] || row['Remaining'] || '1.0'),
-              notes: row['Notes'] || ''
-            }
+          // Map CSV headers to database fields
+          const spoolData = {
+            filament_name: row['Filament'] || '',
+            date_opened: parseDate(row['Date opened']) || new Date().toISOString().split('T')[0],
+            date_finished: parseDate(row['Date finished']) || null,
+            shelf: row['Shelf'] || '',
+            remaining_kg: parseFloat(row['Remaining (kg)'] || row['Remaining'] || '1.0'),
+            notes: row['Notes'] || ''
+          }
 
-            // Replace "-" with empty string
-            Object.keys(spoolData).forEach(key => {
-              if (spoolData[key] === '-') spoolData[key] = ''
-            })
+          // Replace "-" with empty string
+          Object.keys(spoolData).forEach(key => {
+            if (spoolData[key] === '-') spoolData[key] = ''
+          })
 
-            if (spoolData.filament_name) {
-              await api.createSpool(spoolData)
-              imported++
+          if (spoolData.filament_name) {
+            spools.push(spoolData)
+          }
+        }
+
+        try {
+          const response = await api.bulkCreateSpools({ items: spools, atomic: false })
+          imported = response.data.created
+          failed = response.data.failed
+          for (const result of response.data.results) {
+            if (result.status === 'error') {
+              errors.push(`Row "${spools[result.index].filament_name}": ${result.error}`)
             }
-          } catch (error) {
-            console.error('Error importing row:', row, error)
-            const errorMsg = error.response?.data?.detail || error.message
-            errors.push(`Row "${row['Filament']}": ${JSON.stringify(errorMsg)}`)
-            failed++
           }
+        } catch (error) {
+          console.error('Error importing spools:', error)
+          const errorMsg = error.response?.data?.detail || error.message
+          errors.push(JSON.stringify(errorMsg))
+          failed = spools.length
         }
 
         let message = `Import complete!\nImported: ${imported}\nFailed: ${failed}`
@@ -24,13 +24,17 @@ export const deleteVendor = (id) => api.delete(`/vendors/${id}`);
 
 // Filaments
 export const getFilaments = () => api.get('/filaments/');
+export const getFilamentFacets = (filters = {}) => api.get('/filaments/facets', { params: filters });
+export const searchFilaments = (q, limit = 20) => api.get('/filaments/search', { params: { q, limit } });
 export const createFilament = (data) => api.post('/filaments/', data);
+export const bulkCreateFilaments = (data) => api.post('/filaments/bulk', data);
 export const updateFilament = (id, data) => api.put(`/filaments/${id}`, data);
 export const deleteFilament = (id) => api.delete(`/filaments/${id}`);
 
 // Purchases
 export const getPurchases = () => api.get('/purchases/');
 export const createPurchase = (data) => api.post('/purchases/', data);
+export const bulkCreatePurchases = (data) => api.post('/purchases/bulk', data);
 export const updatePurchase = (id, data) => api.put(`/purchases/${id}`, data);
 export const deletePurchase = (id) => api.delete(`/purchases/${id}`);
 
@@ -42,10 +46,17 @@ export const deletePurchaseItem = (id) => api.delete(`/purchase-items/${id}`);
 // Spools
 export const getSpools = () => api.get('/spools/');
 export const createSpool = (data) => api.post('/spools/', data);
+export const bulkCreateSpools = (data) => api.post('/spools/bulk', data);
 export const updateSpool = (id, data) => api.put(`/spools/${id}`, data);
 export const deleteSpool = (id) => api.delete(`/spools/${id}`);
 
 // Inventory
 export const getInventorySummary = () => api.get('/inventory/summary');
+export const getInventoryFacets = (filters = {}) => api.get('/inventory/facets', { params: filters });
+
+// Sync
+export const getSync = (since = 0, limit) => api.get('/sync', { params: { since, limit } });
+export const openEvents = (since) =>
+  new EventSource(`${API_BASE_URL}/events${since == null ? '' : `?since=${since}`}`);
 
 export default api;